@@ -8,3 +8,6 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
     # هذا النص سيظهر كعنوان للتطبيق داخل لوحة الإدارة
     verbose_name = _("الحسابات")
+
+    def ready(self):
+        from . import signals  # noqa: F401
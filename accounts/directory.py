@@ -0,0 +1,92 @@
+# accounts/directory.py
+"""
+دليل المستخدمين النشطين لقوائم الاختيار (إرسال إحالة، تحويل، مراسلة).
+
+يُبنى باستعلام واحد ويُخزَّن في الكاش مجمّعًا حسب الدور، ويُبطَل عند تغيّر
+أي مستخدم أو ملف شخصي (signals.py). في المدارس الكبيرة تعرض النماذج حقل
+بحث (user_search) بدل قائمة <option> كاملة.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from kingabdulaziz205.caching import get_or_compute, invalidate
+from .models import ROLE_CHOICES
+
+NAMESPACE = "accounts:users"
+TIMEOUT = 60 * 60
+NO_ROLE = "بدون دور"
+
+Entry = namedtuple("Entry", "id username name role")
+
+
+def _build():
+    rows = (
+        User.objects.filter(is_active=True)
+        .values_list("id", "username", "first_name", "last_name", "profile__full_name", "profile__role")
+        .order_by("username")
+    )
+    return [
+        Entry(pk, username, full_name or f"{first} {last}".strip() or username, role or "")
+        for pk, username, first, last, full_name, role in rows
+    ]
+
+
+def active_users():
+    """كل المستخدمين النشطين (Entry) مرتبين باسم المستخدم."""
+    return get_or_compute(NAMESPACE, ("active",), _build, TIMEOUT)
+
+
+def invalidate_users():
+    invalidate(NAMESPACE)
+
+
+def get_user_entry(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    return next((e for e in active_users() if e.id == user_id), None)
+
+
+def grouped_users(exclude_id=None):
+    """[(الدور، [Entry مرتبة بالاسم])] بترتيب ROLE_CHOICES ثم من بلا دور."""
+    order = [r for r, _ in ROLE_CHOICES]
+    groups = {}
+    for e in active_users():
+        if e.id != exclude_id:
+            groups.setdefault(e.role if e.role in order else NO_ROLE, []).append(e)
+    return [
+        (role, sorted(groups[role], key=lambda e: (e.name, e.username)))
+        for role in order + [NO_ROLE] if role in groups
+    ]
+
+
+def search_users(query, exclude_id=None, role=None, limit=20):
+    """بحث typeahead في الدليل المخزّن: المطابقة من البداية أولًا ثم أي موضع."""
+    q = (query or "").strip().casefold()
+    if not q:
+        return []
+    starts, contains = [], []
+    for e in active_users():
+        if e.id == exclude_id or (role and e.role != role):
+            continue
+        name, username = e.name.casefold(), e.username.casefold()
+        if name.startswith(q) or username.startswith(q):
+            starts.append(e)
+        elif q in name or q in username:
+            contains.append(e)
+    return (starts + contains)[:limit]
+
+
+def user_picker(selected=None, exclude_id=None):
+    """سياق قالب includes/user_picker.html: قائمة مجمّعة أو حقل بحث حسب حجم الدليل."""
+    inline_limit = getattr(settings, "USER_PICKER_INLINE_LIMIT", 200)
+    entry = get_user_entry(selected) if selected else None
+    return {
+        "inline": len(active_users()) <= inline_limit,
+        "groups": grouped_users(exclude_id),
+        "selected": str(entry.id) if entry else "",
+        "selected_label": entry.name if entry else "",
+    }
@@ -0,0 +1,15 @@
+# accounts/middleware.py
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import get_capabilities
+
+
+class CapabilitiesMiddleware:
+    """يضع request.capabilities (كسول) بعد AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.capabilities = SimpleLazyObject(lambda: get_capabilities(request.user))
+        return self.get_response(request)
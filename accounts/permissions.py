@@ -0,0 +1,70 @@
+# accounts/permissions.py
+"""
+صلاحيات المستخدم مجمّعة في مكان واحد بدل تكرار _is_manager/_can_view في كل تطبيق.
+
+يُحسب الدور مرة واحدة لكل مستخدم (ولكل طلب عبر CapabilitiesMiddleware التي
+تضع request.capabilities)، ويُحمَّل الملف الشخصي مع المستخدم نفسه
+(ProfileModelBackend) فلا يكلّف التحقق من الدور أي استعلام إضافي.
+"""
+from django.utils.functional import cached_property
+
+from .models import Profile
+
+ROLE_MANAGER = "مدير المدرسة"
+ROLE_COUNSELOR = "موجه طلابي"
+
+
+class Capabilities:
+    """ما يستطيعه مستخدم معيّن؛ كل خاصية تُحسب مرة واحدة."""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def role(self):
+        if not getattr(self.user, "is_authenticated", False):
+            return ""
+        try:
+            return self.user.profile.role
+        except Profile.DoesNotExist:
+            return ""
+
+    @cached_property
+    def is_manager(self):
+        return bool(getattr(self.user, "is_staff", False) or self.role == ROLE_MANAGER)
+
+    @cached_property
+    def is_counselor(self):
+        return self.role == ROLE_COUNSELOR
+
+    # ——— الإحالات ———
+    def can_view_referral(self, ref):
+        uid = self.user.id
+        return self.is_manager or ref.created_by_id == uid or (ref.assignee_id is not None and ref.assignee_id == uid)
+
+    def can_assign_referral(self, ref):
+        uid = self.user.id
+        return self.is_manager or self.is_counselor or ref.created_by_id == uid or ref.assignee_id == uid
+
+    def can_counsel_referral(self, ref):
+        return self.is_manager or self.is_counselor or ref.assignee_id == self.user.id
+
+    # ——— المراسلات ———
+    def can_view_thread(self, thread):
+        uid = self.user.id
+        return self.is_manager or thread.sender_id == uid or thread.recipient_id == uid
+
+    def can_reply_thread(self, thread):
+        return self.can_view_thread(thread)
+
+
+def get_capabilities(user):
+    """يرجّع Capabilities للمستخدم مع حفظها على كائنه (مرة واحدة لكل طلب)."""
+    caps = getattr(user, "_capabilities", None)
+    if caps is None:
+        caps = Capabilities(user)
+        try:
+            user._capabilities = caps
+        except AttributeError:
+            pass
+    return caps
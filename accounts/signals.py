@@ -0,0 +1,22 @@
+# accounts/signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .directory import invalidate_users
+from .models import Profile
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, update_fields=None, **kwargs):
+    # تسجيل الدخول يحفظ last_login فقط — لا يغيّر الدليل
+    if update_fields and set(update_fields) <= {"last_login", "password"}:
+        return
+    invalidate_users()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def _directory_changed(sender, **kwargs):
+    invalidate_users()
@@ -1,3 +1,205 @@
-from django.test import TestCase
+from itertools import product
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.http import JsonResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+
+from kingabdulaziz205.caching import get_or_compute, invalidate, memoize
+from kingabdulaziz205.testing import make_referral, make_user
+from messaging.models import Thread
+from .directory import active_users, grouped_users
+from .models import Profile
+from .permissions import Capabilities
+
+
+# ——— فحوص الأدوار كما كانت في referrals/messaging قبل Capabilities (خط الأساس للمقارنة) ———
+def _baseline_is_manager(user):
+    try:
+        return bool(user.is_staff or (getattr(user, "profile", None) and user.profile.role == "مدير المدرسة"))
+    except Profile.DoesNotExist:
+        return bool(user.is_staff)
+
+
+def _baseline_is_counselor(user):
+    try:
+        return user.profile.role == "موجه طلابي"
+    except (Profile.DoesNotExist, AttributeError):
+        return False
+
+
+def _baseline_can_view(user, ref):
+    return bool(_baseline_is_manager(user) or user == ref.created_by or (ref.assignee and user == ref.assignee))
+
+
+def _baseline_can_assign(user, ref):
+    return bool(_baseline_is_manager(user) or user.is_staff or user == ref.created_by
+                or _baseline_is_counselor(user) or (ref.assignee_id == user.id))
+
+
+def _baseline_can_counsel(user, ref):
+    return bool(_baseline_is_counselor(user) or _baseline_is_manager(user) or user.is_staff or ref.assignee_id == user.id)
+
+
+def _baseline_can_view_thread(user, thread):
+    return bool(_baseline_is_manager(user) or thread.sender_id == user.id or thread.recipient_id == user.id)
+
+
+def capabilities_view(request):
+    caps = request.capabilities
+    return JsonResponse({"manager": caps.is_manager, "counselor": caps.is_counselor, "role": caps.role})
+
+
+urlpatterns = [path("caps/", capabilities_view)]
+
+
+class CacheAsideTests(TestCase):
+    def test_get_or_compute_and_versioned_invalidation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return None  # None قيمة صالحة تُخزَّن أيضًا
+
+        self.assertIsNone(get_or_compute("tests:ns", ("a", 1), compute))
+        get_or_compute("tests:ns", ("a", 1), compute)
+        self.assertEqual(len(calls), 1)
+        invalidate("tests:ns")
+        get_or_compute("tests:ns", ("a", 1), compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_memoize_keys_on_arguments(self):
+        calls = []
+
+        @memoize("tests:memo")
+        def square(n):
+            calls.append(n)
+            return n * n
+
+        self.assertEqual([square(2), square(2), square(3)], [4, 4, 9])
+        self.assertEqual(calls, [2, 3])
+        square.invalidate()
+        square(2)
+        self.assertEqual(calls, [2, 3, 2])
+
+
+class ActiveUsersDirectoryTests(TestCase):
+    def test_cached_and_invalidated_on_user_and_profile_changes(self):
+        alice = make_user("alice", role=None)
+        self.assertEqual([u.username for u in active_users()], ["alice"])
+        with self.assertNumQueries(0):
+            active_users()
+
+        Profile.objects.create(user=alice, role="معلم", full_name="أليس")
+        self.assertEqual(active_users()[0].name, "أليس")
+
+        alice.is_active = False
+        alice.save()
+        self.assertEqual(active_users(), [])
+
+    def test_login_does_not_invalidate(self):
+        make_user("bob", role=None)
+        active_users()
+        self.client.login(username="bob", password="x")
+        with self.assertNumQueries(0):
+            active_users()
+
+
+class UserSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.me = make_user("me", role=None)
+        for username, name, role in [("ali", "علي أحمد", "معلم"), ("sami", "سامي علي", "موجه طلابي"), ("zed", "", None)]:
+            make_user(username, role, name)
+
+    def test_grouped_by_role(self):
+        groups = dict(grouped_users(exclude_id=self.me.id))
+        self.assertEqual([e.username for e in groups["معلم"]], ["ali"])
+        self.assertEqual([e.username for e in groups["موجه طلابي"]], ["sami"])
+        self.assertEqual([e.username for e in groups["بدون دور"]], ["zed"])
+
+    def test_typeahead_endpoint(self):
+        self.client.force_login(self.me)
+        active_users()
+        with self.assertNumQueries(2):  # الجلسة + المستخدم؛ الدليل من الكاش
+            data = self.client.get("/accounts/users/search/", {"q": "علي"}).json()
+        # المطابقة من البداية أولًا
+        self.assertEqual([r["username"] for r in data["results"]], ["ali", "sami"])
+        data = self.client.get("/accounts/users/search/", {"q": "علي", "role": "موجه طلابي"}).json()
+        self.assertEqual([r["username"] for r in data["results"]], ["sami"])
+
+
+class CapabilitiesBaselineTests(TestCase):
+    """كل دور (مع is_staff وبدونه) يملك الصلاحيات نفسها التي كانت تعطيها الفحوص القديمة."""
+
+    ROLES = ["مدير المدرسة", "موجه طلابي", "معلم", None]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.other = make_user("other")
+        for i, (role, staff) in enumerate(product(cls.ROLES, (False, True))):
+            make_user(f"u{i}", role, is_staff=staff)
+
+    def _cases(self, user):
+        """إحالات ومراسلات يكون فيها المستخدم منشئًا أو مكلَّفًا أو غريبًا عنها."""
+        refs = [
+            make_referral(user), make_referral(self.other, assignee=user),
+            make_referral(self.other), make_referral(self.other, assignee=self.other),
+        ]
+        threads = [
+            Thread.objects.create(subject="م", sender=user, recipient=self.other),
+            Thread.objects.create(subject="م", sender=self.other, recipient=user),
+            Thread.objects.create(subject="م", sender=self.other, recipient=self.other),
+        ]
+        return refs, threads
+
+    def test_flags_and_object_checks_match_baseline(self):
+        for user in User.objects.exclude(pk=self.other.pk).select_related("profile"):
+            refs, threads = self._cases(user)
+            caps = Capabilities(user)
+            with self.subTest(role=caps.role, staff=user.is_staff):
+                self.assertEqual(caps.is_manager, _baseline_is_manager(user))
+                self.assertEqual(caps.is_counselor, _baseline_is_counselor(user))
+                for ref in refs:
+                    self.assertEqual(caps.can_view_referral(ref), _baseline_can_view(user, ref))
+                    self.assertEqual(caps.can_assign_referral(ref), _baseline_can_assign(user, ref))
+                    self.assertEqual(caps.can_counsel_referral(ref), _baseline_can_counsel(user, ref))
+                for thread in threads:
+                    self.assertEqual(caps.can_view_thread(thread), _baseline_can_view_thread(user, thread))
+                    self.assertEqual(caps.can_reply_thread(thread), _baseline_can_view_thread(user, thread))
+
+    def test_anonymous_has_no_role(self):
+        caps = Capabilities(AnonymousUser())
+        self.assertEqual((caps.role, caps.is_manager, caps.is_counselor), ("", False, False))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class CapabilitiesQueryTests(TestCase):
+    """الدور يأتي مع المستخدم (ProfileModelBackend) فلا يكلّف request.capabilities استعلامًا للملف الشخصي."""
+
+    def test_no_extra_profile_query(self):
+        self.client.force_login(make_user("counselor", "موجه طلابي"))
+        with self.assertNumQueries(2):  # الجلسة + المستخدم مع ملفه الشخصي
+            data = self.client.get("/caps/").json()
+        self.assertEqual(data, {"manager": False, "counselor": True, "role": "موجه طلابي"})
+
+    def test_user_without_profile(self):
+        self.client.force_login(make_user("plain", role=None))
+        with self.assertNumQueries(2):
+            data = self.client.get("/caps/").json()
+        self.assertEqual(data, {"manager": False, "counselor": False, "role": ""})
+
+
+class CapabilitiesRealViewQueryTests(TestCase):
+    def test_referral_list_reads_profile_only_with_user(self):
+        manager = make_user("boss", "مدير المدرسة")
+        make_referral(manager)
+        self.client.force_login(manager)
+        self.client.get(reverse("referrals:index"))  # تعبئة الكاش
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse("referrals:index")).status_code, 200)
+        profile_queries = [q["sql"] for q in ctx if "accounts_profile" in q["sql"]]
+        self.assertEqual(len(profile_queries), 1)
+        self.assertIn("auth_user", profile_queries[0])
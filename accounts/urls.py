@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from .views import register_view
+from .views import register_view, user_search
 
 app_name = "accounts"
 
@@ -8,4 +8,5 @@ urlpatterns = [
     path("register/", register_view, name="register"),
     path("login/",  auth_views.LoginView.as_view(template_name="accounts/login.html"), name="login"),
     path("logout/", auth_views.LogoutView.as_view(next_page="/"), name="logout"),
+    path("users/search/", user_search, name="user_search"),
 ]
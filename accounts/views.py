@@ -2,10 +2,13 @@
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.models import User, Group
+from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.views.decorators.http import require_http_methods
 
+from .directory import search_users
 from .models import Profile, ROLE_CHOICES
 
 ROLES = [r[0] for r in ROLE_CHOICES]  # أسماء الأدوار فقط
@@ -76,3 +79,14 @@ def register_view(request):
 
     # GET
     return render(request, "accounts/register.html", {"roles": ROLES})
+
+
+@login_required
+def user_search(request):
+    """بحث typeahead في دليل المستخدمين النشطين: ?q=...&role=..."""
+    results = search_users(
+        request.GET.get("q"), exclude_id=request.user.id, role=request.GET.get("role") or None,
+    )
+    return JsonResponse({
+        "results": [{"id": e.id, "username": e.username, "name": e.name, "role": e.role} for e in results],
+    })
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Blob
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "size", "content_type", "state", "attempts", "created_at")
+    list_filter = ("state",)
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "size", "content_type", "state", "staged_name", "attempts", "last_error", "thumbnail", "created_at")
@@ -0,0 +1,53 @@
+# attachments/blobs.py
+import hashlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import offload
+from .models import Blob
+from .uploads import content_type_for
+
+
+def sha256_of(f):
+    """بصمة الملف المرفوع بقراءته على مقاطع (بدون تحميله كاملًا في الذاكرة)."""
+    h = hashlib.sha256()
+    for chunk in f.chunks():
+        h.update(chunk)
+    f.seek(0)
+    return h.hexdigest()
+
+
+def store_blob(f):
+    """
+    يرجّع Blob للملف المرفوع: إن كان المحتوى مخزّنًا مسبقًا يُعاد نفس السجل
+    دون أي رفع إلى التخزين البعيد، وإلا يُرفع مرة واحدة ويُسجَّل.
+    مع ATTACHMENTS_ASYNC_UPLOAD يُحفظ محليًا بحالة PENDING ويُرفع في الخلفية بعد الـ commit.
+    """
+    # البصمة محسوبة مسبقًا أثناء الاستقبال (ChecksumUploadHandler) إن توفرت
+    digest = getattr(f, "sha256", None) or sha256_of(f)
+    blob = Blob.objects.filter(sha256=digest).first()
+    if blob:
+        return blob
+    blob = Blob(sha256=digest, size=f.size or 0, content_type=content_type_for(f.name))
+    deferred = getattr(settings, "ATTACHMENTS_ASYNC_UPLOAD", False)
+    if deferred:
+        offload.stage(blob, f)
+    else:
+        blob.file.save(f.name, f, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # رفع متزامن لنفس المحتوى: نعتمد السجل الأسبق
+        if deferred:
+            offload.discard(blob)
+        return Blob.objects.get(sha256=digest)
+    offload.schedule(blob.pk, upload=deferred)
+    return blob
+
+
+def attach(model, f, **fields):
+    """ينشئ سجل مرفق (Attachment/ActionAttachment/MessageAttachment) يشير إلى Blob مشترك."""
+    blob = store_blob(f)
+    return model.objects.create(blob=blob, file=blob.file.name, **fields)
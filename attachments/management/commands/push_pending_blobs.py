@@ -0,0 +1,31 @@
+# attachments/management/commands/push_pending_blobs.py
+from django.core.management.base import BaseCommand
+
+from attachments.models import Blob
+from attachments.offload import push
+
+
+class Command(BaseCommand):
+    help = (
+        "يعيد دفع الملفات المجهّزة محليًا التي لم يكتمل رفعها للتخزين البعيد "
+        "(بعد إعادة تشغيل الخادم أو فشل كل المحاولات)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--include-failed", action="store_true",
+                            help="إعادة محاولة الملفات بحالة FAILED أيضًا.")
+        parser.add_argument("--limit", type=int, default=0,
+                            help="أقصى عدد ملفات في هذا التشغيل (0 = الكل).")
+
+    def handle(self, *args, **opts):
+        states = ["PENDING", "FAILED"] if opts["include_failed"] else ["PENDING"]
+        ids = Blob.objects.filter(state__in=states).order_by("id").values_list("id", flat=True)
+        if opts["limit"]:
+            ids = ids[: opts["limit"]]
+        ok = failed = 0
+        for blob_id in list(ids):
+            if push(blob_id):
+                ok += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"تم رفع {ok} ملف، وفشل {failed}."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:08
+
+import attachments.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='البصمة (SHA-256)')),
+                ('file', models.FileField(max_length=255, upload_to=attachments.models.blob_upload_path, verbose_name='الملف')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='الحجم')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='نوع المحتوى')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='أُنشئ في')),
+            ],
+            options={
+                'verbose_name': 'ملف مخزّن',
+                'verbose_name_plural': 'ملفات مخزّنة',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
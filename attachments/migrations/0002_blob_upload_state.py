@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='محاولات الرفع'),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='آخر خطأ'),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='staged_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='مسار التجهيز المحلي'),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='state',
+            field=models.CharField(choices=[('PENDING', 'بانتظار الرفع'), ('UPLOADED', 'مرفوع'), ('FAILED', 'فشل الرفع')], db_index=True, default='UPLOADED', max_length=10, verbose_name='حالة الرفع'),
+        ),
+    ]
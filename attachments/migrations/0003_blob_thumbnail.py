@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:14
+
+import attachments.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0002_blob_upload_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to=attachments.models.thumbnail_upload_path, verbose_name='المصغّر'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import models
+from django.urls import reverse
+import os
+
+
+def blob_upload_path(instance, filename):
+    # مسار ثابت مشتق من البصمة: نفس المحتوى ⇐ نفس المسار
+    _, ext = os.path.splitext(filename)
+    return f"blobs/{instance.sha256[:2]}/{instance.sha256}{ext.lower()}"
+
+
+def thumbnail_upload_path(instance, filename):
+    return f"thumbs/{instance.sha256[:2]}/{filename}"
+
+
+class Blob(models.Model):
+    """
+    ملف مخزّن مرة واحدة بمفتاح SHA-256 لمحتواه. مرفقات الإحالات والإجراءات
+    والمراسلات تشير إليه بدل رفع نسخة خاصة بكل منها.
+    """
+    STATE_CHOICES = [
+        ("PENDING", "بانتظار الرفع"),
+        ("UPLOADED", "مرفوع"),
+        ("FAILED", "فشل الرفع"),
+    ]
+
+    sha256 = models.CharField("البصمة (SHA-256)", max_length=64, unique=True)
+    file = models.FileField("الملف", upload_to=blob_upload_path, max_length=255)
+    size = models.PositiveBigIntegerField("الحجم", default=0)
+    content_type = models.CharField("نوع المحتوى", max_length=100, blank=True)
+    # الرفع للتخزين البعيد يتم في الخلفية؛ حتى اكتماله يُقدَّم الملف من نسخة التجهيز المحلية
+    state = models.CharField("حالة الرفع", max_length=10, choices=STATE_CHOICES, default="UPLOADED", db_index=True)
+    staged_name = models.CharField("مسار التجهيز المحلي", max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField("محاولات الرفع", default=0)
+    last_error = models.TextField("آخر خطأ", blank=True)
+    # مصغّر WebP (صورة أو أول صفحة PDF) مشتق من المحتوى؛ فارغ = لم يُولَّد بعد
+    thumbnail = models.FileField("المصغّر", upload_to=thumbnail_upload_path, max_length=255, blank=True)
+    created_at = models.DateTimeField("أُنشئ في", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "ملف مخزّن"
+        verbose_name_plural = "ملفات مخزّنة"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.sha256[:12]}… ({self.size} بايت)"
+
+
+class BlobFileMixin:
+    """رابط تنزيل المرفق: من التخزين البعيد، أو من نسخة التجهيز إن لم يكتمل رفعه بعد."""
+
+    @property
+    def url(self):
+        if self.blob_id and self.blob.state != "UPLOADED":
+            return reverse("attachments:blob", args=[self.blob.sha256])
+        return self.file.url
+
+    @property
+    def thumbnail_url(self):
+        """رابط المصغّر إن كان المرفق صورة/PDF؛ يولَّد عند أول طلب إن لم يكن جاهزًا."""
+        if not self.blob_id:
+            return None
+        if self.blob.thumbnail:
+            return self.blob.thumbnail.url
+        from .previews import can_preview
+        if can_preview(self.blob):
+            return reverse("attachments:thumbnail", args=[self.blob.sha256])
+        return None
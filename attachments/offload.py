@@ -0,0 +1,126 @@
+# attachments/offload.py
+"""
+رفع الملفات إلى التخزين البعيد (Cloudinary) خارج دورة الطلب.
+
+يُحفظ الملف المستلم أولًا في مجلد تجهيز محلي ويُسجَّل Blob بحالة PENDING داخل
+نفس معاملة الطلب، ثم يُدفع إلى التخزين الافتراضي بعد الـ commit عبر مجموعة
+عمّال في الخلفية مع إعادة المحاولة. الملفات العالقة (إعادة تشغيل الخادم مثلًا)
+يعيد دفعها الأمر push_pending_blobs، ويجب جدولته دوريًا متى فُعّل
+ATTACHMENTS_ASYNC_UPLOAD (معطّل افتراضيًا: الرفع متزامن داخل الطلب).
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import close_old_connections, transaction
+from django.utils.functional import LazyObject
+
+from .models import Blob
+
+logger = logging.getLogger(__name__)
+
+
+class _StagingStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = FileSystemStorage(location=settings.ATTACHMENTS_STAGING_ROOT)
+
+
+staging_storage = _StagingStorage()
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "ATTACHMENTS_UPLOAD_WORKERS", 4),
+    thread_name_prefix="blob-upload",
+)
+
+
+def _attachment_models():
+    """نماذج المرفقات التي تشير إلى Blob (تُكتشف من العلاقات العكسية المخفية)."""
+    return [
+        rel.related_model
+        for rel in Blob._meta.get_fields(include_hidden=True)
+        if rel.auto_created and not rel.concrete and rel.field.name == "blob"
+    ]
+
+
+def stage(blob, f):
+    """يحفظ الملف في مجلد التجهيز المحلي ويهيّئ Blob بحالة PENDING (دون حفظه)."""
+    name = blob.file.field.generate_filename(blob, f.name)
+    blob.staged_name = staging_storage.save(name, f)
+    blob.file.name = name
+    blob.state = "PENDING"
+
+
+def discard(blob):
+    """يحذف نسخة التجهيز لـ Blob لم يُعتمد (سباق على نفس البصمة)."""
+    if blob.staged_name:
+        staging_storage.delete(blob.staged_name)
+
+
+def schedule(blob_id, upload=True):
+    """
+    يجدول بعد نجاح المعاملة الحالية: دفع الملف للتخزين البعيد (upload)،
+    ثم توليد المصغّر مسبقًا إن كان ATTACHMENTS_EAGER_THUMBNAILS مفعّلًا.
+    """
+    thumb = getattr(settings, "ATTACHMENTS_EAGER_THUMBNAILS", False)
+    if upload or thumb:
+        transaction.on_commit(lambda: _executor.submit(_run, blob_id, upload, thumb))
+
+
+def _run(blob_id, upload=True, thumb=False):
+    close_old_connections()
+    try:
+        if thumb:
+            # من نسخة التجهيز المحلية قبل الرفع: لا حاجة لتنزيل الأصل من التخزين البعيد
+            from .previews import ensure_thumbnail
+            blob = Blob.objects.filter(pk=blob_id).first()
+            if blob:
+                ensure_thumbnail(blob)
+        if upload:
+            push(blob_id)
+    except Exception:
+        logger.exception("blob background job %s crashed", blob_id)
+    finally:
+        close_old_connections()
+
+
+def push(blob_id):
+    """
+    يرفع نسخة التجهيز إلى التخزين الافتراضي مع إعادة المحاولة (تأخير متضاعف).
+    عند النجاح يصبح Blob بحالة UPLOADED ويُحدَّث اسم الملف في كل المرفقات المشيرة إليه.
+    يرجّع True عند النجاح.
+    """
+    blob = Blob.objects.filter(pk=blob_id).exclude(state="UPLOADED").first()
+    if blob is None:
+        return True
+    retries = getattr(settings, "ATTACHMENTS_UPLOAD_RETRIES", 3)
+    backoff = getattr(settings, "ATTACHMENTS_UPLOAD_BACKOFF", 2.0)
+    error = ""
+    for attempt in range(retries):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        blob.attempts += 1
+        try:
+            with staging_storage.open(blob.staged_name, "rb") as fh:
+                name = default_storage.save(blob.file.name, File(fh, name=blob.file.name))
+            break
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            logger.warning("blob %s upload attempt %s failed: %s", blob.pk, blob.attempts, error)
+    else:
+        Blob.objects.filter(pk=blob.pk).update(state="FAILED", attempts=blob.attempts, last_error=error)
+        return False
+
+    staged = blob.staged_name
+    with transaction.atomic():
+        Blob.objects.filter(pk=blob.pk).update(
+            file=name, state="UPLOADED", staged_name="", attempts=blob.attempts, last_error="",
+        )
+        if name != blob.file.name:
+            # التخزين البعيد قد يغيّر الاسم؛ المرفقات تحمل نسخة منه
+            for model in _attachment_models():
+                model.objects.filter(blob_id=blob.pk).update(file=name)
+    staging_storage.delete(staged)
+    return True
@@ -0,0 +1,88 @@
+# attachments/previews.py
+"""
+مصغّرات WebP للمرفقات: للصور عبر Pillow، وللصفحة الأولى من ملفات PDF عبر
+PyMuPDF (في requirements.txt؛ إن غابت تُعرض روابط PDF كما هي).
+
+المصغّر مرتبط بالـ Blob، أي ببصمة المحتوى: يُولَّد مرة واحدة لكل محتوى مهما
+تكرر إرفاقه، ويُخزَّن في التخزين الافتراضي ويُسجَّل اسمه في Blob.thumbnail.
+يُولَّد في الخلفية بعد الرفع، أو عند أول طلب له إن لم يكن جاهزًا.
+"""
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Blob
+from .uploads import file_ext
+
+try:
+    import pymupdf
+    HAS_PDF_RENDERER = True
+except ImportError:  # pragma: no cover - بيئة بلا PyMuPDF
+    pymupdf = None
+    HAS_PDF_RENDERER = False
+
+logger = logging.getLogger(__name__)
+
+THUMB_SIZE = (480, 480)
+THUMB_QUALITY = 78
+IMAGE_EXTS = {".png", ".jpg", ".jpeg"}
+# حماية من الصور المضغوطة بأبعاد ضخمة (decompression bomb)
+MAX_SOURCE_PIXELS = 40_000_000
+
+
+def can_preview(blob):
+    ext = file_ext(blob.file.name)
+    return ext in IMAGE_EXTS or (ext == ".pdf" and HAS_PDF_RENDERER)
+
+
+def _open_source(blob):
+    """يفتح المحتوى الأصلي: من نسخة التجهيز المحلية إن لم يكتمل رفعه، وإلا من التخزين."""
+    if blob.state != "UPLOADED" and blob.staged_name:
+        from .offload import staging_storage
+        return staging_storage.open(blob.staged_name, "rb")
+    return blob.file.storage.open(blob.file.name, "rb")
+
+
+def _pdf_first_page(fh):
+    with pymupdf.open(stream=fh.read(), filetype="pdf") as doc:
+        page = doc.load_page(0)
+        zoom = min(THUMB_SIZE[0] / page.rect.width, THUMB_SIZE[1] / page.rect.height) * 2
+        pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def render(blob):
+    """يرجّع بايتات WebP للمصغّر."""
+    with _open_source(blob) as fh:
+        if file_ext(blob.file.name) == ".pdf":
+            img = _pdf_first_page(fh)
+        else:
+            img = Image.open(fh)
+            if img.width * img.height > MAX_SOURCE_PIXELS:
+                raise ValueError("image too large to preview")
+            img.draft("RGB", THUMB_SIZE)  # فك ترميز JPEG بدقة مخفّضة مباشرة
+            img = ImageOps.exif_transpose(img)
+        img.thumbnail(THUMB_SIZE)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=THUMB_QUALITY, method=4)
+    return out.getvalue()
+
+
+def ensure_thumbnail(blob):
+    """يرجّع اسم المصغّر المخزّن، ويولّده إن لم يوجد. None إن تعذّر التوليد."""
+    if blob.thumbnail:
+        return blob.thumbnail.name
+    if not can_preview(blob):
+        return None
+    try:
+        data = render(blob)
+    except Exception:
+        logger.warning("thumbnail for blob %s failed", blob.pk, exc_info=True)
+        return None
+    blob.thumbnail.save(f"{blob.sha256}.webp", ContentFile(data), save=False)
+    Blob.objects.filter(pk=blob.pk).update(thumbnail=blob.thumbnail.name)
+    return blob.thumbnail.name
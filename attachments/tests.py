@@ -0,0 +1,241 @@
+import hashlib
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from kingabdulaziz205.testing import TempMediaMixin, make_referral, make_user
+from messaging.models import Message, MessageAttachment, Thread
+from referrals.models import Attachment
+from . import offload
+from .blobs import store_blob
+from .models import Blob
+from .previews import HAS_PDF_RENDERER, THUMB_SIZE, ensure_thumbnail
+from .uploads import ERR_EMPTY, ERR_MAGIC, ChecksumUploadHandler
+
+
+def png_bytes(color="red", size=(32, 24)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+PNG = png_bytes()
+
+
+def make_blob(content=PNG, name="scan.png"):
+    blob = Blob(sha256=hashlib.sha256(content).hexdigest(), size=len(content))
+    blob.file.save(name, ContentFile(content))
+    return blob
+
+
+class UploadValidationTests(TempMediaMixin, TestCase):
+    """فحص البصمة والتوقيع أثناء الاستقبال في عروض المرفقات."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def _send(self, name, content):
+        return self.client.post(reverse("messaging:new"), {
+            "recipient": "bob", "subject": "مرفق", "content": "نص",
+            "files": SimpleUploadedFile(name, content),
+        })
+
+    def test_magic_mismatch_and_empty_files_rejected(self):
+        self.assertEqual(self._send("x.png", b"not a png at all").context["error"], ERR_MAGIC)
+        self.assertEqual(self._send("x.pdf", b"").context["error"], ERR_EMPTY)
+        self.assertFalse(Thread.objects.exists())
+
+    def test_checksum_computed_while_streaming(self):
+        resp = self._send("scan.png", PNG)
+        self.assertEqual(resp.status_code, 302)
+        att = MessageAttachment.objects.select_related("blob").get()
+        self.assertEqual(att.blob.sha256, hashlib.sha256(PNG).hexdigest())
+
+    def test_mismatched_file_is_flagged_not_emptied(self):
+        handler = ChecksumUploadHandler()
+        handler.new_file("files", "notes.pdf", "application/pdf", 11)
+        handler.receive_data_chunk(b"hello world", 0)
+        f = handler.file_complete(11)
+        self.assertEqual(f.upload_error, ERR_MAGIC)
+        self.assertEqual(f.read(), b"hello world")
+
+
+class BlobAccessTests(TempMediaMixin, TestCase):
+    """روابط الملف والمصغّر بالبصمة تُقدَّم فقط لمن يرى الإحالة/المراسلة المرفق بها."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = (make_user(name) for name in ("alice", "bob", "carol"))
+        cls.manager = make_user("boss", "مدير المدرسة")
+        ref = make_referral(cls.alice)
+        cls.ref_blob = make_blob()
+        Attachment.objects.create(referral=ref, blob=cls.ref_blob, file=cls.ref_blob.file.name, uploaded_by=cls.alice)
+        thread = Thread.objects.create(subject="م", sender=cls.alice, recipient=cls.carol)
+        msg = Message.objects.create(thread=thread, author=cls.alice, content="نص")
+        cls.msg_blob = make_blob(png_bytes("blue"))
+        MessageAttachment.objects.create(message=msg, blob=cls.msg_blob, file=cls.msg_blob.file.name, uploaded_by=cls.alice)
+
+    def _status(self, user, name, blob):
+        self.client.force_login(user)
+        return self.client.get(reverse(f"attachments:{name}", args=[blob.sha256])).status_code
+
+    def test_only_participants_fetch_blob_and_thumbnail(self):
+        for name in ("blob", "thumbnail"):
+            with self.subTest(name=name):
+                self.assertEqual(self._status(self.alice, name, self.ref_blob), 302)
+                self.assertEqual(self._status(self.manager, name, self.ref_blob), 302)
+                self.assertEqual(self._status(self.bob, name, self.ref_blob), 404)
+                self.assertEqual(self._status(self.carol, name, self.ref_blob), 404)
+                self.assertEqual(self._status(self.carol, name, self.msg_blob), 302)
+                self.assertEqual(self._status(self.bob, name, self.msg_blob), 404)
+
+
+class BlobDedupTests(TempMediaMixin, TestCase):
+    """المحتوى نفسه يُخزَّن مرة واحدة مهما تكرر إرفاقه في الإحالات والمراسلات."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def _refer(self, content, name="scan.png"):
+        return self.client.post(reverse("referrals:new"), {
+            "student_name": "سعد علي", "grade": "1", "referral_type": "behavior",
+            "details": "تفاصيل كافية للإحالة", "assignee": self.bob.id,
+            "attachments": SimpleUploadedFile(name, content),
+        })
+
+    def _message(self, content, name="copy.png"):
+        return self.client.post(reverse("messaging:new"), {
+            "recipient": "bob", "subject": "مرفق", "content": "نص",
+            "files": SimpleUploadedFile(name, content),
+        })
+
+    def test_same_content_shares_one_blob(self):
+        self.assertEqual(self._refer(PNG).status_code, 302)
+        self.assertEqual(self._message(PNG).status_code, 302)
+        blob = Blob.objects.get()
+        self.assertEqual(Attachment.objects.get().blob, blob)
+        self.assertEqual(MessageAttachment.objects.get().blob, blob)
+        self.assertEqual(MessageAttachment.objects.get().file.name, blob.file.name)
+
+        self.assertEqual(self._message(png_bytes("green")).status_code, 302)
+        self.assertEqual(Blob.objects.count(), 2)
+
+
+class OffloadTests(TempMediaMixin, TestCase):
+    """الرفع في الخلفية: Blob بحالة PENDING يُقدَّم من نسخة التجهيز حتى يكتمل دفعه."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        thread = Thread.objects.create(subject="م", sender=cls.alice, recipient=cls.alice)
+        cls.msg = Message.objects.create(thread=thread, author=cls.alice, content="نص")
+
+    def setUp(self):
+        self.staging = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging, ignore_errors=True)
+        storage = FileSystemStorage(location=self.staging)
+        for target in ("attachments.offload.staging_storage", "attachments.views.staging_storage"):
+            patcher = mock.patch(target, storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _stage(self, content=PNG, name="scan.png", content_type="image/png"):
+        with self.settings(ATTACHMENTS_ASYNC_UPLOAD=True):
+            blob = store_blob(SimpleUploadedFile(name, content, content_type=content_type))
+        MessageAttachment.objects.create(message=self.msg, blob=blob, file=blob.file.name, uploaded_by=self.alice)
+        return blob
+
+    def test_staged_content_type_ignores_client_header(self):
+        self.client.force_login(self.alice)
+        image = self._stage(content_type="text/html")
+        resp = self.client.get(reverse("attachments:blob", args=[image.sha256]))
+        self.assertEqual((image.content_type, resp["Content-Type"]), ("image/png", "image/png"))
+        self.assertEqual(resp["X-Content-Type-Options"], "nosniff")
+        self.assertFalse(resp.get("Content-Disposition", "").startswith("attachment"))
+
+        pdf = self._stage(b"%PDF-1.4 <script>alert(1)</script>", "letter.pdf", "text/html")
+        resp = self.client.get(reverse("attachments:blob", args=[pdf.sha256]))
+        self.assertEqual(resp["Content-Type"], "application/pdf")
+        self.assertTrue(resp["Content-Disposition"].startswith("attachment"))
+
+    def test_pending_blob_served_from_staging_then_pushed(self):
+        blob = self._stage()
+        self.assertEqual((blob.state, blob.file.storage.exists(blob.file.name)), ("PENDING", False))
+        self.client.force_login(self.alice)
+        resp = self.client.get(reverse("attachments:blob", args=[blob.sha256]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b"".join(resp.streaming_content), PNG)
+
+        # الاسم مشغول في التخزين ⇐ يعطي التخزين اسمًا آخر ويُنقل للمرفقات
+        taken = blob.file.name
+        blob.file.storage.save(taken, ContentFile(b"x"))
+        self.assertTrue(offload.push(blob.pk))
+        blob.refresh_from_db()
+        self.assertEqual((blob.state, blob.staged_name), ("UPLOADED", ""))
+        self.assertNotEqual(blob.file.name, taken)
+        self.assertEqual(blob.file.read(), PNG)
+        blob.file.close()
+        self.assertEqual(MessageAttachment.objects.get().file.name, blob.file.name)
+        self.assertEqual(os.listdir(os.path.join(self.staging, "blobs", blob.sha256[:2])), [])
+
+    @override_settings(ATTACHMENTS_UPLOAD_RETRIES=2, ATTACHMENTS_UPLOAD_BACKOFF=0)
+    def test_failed_push_keeps_staged_copy(self):
+        blob = self._stage()
+        with mock.patch("attachments.offload.default_storage.save", side_effect=OSError("down")), \
+                self.assertLogs("attachments.offload", "WARNING"):
+            self.assertFalse(offload.push(blob.pk))
+        blob.refresh_from_db()
+        self.assertEqual((blob.state, blob.attempts), ("FAILED", 2))
+        self.assertIn("down", blob.last_error)
+        self.assertTrue(offload.staging_storage.exists(blob.staged_name))
+
+
+class ThumbnailTests(TempMediaMixin, TestCase):
+    """مصغّر WebP واحد لكل محتوى، يُولَّد مرة ويُعاد استخدامه."""
+
+    def test_image_thumbnail_generated_once(self):
+        blob = make_blob(png_bytes(size=(1200, 900)))
+        name = ensure_thumbnail(blob)
+        self.assertTrue(name.endswith(f"{blob.sha256}.webp"))
+        self.assertEqual(Blob.objects.get(pk=blob.pk).thumbnail.name, name)
+        with blob.thumbnail.open("rb") as fh, Image.open(fh) as img:
+            self.assertEqual(img.format, "WEBP")
+            self.assertLessEqual(img.width, THUMB_SIZE[0])
+            self.assertLessEqual(img.height, THUMB_SIZE[1])
+
+        with mock.patch("attachments.previews.render") as render:
+            self.assertEqual(ensure_thumbnail(Blob.objects.get(pk=blob.pk)), name)
+        render.assert_not_called()
+
+    def test_unpreviewable_and_broken_sources(self):
+        self.assertIsNone(ensure_thumbnail(make_blob(b"PK\x03\x04 docx", "notes.docx")))
+        with self.assertLogs("attachments.previews", "WARNING"):
+            self.assertIsNone(ensure_thumbnail(make_blob(b"\x89PNG\r\n\x1a\n broken", "bad.png")))
+
+    @unittest.skipUnless(HAS_PDF_RENDERER, "PyMuPDF غير مثبّتة")
+    def test_pdf_first_page(self):
+        import pymupdf
+        doc = pymupdf.open()
+        doc.new_page(width=595, height=842)
+        blob = make_blob(doc.tobytes(), "letter.pdf")
+        self.assertTrue(ensure_thumbnail(blob).endswith(".webp"))
@@ -0,0 +1,137 @@
+# attachments/uploads.py
+"""
+التحقق من المرفقات أثناء استقبالها (بث على مقاطع) بدل التحقق بعد تحميلها كاملة:
+
+- ChecksumUploadHandler يكتب كل ملف إلى ملف مؤقت على القرص (لا يبقى في الذاكرة)
+  ويحسب SHA-256 مع كل مقطع، ويفحص البايتات الأولى (magic bytes)، ويتوقف عن
+  حفظ البيانات فور تجاوز MAX_FILE_SIZE. يُركَّب لعروض المرفقات فقط (checksum_uploads)
+  لا لكل الموقع، فرفع لوحة الإدارة وغيرها يبقى بمعالجات Django الافتراضية.
+- validate_uploads يتحقق من الامتداد والحجم (والملف الفارغ) وتطابق المحتوى مع الامتداد.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+ALLOWED_EXTS = {".pdf", ".png", ".jpg", ".jpeg", ".doc", ".docx"}
+MAX_FILE_SIZE = 10 * 1024 * 1024
+MAX_FILES = 5
+
+# التواقيع المقبولة لكل امتداد
+MAGIC = {
+    ".pdf": (b"%PDF-",),
+    ".png": (b"\x89PNG\r\n\x1a\n",),
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+    ".doc": (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",),
+    ".docx": (b"PK\x03\x04",),
+}
+SNIFF_BYTES = 8
+
+# نوع المحتوى يُشتق من الامتداد المسموح (المطابق لتوقيعه) لا مما يرسله العميل
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".doc": "application/msword",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+ERR_TYPE = "نوع ملف غير مسموح."
+ERR_SIZE = "حجم الملف يتجاوز 10MB."
+ERR_MAGIC = "محتوى الملف لا يطابق امتداده."
+ERR_EMPTY = "الملف فارغ."
+
+
+def file_ext(name):
+    return os.path.splitext(name or "")[1].lower()
+
+
+def content_type_for(name):
+    return CONTENT_TYPES.get(file_ext(name), DEFAULT_CONTENT_TYPE)
+
+
+def magic_matches(ext, head):
+    return any(head.startswith(sig) for sig in MAGIC.get(ext, ()))
+
+
+class ChecksumUploadHandler(TemporaryFileUploadHandler):
+    """
+    يكتب الملف على القرص مقطعًا مقطعًا ويضيف إلى الملف الناتج:
+    sha256 (بصمة المحتوى) و upload_error (ERR_SIZE/ERR_MAGIC/ERR_EMPTY أو None).
+    الملف ذو التوقيع الخاطئ يُحفظ كما هو ويُعلَّم فقط؛ ولا يُهمل إلا ما تجاوز الحجم.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.upload_error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.upload_error == ERR_SIZE:
+            return None  # نتجاهل بقية الملف الكبير دون كتابته
+        if start == 0 and not magic_matches(file_ext(self.file_name), raw_data[:SNIFF_BYTES]):
+            self.upload_error = ERR_MAGIC
+        self.received += len(raw_data)
+        if self.received > MAX_FILE_SIZE:
+            self.upload_error = ERR_SIZE
+            return None
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        f = super().file_complete(file_size)
+        if not file_size and not self.upload_error:
+            self.upload_error = ERR_EMPTY  # لا مقاطع = لم يُفحص التوقيع أصلًا
+        f.sha256 = None if self.upload_error else self.hasher.hexdigest()
+        f.upload_error = self.upload_error
+        return f
+
+
+def checksum_uploads(view):
+    """
+    يركّب ChecksumUploadHandler أولًا لطلبات هذا العرض. يجب تركيبه قبل قراءة
+    request.POST، وCsrfViewMiddleware يقرؤها قبل العرض، فيُؤجَّل فحص CSRF إلى داخله.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, ChecksumUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def validate_upload(f):
+    """يرجّع رسالة الخطأ أو None. يعمل أيضًا مع ملفات لم تمر بـ ChecksumUploadHandler."""
+    ext = file_ext(f.name)
+    if ext not in ALLOWED_EXTS:
+        return ERR_TYPE
+    if getattr(f, "upload_error", None):
+        return f.upload_error
+    size = getattr(f, "size", 0) or 0
+    if size > MAX_FILE_SIZE:
+        return ERR_SIZE
+    if not size:
+        return ERR_EMPTY
+    if not hasattr(f, "upload_error"):
+        head = f.read(SNIFF_BYTES)
+        f.seek(0)
+        if not magic_matches(ext, head):
+            return ERR_MAGIC
+    return None
+
+
+def validate_uploads(files):
+    """(الملفات المقبولة، None) أو (None، أول رسالة خطأ)."""
+    for f in files:
+        err = validate_upload(f)
+        if err:
+            return None, err
+    return list(files), None
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = "attachments"
+
+urlpatterns = [
+    path("blobs/<str:sha256>/", views.blob_file, name="blob"),
+    path("thumbs/<str:sha256>/", views.thumbnail, name="thumbnail"),
+]
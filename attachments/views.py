@@ -0,0 +1,69 @@
+import os
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect
+
+from messaging.models import MessageAttachment
+from referrals.models import ActionAttachment, Attachment
+from .models import Blob
+from .offload import staging_storage
+from .previews import ensure_thumbnail
+from .uploads import content_type_for
+
+
+def _visible_blob(request, sha256):
+    """
+    الـ Blob إن كان مرفقًا بإحالة أو مراسلة يحق للمستخدم رؤيتها، وإلا 404:
+    معرفة البصمة وحدها لا تمنح الوصول للملف (ولا تكشف وجوده).
+    """
+    blob = get_object_or_404(Blob, sha256=sha256)
+    if request.capabilities.is_manager:
+        return blob
+    uid = request.user.id
+    if (
+        Attachment.objects.filter(Q(referral__created_by_id=uid) | Q(referral__assignee_id=uid), blob=blob).exists()
+        or ActionAttachment.objects.filter(
+            Q(action__referral__created_by_id=uid) | Q(action__referral__assignee_id=uid), blob=blob,
+        ).exists()
+        or MessageAttachment.objects.filter(
+            Q(message__thread__sender_id=uid) | Q(message__thread__recipient_id=uid), blob=blob,
+        ).exists()
+    ):
+        return blob
+    raise Http404("الملف غير موجود")
+
+
+@login_required
+def blob_file(request, sha256):
+    """
+    يقدّم ملفًا لم يكتمل رفعه للتخزين البعيد من نسخة التجهيز المحلية،
+    ويحوّل إلى الرابط البعيد بعد اكتمال الرفع.
+    """
+    blob = _visible_blob(request, sha256)
+    if blob.state == "UPLOADED":
+        return redirect(blob.file.url)
+    if not blob.staged_name or not staging_storage.exists(blob.staged_name):
+        raise Http404("الملف غير متاح حاليًا")
+    # النوع من الامتداد المسموح لا مما أرسله الرافع، وما ليس صورة يُنزَّل ولا يُعرض
+    # داخل الموقع (HTML/SVG منتحل = XSS مخزّن)
+    content_type = content_type_for(blob.file.name)
+    response = FileResponse(
+        staging_storage.open(blob.staged_name, "rb"),
+        content_type=content_type,
+        as_attachment=not content_type.startswith("image/"),
+        filename=os.path.basename(blob.file.name),
+    )
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+@login_required
+def thumbnail(request, sha256):
+    """يولّد مصغّر المحتوى عند أول طلب (إن لم يُولَّد في الخلفية بعد) ثم يحوّل إليه."""
+    blob = _visible_blob(request, sha256)
+    name = ensure_thumbnail(blob)
+    if not name:
+        return redirect("attachments:blob", sha256=sha256)
+    return redirect(blob.thumbnail.url)
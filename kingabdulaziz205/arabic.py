@@ -0,0 +1,31 @@
+# kingabdulaziz205/arabic.py
+"""
+توحيد النص العربي قبل المقارنة أو الفهرسة، فتتطابق الكتابات المختلفة للكلمة نفسها:
+  - حذف التشكيل والتطويل (ـ)
+  - أشكال الألف (أ إ آ ٱ) → ا، والألف المقصورة ى → ي، والتاء المربوطة ة → ه
+  - الهمزة على الواو/الياء (ؤ ئ) → و/ي
+  - الأرقام العربية الهندية والفارسية → 0-9
+"""
+import re
+import unicodedata
+
+DIACRITICS_RE = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+TATWEEL = "\u0640"
+
+_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ة": "ه",
+    "ؤ": "و", "ئ": "ي",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_arabic(text: str) -> str:
+    """النص موحّدًا (حروف صغيرة للاتيني، مسافات مفردة)."""
+    s = unicodedata.normalize("NFKC", text or "")
+    s = DIACRITICS_RE.sub("", s).replace(TATWEEL, "")
+    s = s.translate(_LETTERS).casefold()
+    return _SPACES_RE.sub(" ", s).strip()
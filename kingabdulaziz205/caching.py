@@ -0,0 +1,85 @@
+# kingabdulaziz205/caching.py
+"""
+طبقة cache-aside مشتركة فوق django.core.cache.
+
+المفاتيح مقسّمة إلى نطاقات (namespace) لكلٍّ منها رقم نسخة مخزّن في الكاش:
+    <namespace>:<version>:<parts...>
+invalidate(namespace) يرفع رقم النسخة فتصبح كل مفاتيح النطاق القديمة غير
+مرئية دفعة واحدة (وتنتهي صلاحيتها لاحقًا) دون الحاجة لمعرفة مفاتيحها.
+"""
+import functools
+import hashlib
+import time
+from typing import Callable, Optional, TypeVar
+
+from django.core.cache import cache
+
+T = TypeVar("T")
+
+_MISSING = object()
+DEFAULT_TIMEOUT = 300
+MAX_KEY_LENGTH = 200
+
+
+def _initial_version() -> int:
+    # يبدأ من الزمن الحالي: لو فُقد رقم النسخة (إخلاء/إعادة تشغيل) لا تعود مفاتيح قديمة للحياة
+    return time.time_ns() // 1_000_000
+
+
+def _version_key(namespace: str) -> str:
+    return f"ns:{namespace}:version"
+
+
+def namespace_version(namespace: str) -> int:
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key, _initial_version())
+    return version
+
+
+def invalidate(namespace: str) -> None:
+    """يُبطل كل القيم المخزّنة تحت النطاق."""
+    key = _version_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def _part(value) -> str:
+    # الكائنات من قاعدة البيانات تُمثَّل بمفتاحها الأساسي
+    if hasattr(value, "_meta") and hasattr(value, "pk"):
+        return f"{value._meta.label_lower}#{value.pk}"
+    return str(value)
+
+
+def make_key(namespace: str, *parts) -> str:
+    key = f"{namespace}:{namespace_version(namespace)}:" + ":".join(_part(p) for p in parts)
+    if len(key) > MAX_KEY_LENGTH:
+        key = f"{namespace}:{namespace_version(namespace)}:h:" + hashlib.md5(key.encode()).hexdigest()
+    return key
+
+
+def get_or_compute(namespace: str, parts: tuple, compute: Callable[[], T],
+                   timeout: Optional[int] = DEFAULT_TIMEOUT) -> T:
+    """يرجّع القيمة من الكاش أو يحسبها بـ compute() ويخزّنها (None قيمة صالحة أيضًا)."""
+    key = make_key(namespace, *parts)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def memoize(namespace: str, timeout: Optional[int] = DEFAULT_TIMEOUT):
+    """مُزخرف: يخزّن نتيجة الدالة تحت النطاق بمفتاح من اسمها ومعاملاتها."""
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> T:
+            parts = (func.__qualname__, *args, *(f"{k}={v}" for k, v in sorted(kwargs.items())))
+            return get_or_compute(namespace, parts, lambda: func(*args, **kwargs), timeout)
+        wrapper.invalidate = lambda: invalidate(namespace)
+        return wrapper
+    return decorator
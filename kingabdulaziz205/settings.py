@@ -6,6 +6,7 @@ Generated by 'django-admin startproject' using Django 5.2.4.
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # =========================
@@ -22,6 +23,7 @@ SECRET_KEY = os.getenv(
     "django-insecure--yj&bf*x+ck1mr&39&jh29=p*qz(g*bf11!wab8ectrmk54&og",
 )
 DEBUG = os.getenv("DJANGO_DEBUG", "1") == "1"
+TESTING = sys.argv[1:2] == ["test"]
 ALLOWED_HOSTS = ["127.0.0.1", "localhost", ".onrender.com"]
 
 # على Render (خلف Proxy) – يخلي request.is_secure() يشتغل صح
@@ -48,9 +50,11 @@ INSTALLED_APPS = [
 
     # Local apps
     "accounts",
+    "attachments",
     "referrals",
     "workflow",
     "messaging",  # ⭐ تطبيق المراسلات
+    "search",
 ]
 
 # =========================
@@ -64,6 +68,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "accounts.middleware.CapabilitiesMiddleware",  # صلاحيات المستخدم مرة واحدة لكل طلب
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -85,6 +90,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "referrals.context_processors.active_news_ticker",  # ✅ تمرير الشريط الإخباري
+                "messaging.context_processors.unread_threads",      # ✅ شارة المراسلات غير المقروءة
             ],
         },
     },
@@ -140,6 +146,46 @@ LANGUAGES = [
 
 LOCALE_PATHS = [BASE_DIR / "locale"]
 
+# =========================
+# الكاش: CACHE_BACKEND = locmem | file | redis | dummy
+# =========================
+# الإبطال بالإشارات (caching.invalidate) يصل فقط للعمليات التي تشترك في الكاش نفسه:
+# locmem للتطوير والاختبارات فقط، وإلا فالافتراضي Redis إن عُرّف CACHE_URL وإلا ملفات مشتركة على القرص
+CACHE_BACKEND = os.getenv("CACHE_BACKEND") or (
+    "locmem" if DEBUG or TESTING else ("redis" if os.getenv("CACHE_URL") else "file")
+)
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "kingabdulaziz205",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / ".django_cache")),
+    },
+    # أي خادم يتكلم بروتوكول Redis (Redis/Valkey/KeyDB) — يتطلب حزمة redis
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://127.0.0.1:6379/1"),
+    },
+    "dummy": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    },
+}
+# عدد عمليات gunicorn (WEB_CONCURRENCY على Render): لكل عملية locmem خاص بها فلا يصلها إبطال غيرها
+if CACHE_BACKEND == "locmem" and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(
+        "CACHE_BACKEND=locmem لا يصلح مع أكثر من عملية (WEB_CONCURRENCY > 1): استخدم redis أو file."
+    )
+CACHES = {
+    "default": {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", "300")),
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "kaz205"),
+    },
+}
+
 # =========================
 # الملفات الثابتة (Static)
 # =========================
@@ -163,6 +209,25 @@ STORAGES = {
 MEDIA_URL = "/media/"            # يبقى كما هو (استعمال محلي فقط عند تعطيل Cloudinary)
 MEDIA_ROOT = BASE_DIR / "media"
 
+# تخزين محلي بديل لـ Cloudinary (التطوير والاختبارات): MEDIA_STORAGE=local
+if os.getenv("MEDIA_STORAGE", "cloudinary") == "local" or TESTING:
+    STORAGES["default"] = {"BACKEND": "django.core.files.storage.FileSystemStorage"}
+if TESTING:
+    # لا يوجد manifest للملفات الثابتة أثناء الاختبارات (لا يُشغَّل collectstatic)
+    STORAGES["staticfiles"] = {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}
+
+# الرفع للتخزين البعيد في الخلفية (اختياري، معطّل افتراضيًا): يُحفظ الملف أولًا في مجلد
+# تجهيز محلي ويُسجَّل بحالة PENDING ثم يدفعه عمّال داخل العملية. ما في الطابور يضيع عند
+# إعادة التشغيل، والنسخة المجهّزة لا تُقدَّم إلا من الخادم الذي استلمها؛ فعند التفعيل
+# يجب جدولة "manage.py push_pending_blobs" دوريًا (cron / systemd timer) على ذلك الخادم.
+ATTACHMENTS_ASYNC_UPLOAD = os.getenv("ATTACHMENTS_ASYNC_UPLOAD", "0") == "1"
+ATTACHMENTS_STAGING_ROOT = Path(os.getenv("ATTACHMENTS_STAGING_ROOT", BASE_DIR / "media_staging"))
+ATTACHMENTS_UPLOAD_WORKERS = int(os.getenv("ATTACHMENTS_UPLOAD_WORKERS", "4"))
+ATTACHMENTS_UPLOAD_RETRIES = int(os.getenv("ATTACHMENTS_UPLOAD_RETRIES", "3"))
+ATTACHMENTS_UPLOAD_BACKOFF = 2.0  # ثوانٍ، تتضاعف مع كل محاولة
+# توليد مصغّرات WebP للصور وأول صفحة PDF في الخلفية بعد الرفع (وإلا عند أول طلب)
+ATTACHMENTS_EAGER_THUMBNAILS = os.getenv("ATTACHMENTS_EAGER_THUMBNAILS", "1") == "1"
+
 # Cloudinary config (بيانات من .env)
 import cloudinary
 cloudinary.config(
@@ -179,6 +244,13 @@ LOGIN_REDIRECT_URL = "/referrals/"
 LOGOUT_REDIRECT_URL = "/"
 LOGIN_URL = "/accounts/login/"
 
+# تحميل الملف الشخصي (الدور) مع المستخدم في استعلام واحد؛
+# ModelBackend يبقى لجلسات سُجّلت قبل إضافته
+AUTHENTICATION_BACKENDS = [
+    "accounts.backends.ProfileModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 # =========================
 # نوع المفتاح الافتراضي
 # =========================
@@ -188,3 +260,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # إعدادات خاصة بالمشروع
 # =========================
 SCHOOL_SECRET_CODE = "61122_2025"
+
+# تنفيذ تعميم "الكل" في المراسلات بالخلفية مع تتبع التقدّم (بدل تنفيذه داخل الطلب)
+MESSAGING_BROADCAST_ASYNC = os.getenv("MESSAGING_BROADCAST_ASYNC", "0") == "1"
+
+# توزيع الإحالات بلا مكلّف على الموجّهين: round_robin | least_load | grade
+REFERRAL_ASSIGNMENT_STRATEGY = os.getenv("REFERRAL_ASSIGNMENT_STRATEGY", "least_load")
@@ -0,0 +1,56 @@
+# kingabdulaziz205/testing.py
+"""أدوات اختبار مشتركة بين التطبيقات: مستخدم بدور، إحالة بالحد الأدنى من الحقول، ووسائط مؤقتة."""
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.utils import timezone
+
+from accounts.models import Profile
+from referrals.models import Referral
+
+
+def make_user(username, role="معلم", full_name=None, **fields):
+    """مستخدم بكلمة المرور "x" وملف شخصي بالدور role (role=None: بلا ملف شخصي)."""
+    user = User.objects.create_user(username, password="x", **fields)
+    if role:
+        Profile.objects.create(user=user, role=role, full_name=full_name or username)
+    return user
+
+
+def make_referral(created_by, student_name="طالب", days_ago=0, **fields):
+    """إحالة من created_by؛ days_ago يرجع created_at إلى الوراء (ويُعاد تحميلها بعده)."""
+    ref = Referral.objects.create(**{
+        "student_name": student_name, "grade": "1", "referral_type": "behavior", "details": "تفاصيل",
+        "created_by": created_by, **fields,
+    })
+    if not days_ago:
+        return ref
+    Referral.objects.filter(pk=ref.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+    return Referral.objects.get(pk=ref.pk)
+
+
+class TempMediaMixin:
+    """
+    MEDIA_ROOT مؤقت لكل صنف اختبار ورفع متزامن (بلا عمّال خلفية) ما لم يُطلب غيره؛
+    media_settings تضيف إعدادات أخرى للصنف.
+    """
+    media_settings = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media = tempfile.mkdtemp()
+        cls._media_override = override_settings(**{
+            "MEDIA_ROOT": cls._media, "ATTACHMENTS_ASYNC_UPLOAD": False, "ATTACHMENTS_EAGER_THUMBNAILS": False,
+            **cls.media_settings,
+        })
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media, ignore_errors=True)
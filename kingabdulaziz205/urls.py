@@ -11,4 +11,6 @@ urlpatterns = [
     path('referrals/', include('referrals.urls')),
     path('messages/', include('messaging.urls')),  # ← مسار تطبيق المراسلات
     path('workflow/', include('workflow.urls')),
+    path('attachments/', include('attachments.urls')),
+    path('search/', include('search.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
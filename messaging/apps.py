@@ -4,3 +4,6 @@ class MessagingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'messaging'
     verbose_name = 'المراسلات'
+
+    def ready(self):
+        from . import signals  # noqa: F401
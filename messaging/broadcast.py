@@ -0,0 +1,96 @@
+# messaging/broadcast.py
+"""
+تعميم رسالة على كل المستخدمين النشطين ("ALL"/"الكل").
+
+بدل إنشاء Thread/Message/MessageAttachment لكل مستلم على حدة، تُخزَّن الملفات
+مرة واحدة (Blob) ثم تُنشأ المراسلات والرسائل والمرفقات بـ bulk_create داخل معاملة،
+وتُحدَّث مؤشرات آخر رسالة والعدّادات بتحديثات مجمّعة. يمكن تشغيلها في الخلفية
+(MESSAGING_BROADCAST_ASYNC) عبر BroadcastJob مع تتبع التقدّم.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from attachments.blobs import store_blob
+from attachments.models import Blob
+from search.index import index_objects
+from .models import BroadcastJob, Message, MessageAttachment, Thread
+from .unread import on_broadcast
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broadcast")
+
+
+def store_files_once(files):
+    """يخزّن كل ملف مرة واحدة (Blob بالبصمة) ويرجّع سجلاته."""
+    return [store_blob(f) for f in files]
+
+
+def _targets(sender):
+    return User.objects.filter(is_active=True).exclude(id=sender.id).order_by("id")
+
+
+def fan_out(sender, recipient_ids, subject, content, blobs):
+    """ينشئ مراسلة + رسالة (+ مرفقات مشتركة) لكل مستلم بعدد ثابت من الاستعلامات."""
+    with transaction.atomic():
+        threads = Thread.objects.bulk_create([
+            Thread(subject=subject, sender=sender, recipient_id=rid, status="OPEN")
+            for rid in recipient_ids
+        ])
+        msgs = Message.objects.bulk_create([
+            Message(thread=t, author=sender, content=content) for t in threads
+        ])
+        if blobs:
+            MessageAttachment.objects.bulk_create([
+                MessageAttachment(message=m, blob=b, file=b.file.name, uploaded_by=sender)
+                for m in msgs for b in blobs
+            ])
+        for t, m in zip(threads, msgs):
+            t.last_message, t.last_message_at, t.updated_at = m, m.created_at, m.created_at
+        Thread.objects.bulk_update(threads, ["last_message", "last_message_at", "updated_at"])
+        on_broadcast(sender.id, threads, msgs)
+        index_objects("message", msgs)
+    return len(threads)
+
+
+def send_broadcast(sender, subject, content, files):
+    """
+    نقطة الدخول من الفيو. ترجّع (عدد المستلمين، None) عند التنفيذ المباشر
+    أو (None, BroadcastJob) عند التنفيذ في الخلفية.
+    """
+    blobs = store_files_once(files)
+    if not getattr(settings, "MESSAGING_BROADCAST_ASYNC", False):
+        ids = list(_targets(sender).values_list("id", flat=True))
+        return fan_out(sender, ids, subject, content, blobs), None
+
+    job = BroadcastJob.objects.create(
+        sender=sender, subject=subject, content=content, blob_ids=[b.pk for b in blobs],
+        total=_targets(sender).count(),
+    )
+    transaction.on_commit(lambda: _executor.submit(run_job, job.pk))
+    return None, job
+
+
+def run_job(job_id):
+    """تنفيذ BroadcastJob على دفعات، مع تحديث done بعد كل دفعة."""
+    close_old_connections()
+    try:
+        job = BroadcastJob.objects.select_related("sender").get(pk=job_id)
+        BroadcastJob.objects.filter(pk=job_id).update(status="RUNNING")
+        ids = list(_targets(job.sender).values_list("id", flat=True))
+        blobs = list(Blob.objects.filter(pk__in=job.blob_ids))
+        for i in range(0, len(ids), CHUNK_SIZE):
+            done = fan_out(job.sender, ids[i:i + CHUNK_SIZE], job.subject, job.content, blobs)
+            BroadcastJob.objects.filter(pk=job_id).update(done=i + done)
+        BroadcastJob.objects.filter(pk=job_id).update(status="DONE", finished_at=timezone.now())
+    except Exception as exc:
+        logger.exception("broadcast job %s failed", job_id)
+        BroadcastJob.objects.filter(pk=job_id).update(status="FAILED", error=str(exc), finished_at=timezone.now())
+    finally:
+        close_old_connections()
@@ -0,0 +1,15 @@
+# messaging/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
+from .unread import get_counter
+
+
+def unread_threads(request):
+    """
+    عدد المراسلات غير المقروءة لشارة الترويسة: {{ unread_threads }}
+    كسول — لا يُقرأ صف العدّاد إلا إن استُخدم المتغير في القالب.
+    """
+    user = getattr(request, "user", None)
+    if not (user and user.is_authenticated):
+        return {"unread_threads": 0}
+    return {"unread_threads": SimpleLazyObject(lambda: get_counter(user.id).unread)}
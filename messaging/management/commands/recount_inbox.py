@@ -0,0 +1,26 @@
+# messaging/management/commands/recount_inbox.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from kingabdulaziz205.caching import invalidate
+from messaging.models import InboxCounter
+from messaging.unread import COUNTS_NAMESPACE, recount
+
+
+class Command(BaseCommand):
+    help = "يعيد حساب عدّادات صندوق المراسلات (المرسلة/الواردة/غير المقروءة) من الصفر."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", nargs="+", metavar="USERNAME", help="مستخدمون محددون فقط (افتراضيًا: الكل).")
+
+    def handle(self, *args, **opts):
+        users = User.objects.order_by("id")
+        if opts["user"]:
+            users = users.filter(username__in=opts["user"])
+        fixed = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            before = InboxCounter.objects.filter(user_id=user_id).values_list("sent", "received", "unread").first()
+            after = recount(user_id)
+            fixed += before != (after.sent, after.received, after.unread)
+        invalidate(COUNTS_NAMESPACE)
+        self.stdout.write(self.style.SUCCESS(f"صُحّحت عدّادات {fixed} مستخدم."))
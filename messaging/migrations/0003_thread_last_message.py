@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    Thread = apps.get_model("messaging", "Thread")
+    Message = apps.get_model("messaging", "Message")
+    last_ids = (
+        Message.objects.values("thread_id").annotate(last_id=models.Max("id"))
+        .order_by().values_list("last_id", flat=True)
+    )
+    batch = []
+    for m in Message.objects.filter(id__in=list(last_ids)).only("id", "thread_id", "created_at").iterator(chunk_size=500):
+        batch.append(Thread(id=m.thread_id, last_message_id=m.id, last_message_at=m.created_at))
+        if len(batch) >= 500:
+            Thread.objects.bulk_update(batch, ["last_message", "last_message_at"])
+            batch = []
+    if batch:
+        Thread.objects.bulk_update(batch, ["last_message", "last_message_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message'),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['-last_message_at', '-updated_at'], name='thread_last_message_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['sender', '-last_message_at'], name='thread_sender_last_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['recipient', '-last_message_at'], name='thread_recipient_last_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
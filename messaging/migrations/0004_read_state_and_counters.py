@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    # لا توجد إيصالات قراءة بعد، فالمراسلة غير مقروءة للمشارك إن كانت آخر رسالة من غيره.
+    # كما في unread.recount: المراسلة إلى النفس تُعدّ في sent فقط
+    from collections import Counter
+    Thread = apps.get_model("messaging", "Thread")
+    InboxCounter = apps.get_model("messaging", "InboxCounter")
+    sent, received, unread = Counter(), Counter(), Counter()
+    rows = Thread.objects.values_list("sender_id", "recipient_id", "last_message__author_id")
+    for sender_id, recipient_id, last_author_id in rows.iterator(chunk_size=1000):
+        sent[sender_id] += 1
+        if recipient_id != sender_id:
+            received[recipient_id] += 1
+        if last_author_id:
+            for uid in {sender_id, recipient_id} - {last_author_id}:
+                unread[uid] += 1
+    InboxCounter.objects.bulk_create([
+        InboxCounter(user_id=uid, sent=sent[uid], received=received[uid], unread=unread[uid])
+        for uid in set(sent) | set(received)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_thread_last_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('received', models.PositiveIntegerField(default=0)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_counter', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ThreadReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='messaging.thread')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thread_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'thread'), name='thread_read_state_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_read_state_and_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=140, verbose_name='الموضوع')),
+                ('content', models.TextField(blank=True)),
+                ('file_names', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('PENDING', 'بانتظار التنفيذ'), ('RUNNING', 'قيد الإرسال'), ('DONE', 'اكتمل'), ('FAILED', 'فشل')], default='PENDING', max_length=10, verbose_name='الحالة')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('done', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
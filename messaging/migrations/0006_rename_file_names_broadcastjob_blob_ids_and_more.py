@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0001_initial'),
+        ('messaging', '0005_broadcastjob'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='broadcastjob',
+            old_name='file_names',
+            new_name='blob_ids',
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attachments.blob'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid, os
 
+from attachments.models import BlobFileMixin
+
 def thread_upload_path(instance, filename):
     base, ext = os.path.splitext(filename)
     safe = base[:60].replace(" ", "_")
@@ -25,12 +27,37 @@ class Thread(models.Model):
     created_at  = models.DateTimeField(auto_now_add=True)
     updated_at  = models.DateTimeField(auto_now=True)
 
+    # مؤشر مُكرَّر لآخر رسالة (يُحدَّث عند كل إنشاء Message) لترتيب الصندوق في قاعدة البيانات
+    last_message    = models.ForeignKey("Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(fields=["sender", "-updated_at"], name="thread_sender_updated_idx"),
+            models.Index(fields=["recipient", "-updated_at"], name="thread_recipient_updated_idx"),
+            models.Index(fields=["-last_message_at", "-updated_at"], name="thread_last_message_idx"),
+            models.Index(fields=["sender", "-last_message_at"], name="thread_sender_last_idx"),
+            models.Index(fields=["recipient", "-last_message_at"], name="thread_recipient_last_idx"),
+        ]
 
     def __str__(self):
         return f"{self.reference} - {self.subject}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            from .unread import on_thread_created
+            on_thread_created(self)
+
+    @classmethod
+    def touch_last_message(cls, msg):
+        # تحديث واحد بدون قراءة؛ الشرط يمنع رسالة أقدم من استبدال أحدث عند التزامن
+        cls.objects.filter(pk=msg.thread_id).filter(
+            models.Q(last_message_at__isnull=True) | models.Q(last_message_at__lte=msg.created_at)
+        ).update(last_message=msg, last_message_at=msg.created_at, updated_at=msg.created_at)
+
 class Message(models.Model):
     thread     = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name="messages")
     author     = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -39,15 +66,83 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["thread", "created_at"], name="message_thread_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        prev = None
+        if adding:
+            prev = Thread.objects.filter(pk=self.thread_id).values_list("last_message_id", "last_message__author_id").first()
+        super().save(*args, **kwargs)
+        if adding:
+            from .unread import on_message_created
+            Thread.touch_last_message(self)
+            on_message_created(self, *(prev or (None, None)))
 
     def __str__(self):
         return f"رسالة {self.thread.reference} - {self.author.username}"
 
-class MessageAttachment(models.Model):
+class MessageAttachment(BlobFileMixin, models.Model):
     message     = models.ForeignKey(Message, on_delete=models.CASCADE, related_name="files")
     file        = models.FileField(upload_to=thread_upload_path)
+    blob        = models.ForeignKey("attachments.Blob", on_delete=models.PROTECT, null=True, blank=True, related_name="+")
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"مرفق {self.message.thread.reference}"
+
+
+class ThreadReadState(models.Model):
+    """آخر رسالة قرأها المستخدم في مراسلة (إيصال قراءة لكل مستخدم)."""
+    user                 = models.ForeignKey(User, on_delete=models.CASCADE, related_name="thread_read_states")
+    thread               = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name="read_states")
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at           = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "thread"], name="thread_read_state_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} قرأ {self.thread_id} حتى {self.last_read_message_id}"
+
+
+class InboxCounter(models.Model):
+    """
+    عدّادات صندوق المستخدم تُحدَّث تزايديًا عند الإرسال والفتح (messaging/unread.py)
+    فلا تحتاج الشارة في الترويسة ولا تبويبات الصندوق إلى أي COUNT.
+    """
+    user     = models.OneToOneField(User, on_delete=models.CASCADE, related_name="inbox_counter")
+    sent     = models.PositiveIntegerField(default=0)
+    received = models.PositiveIntegerField(default=0)
+    unread   = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} غير مقروءة"
+
+
+class BroadcastJob(models.Model):
+    """تعميم "الكل" يُنفَّذ في الخلفية على دفعات مع تتبع التقدّم."""
+    STATUS_CHOICES = [
+        ("PENDING", "بانتظار التنفيذ"),
+        ("RUNNING", "قيد الإرسال"),
+        ("DONE", "اكتمل"),
+        ("FAILED", "فشل"),
+    ]
+    sender      = models.ForeignKey(User, on_delete=models.CASCADE, related_name="broadcast_jobs")
+    subject     = models.CharField("الموضوع", max_length=140)
+    content     = models.TextField(blank=True)
+    blob_ids    = models.JSONField(default=list, blank=True)  # المرفقات المخزّنة مرة واحدة (attachments.Blob)
+    status      = models.CharField("الحالة", max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    total       = models.PositiveIntegerField(default=0)
+    done        = models.PositiveIntegerField(default=0)
+    error       = models.TextField(blank=True)
+    created_at  = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"تعميم {self.subject} ({self.done}/{self.total})"
@@ -0,0 +1,33 @@
+# messaging/signals.py
+"""
+إنقاص عدّادات الصندوق (unread.py) عند الحذف. الإنشاء يُعالَج في save() نفسها
+(Thread/Message) وفي on_broadcast للتعميم.
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Message, Thread
+from .unread import on_message_deleted, on_thread_deleted, unread_participants
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver(pre_delete, sender=Thread)
+def _thread_deleting(sender, instance, **kwargs):
+    # إيصالات القراءة تُحذف معها قبل post_delete، فتُحسب حالة القراءة هنا
+    instance._unread_ids = unread_participants(instance)
+
+
+@receiver(post_delete, sender=Thread)
+def _thread_deleted(sender, instance, **kwargs):
+    on_thread_deleted(instance, getattr(instance, "_unread_ids", set()))
+
+
+@receiver(post_delete, sender=Message)
+def _message_deleted(sender, instance, origin=None, **kwargs):
+    # رسائل المراسلة (أو المستخدم) المحذوفة كاملةً تُعالَج في _thread_deleted
+    if _origin_model(origin) is Message:
+        on_message_deleted(instance)
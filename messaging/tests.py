@@ -1,3 +1,179 @@
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from attachments.models import Blob
+from kingabdulaziz205.testing import TempMediaMixin, make_user
+from .broadcast import send_broadcast
+from .models import InboxCounter, Message, MessageAttachment, Thread
+from .unread import mark_read, recount
+
+
+class ThreadDetailQueryCountTests(TestCase):
+    """صفحة المراسلة تُبنى بعدد ثابت من الاستعلامات مهما طالت الرسائل وكثرت مرفقاتها."""
+
+    # جلسة + المستخدم مع ملفه الشخصي + المراسلة + حالة القراءة + الرسائل + مرفقاتها + عدّاد المراسلات
+    DETAIL_QUERIES = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.thread = Thread.objects.create(subject="اختبار", sender=cls.alice, recipient=cls.bob)
+        cls.blob_seq = 0
+
+    def setUp(self):
+        self.client.force_login(self.bob)
+        self.url = reverse("messaging:detail", args=[self.thread.pk])
+
+    def _grow(self, messages=4, files_per_message=2):
+        for i in range(messages):
+            m = Message.objects.create(thread=self.thread, author=self.alice, content=f"رسالة {i}")
+            for _ in range(files_per_message):
+                type(self).blob_seq += 1
+                sha = f"{self.blob_seq:064x}"
+                b = Blob.objects.create(sha256=sha, file=f"blobs/{sha[:2]}/{sha}.png", size=1)
+                MessageAttachment.objects.create(message=m, blob=b, file=b.file.name, uploaded_by=self.alice)
+
+    def _count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx)
+
+    def test_queries_do_not_grow_with_messages_and_files(self):
+        self._grow(messages=1, files_per_message=1)
+        self._count()  # أول زيارة تنشئ عدّاد المراسلات وحالة القراءة
+        small = self._count()
+        self._grow(messages=8, files_per_message=3)
+        self._count()  # تحديث حالة القراءة للرسائل الجديدة
+        self.assertEqual(self._count(), small)
+
+    def test_query_budget(self):
+        self._grow()
+        self._count()  # أول زيارة تنشئ عدّاد المراسلات وحالة القراءة
+        with self.assertNumQueries(self.DETAIL_QUERIES):
+            self.client.get(self.url)
+
+
+class InboxCounterTests(TestCase):
+    """العدّادات التزايدية تطابق العدّ الفعلي بعد الإنشاء والحذف."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice", role=None)
+        cls.bob = make_user("bob", role=None)
+
+    def _send(self, sender, recipient, n=1):
+        threads = []
+        for i in range(n):
+            t = Thread.objects.create(subject=f"م{i}", sender=sender, recipient=recipient)
+            Message.objects.create(thread=t, author=sender, content="نص")
+            threads.append(t)
+        return threads
+
+    def _counts(self, user):
+        c = InboxCounter.objects.get(user=user)
+        return c.sent, c.received, c.unread
+
+    def test_thread_delete_decrements(self):
+        threads = self._send(self.alice, self.bob, 5)
+        mark_read(self.bob, Thread.objects.get(pk=threads[0].pk))
+        self.assertEqual(self._counts(self.bob), (0, 5, 4))
+        Thread.objects.filter(pk__in=[t.pk for t in threads[:3]]).delete()
+        self.assertEqual(self._counts(self.alice), (2, 0, 0))
+        self.assertEqual(self._counts(self.bob), (0, 2, 2))
+
+    def test_thread_to_self_counts_once(self):
+        (t,) = self._send(self.alice, self.alice)
+        self.assertEqual(self._counts(self.alice), (1, 0, 0))
+        self.assertEqual(recount(self.alice.id).received, 0)
+        t.delete()
+        self.assertEqual(self._counts(self.alice), (0, 0, 0))
+
+    def test_message_delete_repoints_last_message(self):
+        (t,) = self._send(self.alice, self.bob)
+        reply = Message.objects.create(thread=t, author=self.bob, content="رد")
+        self.assertEqual(self._counts(self.alice)[2], 1)
+        reply.delete()
+        t.refresh_from_db()
+        self.assertEqual(t.last_message.author, self.alice)
+        self.assertEqual(self._counts(self.alice)[2], 0)
+        self.assertEqual(self._counts(self.bob)[2], 0)  # قرأ حتى رده فما قبله مقروء
+
+    def test_recount_command(self):
+        self._send(self.alice, self.bob, 3)
+        InboxCounter.objects.update(sent=99, received=99, unread=99)
+        call_command("recount_inbox", stdout=StringIO())
+        self.assertEqual(self._counts(self.alice), (3, 0, 0))
+        self.assertEqual(self._counts(self.bob), (0, 3, 3))
+
+
+class InboxPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+
+    def test_pages_follow_real_rows_after_delete(self):
+        for i in range(35):
+            t = Thread.objects.create(subject=f"م{i}", sender=self.alice, recipient=self.bob)
+            Message.objects.create(thread=t, author=self.alice, content="نص")
+        Thread.objects.filter(pk__in=Thread.objects.order_by("id").values("id")[:10]).delete()
+        # عدّاد منحرف (قبل recount_inbox) يؤثر في الشارة فقط لا في الصفحات
+        InboxCounter.objects.filter(user=self.bob).update(received=35)
+        self.client.force_login(self.bob)
+        resp = self.client.get(reverse("messaging:inbox"), {"scope": "inbox", "page": 2})
+        self.assertEqual(resp.status_code, 200)
+        page = resp.context["page_obj"]
+        self.assertEqual(page.paginator.num_pages, 1)
+        self.assertEqual(len(resp.context["items"]), 25)
+
+
+class BroadcastTests(TempMediaMixin, TestCase):
+    """التعميم: مراسلة لكل مستخدم نشط غير المرسل، والملف يُخزَّن مرة واحدة، بعدد ثابت من الاستعلامات."""
+
+    media_settings = {"MESSAGING_BROADCAST_ASYNC": False}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user("admin", role=None)
+        cls.users = [make_user(f"u{i}", role=None) for i in range(3)]
+        make_user("gone", role=None, is_active=False)
+
+    def _broadcast(self, name="notice.pdf"):
+        f = SimpleUploadedFile(name, b"%PDF-1.4 tameem", content_type="application/pdf")
+        return send_broadcast(self.admin, "تعميم", "نص التعميم", [f])
+
+    def test_fan_out_shares_one_blob(self):
+        sent, job = self._broadcast()
+        self.assertEqual((sent, job), (3, None))
+        threads = Thread.objects.filter(sender=self.admin)
+        self.assertEqual(sorted(threads.values_list("recipient_id", flat=True)), [u.id for u in self.users])
+        self.assertFalse(threads.filter(last_message__isnull=True).exists())
+        self.assertEqual(Blob.objects.count(), 1)
+        self.assertEqual(MessageAttachment.objects.filter(blob=Blob.objects.get()).count(), 3)
+
+        self._broadcast("again.pdf")  # المحتوى نفسه: لا Blob جديد
+        self.assertEqual(Blob.objects.count(), 1)
+        self.assertEqual(InboxCounter.objects.get(user=self.admin).sent, 6)
+        for u in self.users:
+            c = InboxCounter.objects.get(user=u)
+            self.assertEqual((c.received, c.unread), (2, 2))
 
-# Create your tests here.
+    def test_queries_do_not_grow_with_recipients(self):
+        self._broadcast()  # تخزين الـ Blob وإنشاء العدّادات أولًا
+        with CaptureQueriesContext(connection) as ctx:
+            self._broadcast()
+        small = len(ctx)
+        for i in range(10):
+            make_user(f"more{i}", role=None)
+        self._broadcast()  # عدّادات المستخدمين الجدد
+        with CaptureQueriesContext(connection) as ctx:
+            self._broadcast()
+        self.assertEqual(len(ctx), small)
@@ -0,0 +1,173 @@
+# messaging/unread.py
+"""
+حالة القراءة والعدّادات التزايدية للمراسلات.
+
+المراسلة "غير مقروءة" لمشارك فيها إن كانت آخر رسالة من غيره ومعرّفها أكبر
+من آخر رسالة قرأها (ThreadReadState). عدّاد unread في InboxCounter يتغيّر فقط
+عند انتقال مراسلة بين مقروءة/غير مقروءة، فيبقى كل تحديث O(1).
+
+المراسلة التي يرسلها المستخدم لنفسه تُعدّ في sent فقط (received = الوارد من غيره)،
+فيبقى sent + received عدد مراسلاته بلا تكرار. حذف مراسلة يُنقص العدّادات
+(signals.py)، وأمر recount_inbox يعيد حسابها من الصفر عند الحاجة.
+"""
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest
+
+from kingabdulaziz205.caching import invalidate
+from .models import InboxCounter, Message, Thread, ThreadReadState
+
+# مجاميع عامة مشتقة من العدّادات (إجمالي المراسلات لتبويب المدير)
+COUNTS_NAMESPACE = "messaging:counts"
+
+
+def is_unread(last_msg_id, last_author_id, user_id, last_read_id):
+    return bool(last_msg_id) and last_author_id != user_id and last_msg_id > (last_read_id or 0)
+
+
+def recount(user_id):
+    """يحسب عدّادات المستخدم من الصفر (استعلامات مفهرسة على هذا المستخدم فقط)."""
+    mine = Thread.objects.filter(Q(sender_id=user_id) | Q(recipient_id=user_id))
+    read_upto = ThreadReadState.objects.filter(user_id=user_id, thread=OuterRef("pk")).values("last_read_message_id")[:1]
+    unread = (
+        mine.filter(last_message__isnull=False)
+        .exclude(last_message__author_id=user_id)
+        .annotate(read_upto=Subquery(read_upto))
+        .filter(Q(read_upto__isnull=True) | Q(last_message_id__gt=F("read_upto")))
+        .count()
+    )
+    counter, _ = InboxCounter.objects.update_or_create(user_id=user_id, defaults={
+        "sent": Thread.objects.filter(sender_id=user_id).count(),
+        "received": Thread.objects.filter(recipient_id=user_id).exclude(sender_id=user_id).count(),
+        "unread": unread,
+    })
+    return counter
+
+
+def get_counter(user_id):
+    counter = InboxCounter.objects.filter(user_id=user_id).first()
+    return counter or recount(user_id)
+
+
+def _bump(user_id, **deltas):
+    """يضيف deltas للعدّادات بتحديث واحد؛ إن لم يوجد الصف يُحسب من الصفر (ويتضمن التغيير)."""
+    changes = {k: Greatest(F(k) + v, 0) for k, v in deltas.items()}
+    if not InboxCounter.objects.filter(user_id=user_id).update(**changes):
+        recount(user_id)
+
+
+def _decrement(user_id, **deltas):
+    """يُنقص العدّادات دون إنشاء صف (لا صف = لا شيء يُنقص، وget_counter يحسبه لاحقًا)."""
+    changes = {k: Greatest(F(k) - v, 0) for k, v in deltas.items() if v}
+    if changes:
+        InboxCounter.objects.filter(user_id=user_id).update(**changes)
+
+
+def _last_read(user_id, thread_id):
+    return (
+        ThreadReadState.objects.filter(user_id=user_id, thread_id=thread_id)
+        .values_list("last_read_message_id", flat=True).first()
+    ) or 0
+
+
+def _set_read(user_id, thread_id, message_id):
+    ThreadReadState.objects.update_or_create(
+        user_id=user_id, thread_id=thread_id, defaults={"last_read_message_id": message_id},
+    )
+
+
+def on_thread_created(thread):
+    _bump(thread.sender_id, sent=1)
+    if thread.recipient_id != thread.sender_id:
+        _bump(thread.recipient_id, received=1)
+    invalidate(COUNTS_NAMESPACE)
+
+
+def unread_participants(thread):
+    """المشاركون الذين المراسلة غير مقروءة عندهم (تُحسب قبل حذفها وحذف إيصالاتها)."""
+    if not thread.last_message_id:
+        return set()
+    author_id = Message.objects.filter(pk=thread.last_message_id).values_list("author_id", flat=True).first()
+    read_upto = dict(
+        ThreadReadState.objects.filter(thread_id=thread.pk).values_list("user_id", "last_read_message_id")
+    )
+    return {
+        uid for uid in {thread.sender_id, thread.recipient_id}
+        if is_unread(thread.last_message_id, author_id, uid, read_upto.get(uid))
+    }
+
+
+def on_thread_deleted(thread, unread_ids):
+    _decrement(thread.sender_id, sent=1, unread=int(thread.sender_id in unread_ids))
+    if thread.recipient_id != thread.sender_id:
+        _decrement(thread.recipient_id, received=1, unread=int(thread.recipient_id in unread_ids))
+    invalidate(COUNTS_NAMESPACE)
+
+
+def on_message_deleted(msg):
+    """
+    حذف رسالة بمفردها (لا ضمن حذف مراسلتها): يُعاد مؤشر آخر رسالة إلى أحدث رسالة
+    باقية ويُعاد حساب عدّادات الطرفين، فقد تتغيّر حالة القراءة في الاتجاهين.
+    """
+    participants = Thread.objects.filter(pk=msg.thread_id).values_list("sender_id", "recipient_id").first()
+    if participants is None:
+        return
+    latest = (
+        Message.objects.filter(thread_id=msg.thread_id).order_by("-created_at", "-id")
+        .values_list("id", "created_at").first()
+    ) or (None, None)
+    Thread.objects.filter(pk=msg.thread_id).update(last_message_id=latest[0], last_message_at=latest[1])
+    for uid in set(participants):
+        recount(uid)
+
+
+def on_message_created(msg, prev_last_id, prev_last_author_id):
+    """
+    يُستدعى بعد إنشاء رسالة: المرسل قرأ المراسلة حتى رسالته، والطرف الآخر
+    تصبح عنده غير مقروءة إن لم تكن كذلك قبلها.
+    """
+    thread = msg.thread
+    author_id = msg.author_id
+    for uid in {thread.sender_id, thread.recipient_id} - {author_id}:
+        if not is_unread(prev_last_id, prev_last_author_id, uid, _last_read(uid, thread.pk)):
+            _bump(uid, unread=1)
+    if author_id in (thread.sender_id, thread.recipient_id):
+        if is_unread(prev_last_id, prev_last_author_id, author_id, _last_read(author_id, thread.pk)):
+            _bump(author_id, unread=-1)
+        _set_read(author_id, thread.pk, msg.pk)
+
+
+def mark_read(user, thread):
+    """عند فتح المراسلة: يحدّث إيصال القراءة ويُنقص العدّاد إن كانت غير مقروءة."""
+    if not thread.last_message_id:
+        return
+    last_author_id = thread.last_message.author_id
+    last_read = _last_read(user.id, thread.pk)
+    if last_read >= thread.last_message_id:
+        return
+    if user.id in (thread.sender_id, thread.recipient_id) and is_unread(
+        thread.last_message_id, last_author_id, user.id, last_read
+    ):
+        _bump(user.id, unread=-1)
+    _set_read(user.id, thread.pk, thread.last_message_id)
+
+
+def on_broadcast(sender_id, threads, msgs):
+    """
+    مكافئ on_thread_created + on_message_created لمراسلات تعميم أُنشئت بـ bulk_create:
+    المراسلات جديدة فتكون غير مقروءة للمستلم ومقروءة للمرسل.
+    """
+    ThreadReadState.objects.bulk_create([
+        ThreadReadState(user_id=sender_id, thread_id=t.pk, last_read_message_id=m.pk)
+        for t, m in zip(threads, msgs)
+    ])
+    recipient_ids = [t.recipient_id for t in threads]
+    _bump(sender_id, sent=len(threads))
+    invalidate(COUNTS_NAMESPACE)
+    updated = set(
+        InboxCounter.objects.filter(user_id__in=recipient_ids).values_list("user_id", flat=True)
+    )
+    InboxCounter.objects.filter(user_id__in=updated).update(received=F("received") + 1, unread=F("unread") + 1)
+    # من لا صف له لم تكن له أي مراسلة قبل هذا التعميم (الصفوف تُنشأ عند أول مراسلة)
+    InboxCounter.objects.bulk_create([
+        InboxCounter(user_id=uid, received=1, unread=1) for uid in set(recipient_ids) - updated
+    ], ignore_conflicts=True)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import inbox, new_thread, thread_detail, reply_thread, close_thread
+from .views import inbox, new_thread, thread_detail, reply_thread, close_thread, broadcast_status
 
 app_name = "messaging"
 
@@ -9,4 +9,5 @@ urlpatterns = [
     path('<int:pk>/', thread_detail, name='detail'),
     path('<int:pk>/reply/', reply_thread, name='reply'),
     path('<int:pk>/close/', close_thread, name='close'),
+    path('broadcasts/<int:pk>/', broadcast_status, name='broadcast_status'),
 ]
@@ -3,48 +3,25 @@ from datetime import timedelta
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Q, Max
-from django.http import HttpRequest, HttpResponseForbidden
+from django.core.paginator import Paginator
+from django.db.models import Q, F, Prefetch, Sum
+from django.http import HttpRequest, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 
-from accounts.models import Profile
-from .models import Message, MessageAttachment, Thread
+from accounts.directory import user_picker
+from attachments.blobs import attach
+from attachments.uploads import checksum_uploads, validate_uploads
+from kingabdulaziz205.caching import get_or_compute
+from .broadcast import send_broadcast
+from .models import BroadcastJob, InboxCounter, Message, MessageAttachment, Thread, ThreadReadState
+from .unread import COUNTS_NAMESPACE, get_counter, is_unread, mark_read
 
 
-# ===================== Helpers =====================
-
-def _is_manager(user):
-    try:
-        return bool(user.is_staff or (getattr(user, "profile", None) and user.profile.role == "مدير المدرسة"))
-    except Profile.DoesNotExist:
-        return bool(user.is_staff)
-
-
-def _can_view_thread(user, thread: Thread) -> bool:
-    if _is_manager(user):
-        return True
-    return (thread.sender_id == user.id) or (thread.recipient_id == user.id)
-
-
-def _can_reply_thread(user, thread: Thread) -> bool:
-    return _can_view_thread(user, thread)
-
-
-def _normalize_files(files):
-    ALLOWED_EXTS = {".pdf", ".png", ".jpg", ".jpeg", ".doc", ".docx"}
-    MAX_FILE_SIZE = 10 * 1024 * 1024
-    checked = []
-    for f in files:
-        name = (f.name or "").lower()
-        ext = "." + name.split(".")[-1]
-        if ext not in ALLOWED_EXTS:
-            return None, "نوع ملف غير مسموح."
-        if getattr(f, "size", 0) > MAX_FILE_SIZE:
-            return None, "حجم الملف يتجاوز 10MB."
-        checked.append(f)
-    return checked, None
+THREADS_PER_PAGE = 30
 
+# ===================== Helpers =====================
 
 def _first_non_empty(*vals, default=""):
     for v in vals:
@@ -83,7 +60,8 @@ def _find_user(value: str):
 
 @login_required
 def inbox(request: HttpRequest):
-    if _is_manager(request.user):
+    is_manager = request.capabilities.is_manager
+    if is_manager:
         threads_base = Thread.objects.all().select_related("sender", "recipient")
     else:
         threads_base = Thread.objects.filter(
@@ -94,28 +72,36 @@ def inbox(request: HttpRequest):
     if scope == "sent":
         threads_scoped = threads_base.filter(sender=request.user)
     elif scope == "inbox":
-        threads_scoped = threads_base.filter(recipient=request.user) if not _is_manager(request.user) else threads_base.exclude(sender=request.user)
+        # الوارد من الآخرين (المراسلة للنفس في "المرسلة")، مطابقًا لعدّاد received
+        threads_scoped = threads_base.exclude(sender=request.user)
+        if not is_manager:
+            threads_scoped = threads_scoped.filter(recipient=request.user)
     else:
         threads_scoped = threads_base
 
-    last_msg_ids = (
-        Message.objects.filter(thread_id__in=threads_scoped.values("id"))
-        .values("thread_id")
-        .annotate(last_id=Max("id"))
-        .values_list("last_id", flat=True)
+    # الترتيب من قاعدة البيانات عبر المؤشر المُكرَّر last_message_at (بلا فرز في بايثون)
+    threads_scoped = threads_scoped.select_related("last_message").order_by(
+        F("last_message_at").desc(nulls_last=True), "-updated_at", "-created_at", "-id"
     )
-    last_msgs = {
-        m.thread_id: m
-        for m in Message.objects.filter(id__in=list(last_msg_ids)).select_related("author", "thread")
-    }
 
-    items = list(threads_scoped)
-    items.sort(
-        key=lambda t: (
-            -(last_msgs.get(t.id).id if last_msgs.get(t.id) else 0),
-            -int(t.updated_at.timestamp() if t.updated_at else 0),
-            -int(t.created_at.timestamp() if t.created_at else 0),
+    # شارات التبويبات من العدّادات التزايدية (InboxCounter) بدل COUNT لكل تبويب؛
+    # أما الترقيم فيعدّ الاستعلام المصفّى نفسه كي لا تنحرف الصفحات عن المعروض
+    counter = get_counter(request.user.id)
+    if is_manager:
+        total = get_or_compute(
+            COUNTS_NAMESPACE, ("all",),
+            lambda: InboxCounter.objects.aggregate(n=Sum("sent"))["n"] or 0,
         )
+        counts = {"all": total, "sent": counter.sent, "inbox": max(total - counter.sent, 0)}
+    else:
+        counts = {"all": counter.sent + counter.received, "sent": counter.sent, "inbox": counter.received}
+
+    paginator = Paginator(threads_scoped, THREADS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    items = list(page_obj.object_list)
+    read_upto = dict(
+        ThreadReadState.objects.filter(user=request.user, thread_id__in=[t.id for t in items])
+        .values_list("thread_id", "last_read_message_id")
     )
 
     now = timezone.now()
@@ -123,16 +109,16 @@ def inbox(request: HttpRequest):
 
     read_map = {}
     for t in items:
-        lm = last_msgs.get(t.id)
+        lm = t.last_message
         unread = False
         is_new_incoming = False
         if lm:
-            unread = (lm.author_id != request.user.id)
+            unread = is_unread(lm.id, lm.author_id, request.user.id, read_upto.get(t.id))
             is_new_incoming = unread and (lm.created_at >= recent_window)
 
         if t.sender_id == request.user.id:
             d = "out"
-        elif _is_manager(request.user):
+        elif is_manager:
             d = "mgr"
         else:
             d = "in"
@@ -146,25 +132,18 @@ def inbox(request: HttpRequest):
             "mark": "●" if is_new_incoming else "",
         }
 
-        setattr(t, "last_message", lm)
         setattr(t, "is_unread", unread)
         setattr(t, "is_new_incoming", is_new_incoming)
         setattr(t, "new_mark", "●" if is_new_incoming else "")
         setattr(t, "dir", d)
 
-    counts = {
-        "all": threads_base.count(),
-        "sent": threads_base.filter(sender=request.user).count(),
-        "inbox": (threads_base.filter(recipient=request.user).count()
-                  if not _is_manager(request.user) else threads_base.exclude(sender=request.user).count()),
-    }
-
     return render(request, "messaging/index.html", {
         "items": items,
         "scope": scope,
         "counts": counts,
-        "is_manager": _is_manager(request.user),
+        "is_manager": is_manager,
         "read_map": read_map,
+        "page_obj": page_obj,
     })
 
 
@@ -175,17 +154,21 @@ def index(request: HttpRequest):
 
 @login_required
 def thread_detail(request: HttpRequest, pk: int):
-    thread = Thread.objects.filter(pk=pk).select_related("sender", "recipient").first()
+    thread = Thread.objects.filter(pk=pk).select_related("sender", "recipient", "last_message").first()
     if thread is None:
         msg = get_object_or_404(Message.objects.select_related("thread"), pk=pk)
         thread = msg.thread
 
-    if not _can_view_thread(request.user, thread):
+    if not request.capabilities.can_view_thread(thread):
         return HttpResponseForbidden("لا تملك صلاحية عرض هذه المراسلة.")
+    mark_read(request.user, thread)
 
     msgs_qs = (
         Message.objects.filter(thread=thread)
         .select_related("author")
+        .prefetch_related(Prefetch(
+            "files", queryset=MessageAttachment.objects.select_related("blob").order_by("id"), to_attr="file_list",
+        ))
         .order_by("created_at", "id")
     )
     msgs_list = list(msgs_qs)
@@ -198,7 +181,7 @@ def thread_detail(request: HttpRequest, pk: int):
         "messages": msgs_list,
         "msgs": msgs_list,
         "items": msgs_list,
-        "is_manager": _is_manager(request.user),
+        "is_manager": request.capabilities.is_manager,
     }
     return render(request, "messaging/detail.html", ctx)
 
@@ -209,14 +192,8 @@ def detail(request: HttpRequest, pk: int):
 
 
 @login_required
+@checksum_uploads
 def new_thread(request: HttpRequest):
-    recipients_qs = (
-        User.objects.filter(is_active=True)
-        .exclude(id=request.user.id)
-        .select_related("profile")
-        .order_by("profile__full_name", "username")
-    )
-
     if request.method == "POST":
         recipient_val = _post_any(request, "recipient", "to_user", "to", "receiver", "target")
         subject = _post_any(request, "subject", "title")
@@ -227,34 +204,23 @@ def new_thread(request: HttpRequest):
 
         if not recipient or not subject or (not content and not files):
             return render(request, "messaging/new.html", {
-                "users": recipients_qs,
-                "recipients": recipients_qs,
-                "all_users": recipients_qs,
-                "receivers": recipients_qs,
+                "picker": user_picker(selected=recipient_val, exclude_id=request.user.id),
                 "form": {"recipient": recipient_val, "subject": subject, "content": content},
                 "error": "أكمل الحقول المطلوبة.",
             })
 
-        checked, err = _normalize_files(files)
+        checked, err = validate_uploads(files)
         if err:
             return render(request, "messaging/new.html", {
-                "users": recipients_qs,
-                "recipients": recipients_qs,
-                "all_users": recipients_qs,
-                "receivers": recipients_qs,
+                "picker": user_picker(selected=recipient_val, exclude_id=request.user.id),
                 "form": {"recipient": recipient_val, "subject": subject, "content": content},
                 "error": err,
             })
 
         if isinstance(recipient, str) and recipient in {"ALL", "الكل", "*"}:
-            targets = list(User.objects.filter(is_active=True).exclude(id=request.user.id))
-            for rcpt in targets:
-                thread = Thread.objects.create(subject=subject, sender=request.user, recipient=rcpt, status="OPEN")
-                msg = Message.objects.create(thread=thread, author=request.user, content=content)
-                for f in checked:
-                    MessageAttachment.objects.create(message=msg, file=f, uploaded_by=request.user)
-                thread.updated_at = timezone.now()
-                thread.save(update_fields=["updated_at"])
+            _, job = send_broadcast(request.user, subject, content, checked)
+            if job:
+                return redirect(f"{reverse('messaging:inbox')}?scope=sent&broadcast={job.pk}")
             return redirect("messaging:inbox")
 
         thread = Thread.objects.create(
@@ -269,30 +235,32 @@ def new_thread(request: HttpRequest):
             content=content,
         )
         for f in checked:
-            MessageAttachment.objects.create(message=msg, file=f, uploaded_by=request.user)
-
-        thread.updated_at = timezone.now()
-        thread.save(update_fields=["updated_at"])
+            attach(MessageAttachment, f, message=msg, uploaded_by=request.user)
 
         return redirect("messaging:detail", pk=thread.pk)
 
-    ctx = {
-        "users": recipients_qs,
-        "recipients": recipients_qs,
-        "all_users": recipients_qs,
-        "receivers": recipients_qs,
-    }
-    return render(request, "messaging/new.html", ctx)
+    # منتقي المستلم من دليل المستخدمين المخزّن (قائمة مجمّعة أو بحث)
+    return render(request, "messaging/new.html", {"picker": user_picker(exclude_id=request.user.id)})
+
+
+@login_required
+def broadcast_status(request: HttpRequest, pk: int):
+    job = get_object_or_404(BroadcastJob, pk=pk, sender=request.user)
+    return JsonResponse({
+        "status": job.status, "total": job.total, "done": job.done,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    })
 
 
 @login_required
+@checksum_uploads
 def reply_thread(request: HttpRequest, pk: int):
     thread = Thread.objects.filter(pk=pk).first()
     if thread is None:
         msg = get_object_or_404(Message.objects.select_related("thread"), pk=pk)
         thread = msg.thread
 
-    if not _can_reply_thread(request.user, thread):
+    if not request.capabilities.can_reply_thread(thread):
         return HttpResponseForbidden("لا تملك صلاحية الرد على هذه المراسلة.")
 
     if request.method == "POST":
@@ -302,16 +270,13 @@ def reply_thread(request: HttpRequest, pk: int):
         if not content and not files:
             return redirect("messaging:detail", pk=thread.pk)
 
-        checked, err = _normalize_files(files)
+        checked, err = validate_uploads(files)
         if err:
             return redirect("messaging:detail", pk=thread.pk)
 
         msg = Message.objects.create(thread=thread, author=request.user, content=content)
         for f in checked:
-            MessageAttachment.objects.create(message=msg, file=f, uploaded_by=request.user)
-
-        thread.updated_at = timezone.now()
-        thread.save(update_fields=["updated_at"])
+            attach(MessageAttachment, f, message=msg, uploaded_by=request.user)
 
         return redirect("messaging:detail", pk=thread.pk)
 
@@ -321,7 +286,7 @@ def reply_thread(request: HttpRequest, pk: int):
 @login_required
 def close_thread(request: HttpRequest, pk: int):
     thread = get_object_or_404(Thread, pk=pk)
-    if not _can_reply_thread(request.user, thread):
+    if not request.capabilities.can_reply_thread(thread):
         return HttpResponseForbidden("لا تملك صلاحية إغلاق هذه المراسلة.")
     thread.status = "CLOSED"
     thread.updated_at = timezone.now()
@@ -1,8 +1,11 @@
 from django.contrib import admin
-from .models import Referral, Attachment, Action, ActionAttachment, NewsTicker
+
+from search.admin import IndexedSearchMixin
+from .models import Referral, Attachment, Action, ActionAttachment, NewsTicker, StudentAlias
 
 @admin.register(Referral)
-class ReferralAdmin(admin.ModelAdmin):
+class ReferralAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_kind = "referral"
     list_display = ("reference", "student_name", "grade", "referral_type", "status", "created_by", "created_at")
     list_filter = ("status", "referral_type", "grade", "created_at")
     search_fields = ("reference", "student_name", "created_by__username")
@@ -14,10 +17,11 @@ class AttachmentAdmin(admin.ModelAdmin):
     search_fields = ("referral__reference", "uploaded_by__username")
 
 @admin.register(Action)
-class ActionAdmin(admin.ModelAdmin):
+class ActionAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_kind = "action"
     list_display = ("referral", "author", "kind", "created_at")
     list_filter = ("kind", "created_at")
-    search_fields = ("referral__reference", "author__username", "content")
+    search_fields = ("referral__reference", "author__username")
 
 @admin.register(ActionAttachment)
 class ActionAttachmentAdmin(admin.ModelAdmin):
@@ -32,3 +36,9 @@ class NewsTickerAdmin(admin.ModelAdmin):
         (None, {"fields": ("text", "is_active")}),
         ("المدى الزمني (اختياري)", {"fields": ("starts_at", "ends_at")}),
     )
+
+@admin.register(StudentAlias)
+class StudentAliasAdmin(admin.ModelAdmin):
+    list_display = ("alias", "student_key", "merged_by", "created_at")
+    search_fields = ("alias", "student_key")
+    readonly_fields = ("merged_by", "created_at")
@@ -7,3 +7,6 @@ class ReferralsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'referrals'
     verbose_name = _("الإحالات")
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,14 +1,17 @@
-from .models import NewsTicker
+from django.utils.functional import SimpleLazyObject
+
+from .news import visible_tickers
+
 
 def active_news_ticker(request):
     """
-    يرجّع آخر شريط إخباري مرئي (أو None) إلى المتغير: news_ticker
-    يُستخدم في القوالب دون الحاجة لأي استدعاء في الفيوز.
+    الأشرطة الإخبارية المرئية إلى المتغيرين:
+      news_tickers — كل الأشرطة المرئية (تتناوب في الشريط)
+      news_ticker  — أحدثها (أو None)
+    كسولة ومن الكاش؛ لا تكلّف استعلامًا إلا عند انتهاء صلاحية الكاش أو تعديل شريط.
     """
-    try:
-        obj = NewsTicker.objects.filter(is_active=True).order_by("-created_at").first()
-        if obj and obj.is_visible:
-            return {"news_ticker": obj}
-    except Exception:
-        pass
-    return {"news_ticker": None}
+    tickers = SimpleLazyObject(visible_tickers)
+    return {
+        "news_tickers": tickers,
+        "news_ticker": SimpleLazyObject(lambda: tickers[0] if tickers else None),
+    }
@@ -0,0 +1,82 @@
+# referrals/management/commands/audit_query_plans.py
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F, Q, Max
+
+from messaging.models import Message, Thread
+from referrals.models import Action, Referral
+
+# أسطر الخطة التي تعني مسحًا كاملًا للجدول: SQLite ≥ 3.36 تكتب "SCAN x" وما قبلها
+# "SCAN TABLE x"، والمسح عبر فهرس ("... USING [COVERING] INDEX") ليس مسحًا كاملًا
+SEQ_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(?!CONSTANT ROW|SUBQUERY)\w+(?!.*\bUSING (?:COVERING )?INDEX\b)"),
+    "postgresql": re.compile(r"\bSeq Scan on\b"),
+}
+
+
+def representative_queries(user):
+    """
+    نفس أشكال الاستعلامات الساخنة في الفيوز (بدون صلاحية المدير).
+    الاستعلامات المرتبطة بإحالة/مراسلة بعينها تُتخطّى إن لم يكن للمستخدم أي منها.
+    """
+    mine = Q(created_by=user) | Q(assignee=user)
+    queries = {
+        "referrals:index (sent)": Referral.objects.filter(created_by=user).order_by("-created_at"),
+        "referrals:index (inbox)": Referral.objects.filter(assignee=user).order_by("-created_at"),
+        "referrals:index (groups)": (
+            Referral.objects.filter(mine).values("student_key")
+            .annotate(latest=Max("created_at")).order_by("-latest", "student_key")
+        ),
+        "workflow:reports": Referral.objects.filter(mine).distinct(),
+        "messaging:inbox (sent)": Thread.objects.filter(sender=user).order_by(F("last_message_at").desc(nulls_last=True)),
+        "messaging:inbox (inbox)": Thread.objects.filter(recipient=user).order_by(F("last_message_at").desc(nulls_last=True)),
+    }
+    ref = Referral.objects.filter(mine).order_by("-created_at").first()
+    if ref:
+        queries["referrals:student_file"] = Referral.objects.filter(mine, student_key=ref.student_key).order_by("-created_at")
+        queries["referrals:detail (actions)"] = Action.objects.filter(referral=ref).order_by("created_at")
+        queries["referrals:close (has reply)"] = Action.objects.filter(referral=ref, kind="REPLY")
+    thread = Thread.objects.filter(Q(sender=user) | Q(recipient=user)).first()
+    if thread:
+        queries["messaging:detail"] = Message.objects.filter(thread=thread).order_by("created_at", "id")
+    return queries
+
+
+class Command(BaseCommand):
+    help = "تشغيل EXPLAIN على الاستعلامات الساخنة والتنبيه على أي مسح كامل للجداول (SQLite/Postgres)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="اسم المستخدم الذي تُبنى عليه الاستعلامات (الافتراضي: أول مستخدم نشط)")
+        parser.add_argument("--verbose-plans", action="store_true", help="طباعة الخطة كاملة لكل استعلام")
+        parser.add_argument("--fail-on-seq-scan", action="store_true", help="إنهاء بخطأ عند وجود مسح كامل (للاستخدام قبل النشر)")
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        pattern = SEQ_SCAN_PATTERNS.get(vendor)
+        if pattern is None:
+            raise CommandError(f"قاعدة البيانات {vendor} غير مدعومة في هذا الفحص.")
+
+        users = User.objects.filter(is_active=True).order_by("id")
+        user = users.filter(username=options["user"]).first() if options["user"] else users.first()
+        if user is None:
+            raise CommandError("لا يوجد مستخدم نشط لبناء الاستعلامات.")
+
+        queries = representative_queries(user)
+        flagged = []
+        for name, qs in queries.items():
+            plan = qs.explain()
+            seq = [line.strip() for line in plan.splitlines() if pattern.search(line)]
+            if seq:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"✗ {name}: " + " | ".join(seq)))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✓ {name}"))
+            if options["verbose_plans"]:
+                self.stdout.write(plan + "\n")
+
+        if flagged and options["fail_on_seq_scan"]:
+            raise CommandError(f"مسح كامل في {len(flagged)} استعلام: " + "، ".join(flagged))
+        self.stdout.write(f"تم فحص {len(queries)} استعلام على {vendor}، منها {len(flagged)} بمسح كامل.")
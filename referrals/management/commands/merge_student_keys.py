@@ -0,0 +1,57 @@
+# referrals/management/commands/merge_student_keys.py
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from referrals.students import DEFAULT_MAX_DF, DEFAULT_MIN_SCORE, find_duplicates, merge_student_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "يقترح مفاتيح الطلاب المكررة (أخطاء إملائية/مسافات/حروف متقاربة) ويدمجها. "
+        "بدون --apply يعرض الاقتراحات فقط؛ --merge ... --into يدمج مفاتيح محددة يدويًا."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE,
+                            help="أدنى تشابه (0..1) لاعتبار مفتاحين مكررين.")
+        parser.add_argument("--max-df", type=int, default=DEFAULT_MAX_DF,
+                            help="تُهمل في المطابقة الثلاثيات/الكتل المشتركة بين أكثر من هذا العدد من المفاتيح.")
+        parser.add_argument("--limit", type=int, default=50, help="عدد المجموعات المعروضة (0 = الكل).")
+        parser.add_argument("--apply", action="store_true", help="دمج كل المجموعات المقترحة في مفتاحها الهدف.")
+        parser.add_argument("--merge", nargs="+", metavar="KEY", help="مفاتيح تُدمج يدويًا…")
+        parser.add_argument("--into", metavar="KEY", help="…في هذا المفتاح.")
+        parser.add_argument("--user", help="اسم المستخدم المسجَّل كمنفّذ للدمج.")
+
+    def handle(self, *args, **opts):
+        user = None
+        if opts["user"]:
+            user = User.objects.filter(username=opts["user"]).first()
+            if user is None:
+                raise CommandError(f"المستخدم غير موجود: {opts['user']}")
+
+        if opts["merge"] or opts["into"]:
+            if not (opts["merge"] and opts["into"]):
+                raise CommandError("--merge و --into يُستخدمان معًا.")
+            moved = merge_student_keys(opts["merge"], opts["into"], user)
+            self.stdout.write(self.style.SUCCESS(f"نُقلت {moved} إحالة إلى {opts['into']}."))
+            return
+
+        started = time.perf_counter()
+        suggestions = find_duplicates(min_score=opts["min_score"], max_df=opts["max_df"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{len(suggestions)} مجموعة مكررة محتملة ({elapsed:.2f} ث).\n")
+
+        shown = suggestions[: opts["limit"]] if opts["limit"] else suggestions
+        for group in shown:
+            t = group.target
+            self.stdout.write(f"← {t.key}  ({t.count} إحالة، {t.name})")
+            for s, score in group.members:
+                self.stdout.write(f"    {score:.2f}  {s.key}  ({s.count} إحالة، {s.name})")
+
+        if opts["apply"]:
+            moved = sum(
+                merge_student_keys([s.key for s, _ in g.members], g.target.key, user) for g in suggestions
+            )
+            self.stdout.write(self.style.SUCCESS(f"دُمجت {len(suggestions)} مجموعة ونُقلت {moved} إحالة."))
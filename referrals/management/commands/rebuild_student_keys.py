@@ -1,17 +1,110 @@
 # referrals/management/commands/rebuild_student_keys.py
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from referrals.models import Referral
-from referrals.utils import make_student_key
+from referrals.students import alias_map
+from referrals.utils import is_name_derived_key, make_student_key
+
+
+def _compute_keys(rows, aliases):
+    """
+    يحسب المفاتيح لدفعة من (id, student_name, reference, student_key)
+    ويرجّع فقط ما تغيّر كأزواج (id, new_key). نفس قاعدة Referral.build_student_key
+    (بما فيها المفاتيح المدموجة aliases، فلا تُلغي إعادة التوليد عمليات الدمج).
+    المفاتيح غير المولّدة من الاسم (السجل المدني) تبقى كما هي، كما في ترحيل 0018.
+    دالة على مستوى الوحدة كي تعمل داخل ProcessPoolExecutor.
+    """
+    changed = []
+    for pk, name, reference, old_key in rows:
+        if not (is_name_derived_key(old_key, name, reference) or old_key in aliases):
+            continue
+        key = make_student_key(name)
+        key = aliases.get(key, key) or reference
+        if key != old_key:
+            changed.append((pk, key))
+    return changed
+
+
+def _fmt_secs(secs):
+    secs = int(secs)
+    return f"{secs // 60}:{secs % 60:02d}"
+
 
 class Command(BaseCommand):
-    help = "إعادة توليد student_key لكل الإحالات الحالية"
+    help = "إعادة توليد student_key لكل الإحالات الحالية (قراءة متدفقة + bulk_update على دفعات)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="عدد الإحالات في كل دفعة")
+        parser.add_argument("--since-id", type=int, default=0, help="استئناف من بعد هذا المعرّف (آخر id ظهر في التقدّم)")
+        parser.add_argument("--dry-run", action="store_true", help="احسب وأبلغ عن التغييرات دون الكتابة")
+        parser.add_argument("--workers", type=int, default=1, help="عدد العمليات لحساب المفاتيح (1 = بدون مجمع عمليات)")
 
     def handle(self, *args, **options):
-        updated = 0
-        for r in Referral.objects.all():
-            key = make_student_key(r.student_name)
-            if r.student_key != key:
-                r.student_key = key
-                r.save(update_fields=["student_key"])
-                updated += 1
-        self.stdout.write(self.style.SUCCESS(f"تم تحديث {updated} إحالة."))
+        batch_size = max(1, options["batch_size"])
+        since_id = options["since_id"]
+        dry_run = options["dry_run"]
+        workers = max(1, options["workers"])
+
+        qs = Referral.objects.filter(id__gt=since_id).order_by("id")
+        total = qs.count()
+        rows = qs.values_list("id", "student_name", "reference", "student_key").iterator(chunk_size=batch_size)
+
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        started = time.monotonic()
+        processed = updated = 0
+        try:
+            for batch, changed in self._batches(rows, batch_size, pool, workers, alias_map()):
+                if changed and not dry_run:
+                    with transaction.atomic():
+                        Referral.objects.bulk_update(
+                            [Referral(id=pk, student_key=key) for pk, key in changed],
+                            ["student_key"], batch_size=batch_size,
+                        )
+                processed += len(batch)
+                updated += len(changed)
+                self._progress(processed, total, updated, batch[-1][0], started)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        verb = "سيتم تحديث" if dry_run else "تم تحديث"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {updated} إحالة من أصل {processed}."))
+
+    def _batches(self, rows, batch_size, pool, workers, aliases):
+        """يجمع الصفوف المتدفقة في دفعات ويحسب مفاتيحها (محليًا أو عبر المجمع)."""
+        def chunks():
+            buf = []
+            for row in rows:
+                buf.append(row)
+                if len(buf) >= batch_size:
+                    yield buf
+                    buf = []
+            if buf:
+                yield buf
+
+        if pool is None:
+            for batch in chunks():
+                yield batch, _compute_keys(batch, aliases)
+            return
+
+        # نُبقي عددًا محدودًا من الدفعات قيد المعالجة حتى لا تُحمَّل كل الصفوف في الذاكرة
+        pending = []
+        for batch in chunks():
+            pending.append((batch, pool.submit(_compute_keys, batch, aliases)))
+            if len(pending) >= workers * 2:
+                batch0, fut = pending.pop(0)
+                yield batch0, fut.result()
+        for batch0, fut in pending:
+            yield batch0, fut.result()
+
+    def _progress(self, processed, total, updated, last_id, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = processed / elapsed
+        eta = (total - processed) / rate if rate else 0
+        self.stdout.write(
+            f"{processed}/{total} — {rate:,.0f} صف/ث — المتبقي ≈ {_fmt_secs(eta)} — "
+            f"محدَّث: {updated} — آخر id: {last_id}"
+        )
@@ -0,0 +1,40 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def _student_key(name):
+    # نسخة مجمّدة من make_student_key (بلا سجل مدني) كما كانت عند كتابة هذا الترحيل،
+    # قبل التوحيد العربي؛ المفاتيح الناتجة يعيد توليدها ترحيل 0018
+    s = unicodedata.normalize("NFKC", (name or "").strip())
+    s = re.sub(r"\s+", "-", s)
+    s = re.sub(r"[^0-9A-Za-z\u0600-\u06FF\-]", "", s)
+    return s[:60]
+
+
+def backfill_student_key(apps, schema_editor):
+    Referral = apps.get_model("referrals", "Referral")
+    qs = Referral.objects.filter(student_key="").only("id", "reference", "student_name").order_by("id")
+    last_id = 0
+    while True:
+        batch = list(qs.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for r in batch:
+            r.student_key = _student_key(r.student_name) or r.reference
+        Referral.objects.bulk_update(batch, ["student_key"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0010_alter_action_options_alter_actionattachment_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_student_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0011_backfill_student_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='referral',
+            constraint=models.CheckConstraint(condition=models.Q(('student_key', ''), _negated=True), name='referral_student_key_not_empty'),
+        ),
+    ]
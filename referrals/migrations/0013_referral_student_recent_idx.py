@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0012_referral_student_key_not_empty'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='referral',
+            index=models.Index(fields=['student_key', '-created_at'], name='referral_student_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0013_referral_student_recent_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['referral', 'created_at'], name='action_referral_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['referral', 'kind'], name='action_referral_kind_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='referral',
+            index=models.Index(fields=['created_by', '-created_at'], name='referral_creator_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='referral',
+            index=models.Index(fields=['assignee', '-created_at'], name='referral_assignee_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:27
+
+from django.db import migrations, models
+
+
+def backfill_flags(apps, schema_editor):
+    # علما الرد والتوصية يصبحان مصدر شروط الانتقال، فيجب أن يطابقا البيانات الحالية
+    Referral = apps.get_model("referrals", "Referral")
+    Action = apps.get_model("referrals", "Action")
+    CounselorIntake = apps.get_model("referrals", "CounselorIntake")
+    replied = Action.objects.filter(kind="REPLY").values("referral_id")
+    Referral.objects.filter(has_reply=False, id__in=replied).update(has_reply=True)
+    recommended = CounselorIntake.objects.exclude(recommendations="").values("referral_id")
+    Referral.objects.filter(id__in=recommended).update(has_recommendation=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0015_actionattachment_blob_attachment_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referral',
+            name='has_recommendation',
+            field=models.BooleanField(default=False, verbose_name='توجد توصية'),
+        ),
+        migrations.RunPython(backfill_flags, migrations.RunPython.noop),
+    ]
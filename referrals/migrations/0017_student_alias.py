@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0016_referral_has_recommendation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=180, unique=True, verbose_name='المفتاح المدموج')),
+                ('student_key', models.CharField(db_index=True, max_length=180, verbose_name='المفتاح الموحّد')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='أُنشئ في')),
+                ('merged_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='دمجه')),
+            ],
+            options={
+                'verbose_name': 'مفتاح طالب مدموج',
+                'verbose_name_plural': 'مفاتيح الطلاب المدموجة',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# نسخة مجمّدة من التوحيد كما كان عند كتابة هذا الترحيل: تعديل referrals.utils أو
+# kingabdulaziz205.arabic لاحقًا لا يغيّر ما يفعله
+_DIACRITICS_RE = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ة": "ه",
+    "ؤ": "و", "ئ": "ي",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+
+def _slug(s):
+    s = re.sub(r"\s+", "-", s)
+    s = re.sub(r"[^0-9A-Za-z\u0600-\u06FF\-]", "", s)
+    return s[:60]
+
+
+def _normalized_key(name):
+    # make_student_key (بلا سجل مدني) بعد التوحيد العربي
+    s = unicodedata.normalize("NFKC", name or "")
+    s = _DIACRITICS_RE.sub("", s).replace("\u0640", "")
+    s = s.translate(_LETTERS).casefold()
+    return _slug(re.sub(r"\s+", " ", s).strip())
+
+
+def _legacy_key(name):
+    # make_student_key قبل التوحيد العربي: المفاتيح المطابقة له مولّدة من الاسم
+    # (لا من السجل المدني ولا مدموجة يدويًا) فيُعاد توليدها
+    return _slug(unicodedata.normalize("NFKC", (name or "").strip()))
+
+
+def renormalize_student_keys(apps, schema_editor):
+    Referral = apps.get_model("referrals", "Referral")
+    qs = Referral.objects.only("id", "student_name", "student_key").order_by("id")
+    last_id = 0
+    while True:
+        batch = list(qs.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        changed = []
+        for r in batch:
+            key = _normalized_key(r.student_name)
+            if key and r.student_key == _legacy_key(r.student_name) and key != r.student_key:
+                r.student_key = key
+                changed.append(r)
+        Referral.objects.bulk_update(changed, ["student_key"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0017_student_alias'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize_student_keys, migrations.RunPython.noop),
+    ]
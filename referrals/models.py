@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid, os
 
+from attachments.models import BlobFileMixin
+
 from .utils import make_student_key
 
 def referral_upload_path(instance, filename):
@@ -52,6 +54,8 @@ class Referral(models.Model):
     # إشارات القراءة والرد
     is_opened_by_assignee = models.BooleanField("فُتحت من المكلّف", default=False, db_index=True)
     has_reply = models.BooleanField("يوجد رد", default=False, db_index=True)
+    # نسخة من "توجد توصية في نموذج الموجّه" تُحدَّث عند حفظه، لشروط انتقال الحالة (workflow.transitions)
+    has_recommendation = models.BooleanField("توجد توصية", default=False)
 
     created_at = models.DateTimeField("أُنشئت في", auto_now_add=True)
     updated_at = models.DateTimeField("آخر تحديث", auto_now=True)
@@ -60,13 +64,27 @@ class Referral(models.Model):
         verbose_name = "إحالة"
         verbose_name_plural = "إحالات"
         ordering = ["-created_at"]
+        constraints = [
+            models.CheckConstraint(condition=~models.Q(student_key=""), name="referral_student_key_not_empty"),
+        ]
+        indexes = [
+            # ملف الطالب وقائمة "إحالات نفس الطالب" (الأحدث أولًا)
+            models.Index(fields=["student_key", "-created_at"], name="referral_student_recent_idx"),
+            # "مرسلة"/"واردة" في القائمة والتقارير
+            models.Index(fields=["created_by", "-created_at"], name="referral_creator_recent_idx"),
+            models.Index(fields=["assignee", "-created_at"], name="referral_assignee_recent_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        # توليد مفتاح الطالب إن كان فارغًا
+        # توليد مفتاح الطالب إن كان فارغًا (المرجع كاحتياط لاسم بلا محارف صالحة)
         if not self.student_key:
-            self.student_key = make_student_key(self.student_name)
+            self.student_key = self.build_student_key()
         super().save(*args, **kwargs)
 
+    def build_student_key(self):
+        from .students import canonical_student_key
+        return canonical_student_key(make_student_key(self.student_name)) or self.reference
+
     def __str__(self):
         return f"{self.reference} - {self.student_name}"
 
@@ -86,9 +104,10 @@ class Referral(models.Model):
         return bool(self.is_opened_by_assignee and self.has_reply)
 
 
-class Attachment(models.Model):
+class Attachment(BlobFileMixin, models.Model):
     referral = models.ForeignKey(Referral, verbose_name="الإحالة", on_delete=models.CASCADE, related_name="attachments")
     file = models.FileField("الملف", upload_to=referral_upload_path)
+    blob = models.ForeignKey("attachments.Blob", verbose_name="الملف المخزّن", on_delete=models.PROTECT, null=True, blank=True, related_name="+")
     uploaded_by = models.ForeignKey(User, verbose_name="تم الرفع بواسطة", on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField("تاريخ الرفع", auto_now_add=True)
 
@@ -117,14 +136,19 @@ class Action(models.Model):
         verbose_name = "إجراء"
         verbose_name_plural = "إجراءات"
         ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["referral", "created_at"], name="action_referral_created_idx"),
+            models.Index(fields=["referral", "kind"], name="action_referral_kind_idx"),
+        ]
 
     def __str__(self):
         return f"{self.get_kind_display()} - {self.referral.reference}"
 
 
-class ActionAttachment(models.Model):
+class ActionAttachment(BlobFileMixin, models.Model):
     action = models.ForeignKey(Action, verbose_name="الإجراء", on_delete=models.CASCADE, related_name="files")
     file = models.FileField("الملف", upload_to=action_upload_path)
+    blob = models.ForeignKey("attachments.Blob", verbose_name="الملف المخزّن", on_delete=models.PROTECT, null=True, blank=True, related_name="+")
     uploaded_by = models.ForeignKey(User, verbose_name="تم الرفع بواسطة", on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField("تاريخ الرفع", auto_now_add=True)
 
@@ -162,7 +186,9 @@ class NewsTicker(models.Model):
 
     @property
     def is_visible(self):
-        now = timezone.now()
+        return self.is_visible_at(timezone.now())
+
+    def is_visible_at(self, now):
         if not self.is_active:
             return False
         if self.starts_at and now < self.starts_at:
@@ -170,3 +196,22 @@ class NewsTicker(models.Model):
         if self.ends_at and now > self.ends_at:
             return False
         return True
+
+
+# =========================
+# دمج هويات الطلاب المكررة (students.py)
+# =========================
+class StudentAlias(models.Model):
+    """مفتاح طالب دُمج في مفتاح آخر؛ الإحالات الجديدة التي تولّد المفتاح القديم تأخذ الموحّد."""
+    alias       = models.CharField("المفتاح المدموج", max_length=180, unique=True)
+    student_key = models.CharField("المفتاح الموحّد", max_length=180, db_index=True)
+    merged_by   = models.ForeignKey(User, verbose_name="دمجه", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at  = models.DateTimeField("أُنشئ في", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "مفتاح طالب مدموج"
+        verbose_name_plural = "مفاتيح الطلاب المدموجة"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.alias} → {self.student_key}"
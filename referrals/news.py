@@ -0,0 +1,57 @@
+# referrals/news.py
+"""
+الأشرطة الإخبارية المرئية عبر الكاش بدل استعلام في كل عرض قالب.
+
+تُخزَّن القائمة حتى أقرب حدّ زمني (starts_at/ends_at) لأي شريط مفعّل — عنده
+تتغير القائمة المرئية — وتُمسح فور حفظ/حذف أي شريط (signals.py).
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NewsTicker
+
+CACHE_KEY = "referrals:news_tickers:v1"
+
+
+def _max_ttl():
+    # سقف احتياطي: الكاش المحلي لكل عملية لا يصله مسح العمليات الأخرى
+    return getattr(settings, "NEWS_TICKER_CACHE_MAX_TTL", 600)
+
+
+def _load(now):
+    """الأشرطة المرئية الآن (الأحدث أولًا) ومدة صلاحيتها بالثواني."""
+    rows = list(
+        NewsTicker.objects.filter(is_active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gte=now))
+        .order_by("-created_at")
+    )
+    visible = [t for t in rows if t.is_visible_at(now)]
+    boundaries = [t.starts_at for t in rows if t.starts_at and t.starts_at > now]
+    boundaries += [t.ends_at for t in rows if t.ends_at and t.ends_at >= now]
+    ttl = _max_ttl()
+    if boundaries:
+        # ends_at شامل (is_visible_at)، لذا يُضاف جزء الثانية المتبقي
+        ttl = min(ttl, math.ceil((min(boundaries) - now).total_seconds()) + 1)
+    return visible, max(1, ttl)
+
+
+def visible_tickers():
+    """قائمة الأشرطة المرئية حاليًا؛ بلا استعلامات ما دام الكاش صالحًا."""
+    tickers = cache.get(CACHE_KEY)
+    if tickers is None:
+        try:
+            tickers, ttl = _load(timezone.now())
+        except DatabaseError:
+            # الجدول غير موجود بعد (قبل migrate) — لا شريط
+            return []
+        cache.set(CACHE_KEY, tickers, ttl)
+    return tickers
+
+
+def invalidate_tickers():
+    cache.delete(CACHE_KEY)
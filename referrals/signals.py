@@ -0,0 +1,36 @@
+# referrals/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from kingabdulaziz205.caching import invalidate
+from .models import NewsTicker, Referral
+from .news import invalidate_tickers
+
+# عدّادات تبويبات قائمة الإحالات (views.list_referrals)
+COUNTS_NAMESPACE = "referrals:counts"
+
+
+@receiver(post_save, sender=NewsTicker)
+@receiver(post_delete, sender=NewsTicker)
+def _news_ticker_changed(sender, **kwargs):
+    invalidate_tickers()
+
+
+@receiver(post_save, sender=Referral)
+@receiver(post_delete, sender=Referral)
+def _referral_changed(sender, **kwargs):
+    invalidate(COUNTS_NAMESPACE)
+
+
+def _intake_saved(sender, instance, **kwargs):
+    # علم التوصية على الإحالة نفسها فلا يحتاج قرار الإغلاق لتحميل نموذج الموجّه
+    has = bool((instance.recommendations or "").strip())
+    Referral.objects.filter(pk=instance.referral_id).exclude(has_recommendation=has).update(has_recommendation=has)
+
+
+try:
+    from .counselor_models import CounselorIntake
+except Exception:
+    CounselorIntake = None
+else:
+    post_save.connect(_intake_saved, sender=CounselorIntake, dispatch_uid="referrals_intake_recommendation")
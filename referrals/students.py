@@ -0,0 +1,265 @@
+# referrals/students.py
+"""
+هويات الطلاب: توحيد المفاتيح المدموجة واقتراح المفاتيح المكررة ودمجها.
+
+make_student_key يوحّد الفروق الإملائية الشائعة (الألف، التاء المربوطة، ...)، لكن
+يبقى ما لا يحله التوحيد: أخطاء الكتابة والمسافات ("عبد الله"/"عبدالله") والحروف
+المتقاربة صوتيًا. find_duplicates تجد هذه الأزواج دون مقارنة كل مفتاح بكل مفتاح،
+بل داخل كتل (blocking) لا يتجاوز حجمها max_df:
+  - حذف جزء واحد من الاسم: الاسمان اللذان يختلفان في جزء واحد (خطأ فيه أو سقوطه)
+    يلتقيان في الكتلة نفسها.
+  - الهيكل الصوتي (حذف حروف المد والهمزة وتوحيد ث/س، ذ/ز، ...) لأخطاء المسافات والمد.
+ثم يُحسب تشابه كل زوج مرشح فقط — بمقارنة الجزء المختلف ومدى ندرته بين أسماء
+المنطقة كلها — وتُجمَّع الأزواج في مجموعات (union-find) لا يُقترح دمج عضو فيها إلا
+إن كان تشابهه مع هدفها نفسه ≥ min_score.
+"""
+import re
+from collections import Counter, defaultdict, namedtuple
+from functools import lru_cache
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from kingabdulaziz205.caching import get_or_compute, invalidate
+from .models import Referral, StudentAlias
+from .signals import COUNTS_NAMESPACE
+
+ALIASES_NAMESPACE = "referrals:student_aliases"
+# الإبطال عند الدمج يصل فقط لمن يشترك في الكاش؛ المهلة تحدّ بقاء مفتاح ما قبل الدمج في غيره
+ALIASES_TIMEOUT = 5 * 60
+DEFAULT_MIN_SCORE = 0.8
+DEFAULT_MAX_DF = 200
+MISSING_PART_SCORE = 0.7
+PART_SCORES = {"phonetic": 0.95, "typo": 0.9, "ambiguous": 0.75, "far": 0.4}
+FALLBACK_CAP = 0.7
+# جزء يظهر في مفتاحين على الأكثر بينما نظيره أشيع منه 10 مرات = خطأ كتابة غالبًا
+RARE_PART = 2
+RARE_RATIO = 10
+
+KeyStat = namedtuple("KeyStat", "key count name latest")
+Suggestion = namedtuple("Suggestion", "target members")  # members: [(KeyStat, التشابه مع الهدف)]
+
+_PHONETIC = str.maketrans({"ث": "س", "ص": "س", "ذ": "ز", "ظ": "ض", "ط": "ت", "ق": "ك"})
+_VOWELS_RE = re.compile("[اويء]")
+# مفاتيح السجل المدني ومرجع الإحالة (احتياط الاسم الفارغ) لا تُطابق تقريبيًا
+_NAME_KEY_RE = re.compile(r"[^\W\d_]")
+_REFERENCE_RE = re.compile(r"^R-\d{4}-")
+_COMPOUND_RE = re.compile(r"(^|-)(عبد|ابو)-")
+
+
+# ——— المفاتيح المدموجة ———
+def canonical_student_key(key):
+    """المفتاح الموحّد إن كان key مدموجًا في غيره، وإلا key نفسه (مخزّن لكل مفتاح ALIASES_TIMEOUT ثانية)."""
+    if not key:
+        return key
+    return get_or_compute(
+        ALIASES_NAMESPACE, (key,),
+        lambda: StudentAlias.objects.filter(alias=key).values_list("student_key", flat=True).first() or key,
+        ALIASES_TIMEOUT,
+    )
+
+
+def alias_map():
+    """{المفتاح المدموج: الموحّد} كاملة (لإعادة توليد المفاتيح على دفعات)."""
+    return dict(StudentAlias.objects.values_list("alias", "student_key"))
+
+
+@transaction.atomic
+def merge_student_keys(sources, target, user=None):
+    """
+    ينقل إحالات المفاتيح sources إلى target ويسجّلها أسماءً مستعارة له (ويعيد توجيه
+    ما كان مدموجًا فيها). يرجّع عدد الإحالات المنقولة.
+    """
+    # الهدف نفسه قد يكون مدموجًا سابقًا في غيره
+    target = StudentAlias.objects.filter(alias=target).values_list("student_key", flat=True).first() or target
+    sources = sorted(set(sources) - {target})
+    if not sources:
+        return 0
+    moved = Referral.objects.filter(student_key__in=sources).update(student_key=target)
+    StudentAlias.objects.filter(student_key__in=sources).update(student_key=target)
+    StudentAlias.objects.bulk_create(
+        [StudentAlias(alias=key, student_key=target, merged_by=user) for key in sources],
+        update_conflicts=True, unique_fields=["alias"], update_fields=["student_key", "merged_by"],
+    )
+    invalidate(ALIASES_NAMESPACE)
+    invalidate(COUNTS_NAMESPACE)
+    return moved
+
+
+# ——— اقتراح المكررات ———
+def key_stats():
+    """المفاتيح المولّدة من الأسماء مع عدد إحالاتها وآخر اسم وتاريخ."""
+    rows = (
+        Referral.objects.values("student_key")
+        .annotate(count=Count("id"), name=Max("student_name"), latest=Max("created_at"))
+        .order_by("student_key")
+    )
+    return [
+        KeyStat(r["student_key"], r["count"], r["name"], r["latest"]) for r in rows
+        if _NAME_KEY_RE.search(r["student_key"]) and not _REFERENCE_RE.match(r["student_key"])
+    ]
+
+
+def _compact(key):
+    return key.replace("-", "")
+
+
+def phonetic_key(key):
+    return _VOWELS_RE.sub("", _compact(key).translate(_PHONETIC))
+
+
+def name_parts(key):
+    """أجزاء الاسم مع ضم "عبد"/"أبو" لما بعدهما ("عبد-الله" و"عبدالله" جزء واحد)."""
+    return _COMPOUND_RE.sub(r"\1\2", key).split("-")
+
+
+def trigrams(s):
+    s = f"#{s}#"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _edit_distance(a, b):
+    """مسافة Damerau (الحذف/الإضافة/الاستبدال/تبديل متجاورين) — للأجزاء القصيرة."""
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, prev2[j - 2] + 1)
+            cur.append(d)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+@lru_cache(maxsize=65536)
+def _part_edit(x, y):
+    """
+    نوع الفرق بين جزأين مختلفين من الاسم (مخزّن: مفردات الأسماء محدودة وتتكرر أزواجها):
+    "phonetic" حروف متقاربة صوتيًا، "typo" سقوط حرف ساكن أو تبديل حرفين متجاورين،
+    "ambiguous" إضافة/حذف حرف مد أو استبدال حرف، "far" ما عدا ذلك.
+    """
+    if x.translate(_PHONETIC) == y.translate(_PHONETIC):
+        return "phonetic"
+    if abs(len(x) - len(y)) > 1 or _edit_distance(x, y) != 1:
+        return "far"
+    if len(x) == len(y):
+        return "typo" if sorted(x) == sorted(y) else "ambiguous"
+    longer, shorter = (x, y) if len(x) > len(y) else (y, x)
+    dropped = next(c for i, c in enumerate(longer) if longer[:i] + longer[i + 1:] == shorter)
+    return "ambiguous" if _VOWELS_RE.match(dropped) else "typo"
+
+
+def _part_similarity(x, y, part_freq=None):
+    """
+    تشابه جزأين مختلفين من الاسم. خطأ الكتابة المرجّح يُعطى درجة عالية؛ أما الفرق
+    "الملتبس" فقد يكون اسمًا آخر فعلًا (محمد/محمود، الشهري/الشمري) فيبقى دون العتبة
+    الافتراضية للمراجعة، إلا إن كان أحد الجزأين نادرًا جدًا مقارنةً بالآخر (part_freq).
+    """
+    kind = _part_edit(x, y)
+    if kind == "ambiguous" and part_freq:
+        rare, common = sorted((part_freq[x], part_freq[y]))
+        if rare <= RARE_PART and common >= rare * RARE_RATIO:
+            return 0.85
+    return PART_SCORES[kind]
+
+
+def _features(key):
+    return _compact(key), name_parts(key)
+
+
+def _score(fa, fb, part_freq=None, min_score=0.0):
+    (ca, pa), (cb, pb) = fa, fb
+    if ca == cb:
+        return 1.0
+    if len(pa) == len(pb):
+        diff = [(x, y) for x, y in zip(pa, pb) if x != y]
+        if len(diff) == 1:
+            return _part_similarity(*diff[0], part_freq)
+    elif abs(len(pa) - len(pb)) == 1:
+        shorter, longer = sorted((pa, pb), key=len)
+        if any(longer[:i] + longer[i + 1:] == shorter for i in range(len(longer))):
+            # سقوط جزء كامل (اسم الجد مثلًا)
+            return MISSING_PART_SCORE
+    # اختلاف أوسع: تشابه الثلاثيات كما كُتبت وبهيكلها الصوتي، بسقف دون العتبة
+    if min_score > FALLBACK_CAP:
+        return 0.0
+    return min((
+        _jaccard(trigrams(ca), trigrams(cb))
+        + _jaccard(trigrams(phonetic_key(ca)), trigrams(phonetic_key(cb)))
+    ) / 2, FALLBACK_CAP)
+
+
+def similarity(a, b, part_freq=None):
+    """تشابه مفتاحي طالبين (0..1)، 1 = الاسم نفسه مع اختلاف المسافات فقط."""
+    return _score(_features(a), _features(b), part_freq)
+
+
+def _block_keys(features):
+    compact, parts = features
+    yield "n:" + "-".join(parts)
+    if len(parts) > 2:
+        for i in range(len(parts)):
+            yield "n:" + "-".join(parts[:i] + parts[i + 1:])
+    yield "p:" + phonetic_key(compact)
+
+
+def candidate_pairs(keys, max_df=DEFAULT_MAX_DF, features=None):
+    """أزواج (i, j) المرشحة، i < j: كل زوج يشترك في كتلة واحدة على الأقل حجمها ≤ max_df."""
+    features = features or [_features(k) for k in keys]
+    blocks = defaultdict(list)
+    for i, f in enumerate(features):
+        for b in set(_block_keys(f)):
+            blocks[b].append(i)
+    pairs = set()
+    for members in blocks.values():
+        if 1 < len(members) <= max_df:
+            pairs.update(combinations(members, 2))
+    return pairs
+
+
+def find_duplicates(stats=None, min_score=DEFAULT_MIN_SCORE, max_df=DEFAULT_MAX_DF):
+    """
+    مجموعات المفاتيح المتشابهة (Suggestion) مرتبة بعدد الإحالات. الهدف في كل مجموعة
+    هو الأكثر إحالات (ثم الأحدث)، والأعضاء مع تشابههم معه — وكلهم ≥ min_score، فلا
+    يُدمج مفتاح في هدف لا يشبهه لمجرد اتصاله به عبر سلسلة.
+    """
+    stats = key_stats() if stats is None else stats
+    keys = [s.key for s in stats]
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    features = [_features(k) for k in keys]
+    part_freq = Counter(p for _, parts in features for p in set(parts))
+    for i, j in candidate_pairs(keys, max_df, features):
+        if _score(features[i], features[j], part_freq, min_score) >= min_score:
+            parent[find(i)] = find(j)
+
+    groups = defaultdict(list)
+    for i in range(len(keys)):
+        groups[find(i)].append(stats[i])
+
+    suggestions = []
+    for members in groups.values():
+        members.sort(key=lambda s: (s.count, s.latest), reverse=True)
+        # التجميع متعدٍّ (أ~ب و ب~ج)، لكن لا يُقترح إلا من يشبه الهدف نفسه؛
+        # الباقون (المتصلون بالسلسلة فقط) يُقسَّمون اقتراحاتٍ مستقلة بأهدافهم
+        while len(members) > 1:
+            target, rest = members[0], members[1:]
+            scored = [(s, similarity(target.key, s.key, part_freq)) for s in rest]
+            matched = [(s, score) for s, score in scored if score >= min_score]
+            if matched:
+                suggestions.append(Suggestion(target, matched))
+            members = [s for s, score in scored if score < min_score]
+    suggestions.sort(key=lambda g: sum(s.count for s, _ in g.members) + g.target.count, reverse=True)
+    return suggestions
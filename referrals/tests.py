@@ -1,3 +1,398 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from attachments.models import Blob
+from kingabdulaziz205.testing import TempMediaMixin, make_referral, make_user
+from .models import Action, ActionAttachment, Attachment, NewsTicker, Referral, StudentAlias
+from .news import CACHE_KEY, _load, visible_tickers
+from .students import ALIASES_TIMEOUT, canonical_student_key, find_duplicates, merge_student_keys, similarity
+from .utils import make_student_key
+from .views import GROUPS_PER_PAGE
+
+
+class DetailQueryCountTests(TestCase):
+    """صفحة تفاصيل الإحالة تُبنى بعدد ثابت من الاستعلامات مهما كثرت الإجراءات والمرفقات."""
+
+    # جلسة + المستخدم مع ملفه الشخصي + الإحالة + المرفقات + الإجراءات + مرفقاتها + نفس الطالب
+    # + عدّاد المراسلات (شريط الأخبار من الكاش)
+    DETAIL_QUERIES = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+        cls.ref = make_referral(cls.teacher, "طالب اختبار")
+        cls.blob_seq = 0
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+        self.url = reverse("referrals:detail", args=[self.ref.pk])
+
+    def _blob(self, ext=".jpg"):
+        type(self).blob_seq += 1
+        sha = f"{self.blob_seq:064x}"
+        return Blob.objects.create(sha256=sha, file=f"blobs/{sha[:2]}/{sha}{ext}", size=1)
+
+    def _grow(self, actions=4, files_per_action=2, attachments=3):
+        for _ in range(attachments):
+            b = self._blob()
+            Attachment.objects.create(referral=self.ref, blob=b, file=b.file.name, uploaded_by=self.teacher)
+        for i in range(actions):
+            a = Action.objects.create(referral=self.ref, author=self.teacher, kind="NOTE", content=f"إجراء {i}")
+            for _ in range(files_per_action):
+                b = self._blob(".pdf")
+                ActionAttachment.objects.create(action=a, blob=b, file=b.file.name, uploaded_by=self.teacher)
+
+    def _count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx)
+
+    def test_queries_do_not_grow_with_actions_and_files(self):
+        self._grow(actions=1, files_per_action=1, attachments=1)
+        self._count()  # أول زيارة تنشئ عدّاد المراسلات للمستخدم
+        small = self._count()
+        self._grow(actions=6, files_per_action=3, attachments=4)
+        self.assertEqual(self._count(), small)
+
+    def test_query_budget(self):
+        self._grow()
+        self._count()  # أول زيارة تنشئ عدّاد المراسلات للمستخدم
+        with self.assertNumQueries(self.DETAIL_QUERIES):
+            self.client.get(self.url)
+
+
+class NewsTickerCacheTests(TestCase):
+    """الأشرطة المرئية تُقرأ من الكاش وتُمسح عند تعديل أي شريط."""
+
+    def setUp(self):
+        cache.delete(CACHE_KEY)
+
+    def test_cached_path_costs_no_queries(self):
+        NewsTicker.objects.create(text="أول")
+        NewsTicker.objects.create(text="ثانٍ")
+        self.assertEqual([t.text for t in visible_tickers()], ["ثانٍ", "أول"])
+        with self.assertNumQueries(0):
+            visible_tickers()
+
+    def test_save_and_delete_invalidate(self):
+        t = NewsTicker.objects.create(text="قديم")
+        visible_tickers()
+        t.text = "جديد"
+        t.save()
+        self.assertEqual([x.text for x in visible_tickers()], ["جديد"])
+        t.delete()
+        self.assertEqual(visible_tickers(), [])
+
+    def test_ttl_stops_at_next_boundary(self):
+        now = timezone.now()
+        NewsTicker.objects.create(text="قادم", starts_at=now + timedelta(seconds=90))
+        NewsTicker.objects.create(text="حالي", ends_at=now + timedelta(seconds=30))
+        visible, ttl = _load(now)
+        self.assertEqual([t.text for t in visible], ["حالي"])
+        self.assertEqual(ttl, 31)
+
+
+class StudentKeyTests(TestCase):
+    """توحيد مفاتيح الطلاب واقتراح المكررة ودمجها."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_spelling_variants_share_key(self):
+        self.assertEqual(make_student_key("أحمد إبراهيم آل مُصطفى"), make_student_key("احمد ابراهيم ال مصطفي"))
+        self.assertEqual(make_student_key("فاطمة"), make_student_key("فاطمه"))
+        self.assertEqual(make_student_key("عبـــدالله"), make_student_key("عبدالله"))
+
+    def test_typos_suggested_but_distinct_names_kept(self):
+        self.assertEqual(similarity("عبد-الرحمن-خالد", "عبدالرحمن-خالد"), 1.0)
+        self.assertGreaterEqual(similarity("فيصل-عمر-القحطاني", "فيصل-عمر-الحطاني"), 0.8)
+        self.assertLess(similarity("محمد-علي", "محمود-علي"), 0.8)
+
+        for name in ["خالد فهد القحطاني", "خالد فهد القحطاني", "خالد فهد الحطاني", "محمود علي", "محمد علي"]:
+            make_referral(self.teacher, name)
+        groups = find_duplicates()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].target.key, "خالد-فهد-القحطاني")
+        self.assertEqual([s.key for s, _ in groups[0].members], ["خالد-فهد-الحطاني"])
+
+    def test_chain_members_not_merged_into_dissimilar_target(self):
+        # الحربي~الحبي~الحي سلسلة، لكن الحي لا يشبه الحربي (0.40)
+        for name in ["علي فهد الحربي", "علي فهد الحربي", "علي فهد الحبي", "علي فهد الحي"]:
+            make_referral(self.teacher, name)
+        self.assertLess(similarity("علي-فهد-الحربي", "علي-فهد-الحي"), 0.8)
+        groups = find_duplicates()
+        self.assertEqual([(g.target.key, [s.key for s, _ in g.members]) for g in groups],
+                         [("علي-فهد-الحربي", ["علي-فهد-الحبي"])])
+
+        call_command("merge_student_keys", "--apply", stdout=StringIO())
+        keys = Counter(Referral.objects.values_list("student_key", flat=True))
+        self.assertEqual(keys, {"علي-فهد-الحربي": 3, "علي-فهد-الحي": 1})
+
+    def test_merge_moves_referrals_and_aliases_new_ones(self):
+        kept, typo = make_referral(self.teacher, "سعود ناصر"), make_referral(self.teacher, "سعود ناصرر")
+        self.assertEqual(merge_student_keys([typo.student_key], kept.student_key), 1)
+        typo.refresh_from_db()
+        self.assertEqual(typo.student_key, kept.student_key)
+        self.assertEqual(make_referral(self.teacher, "سعود ناصرر").student_key, kept.student_key)
+
+        self.client.force_login(self.teacher)
+        resp = self.client.get(reverse("referrals:student_file", args=["سعود-ناصرر"]))
+        self.assertRedirects(resp, reverse("referrals:student_file", args=[kept.student_key]))
+
+    def test_rebuild_keeps_civil_id_keys(self):
+        civil = make_referral(self.teacher, "أحمد علي", student_key="1098765432")
+        legacy = make_referral(self.teacher, "أحمد علي")
+        Referral.objects.filter(pk=legacy.pk).update(student_key="أحمد-علي")  # مفتاح ما قبل التوحيد
+        call_command("rebuild_student_keys", stdout=StringIO())
+        civil.refresh_from_db()
+        legacy.refresh_from_db()
+        self.assertEqual(civil.student_key, "1098765432")
+        self.assertEqual(legacy.student_key, "احمد-علي")
+
+    def test_rebuild_dry_run_and_resume(self):
+        refs = [make_referral(self.teacher, "أحمد علي") for _ in range(3)]
+        Referral.objects.update(student_key="أحمد-علي")
+        out = StringIO()
+        call_command("rebuild_student_keys", "--dry-run", "--batch-size", "2", stdout=out)
+        self.assertIn("سيتم تحديث 3", out.getvalue())
+        self.assertFalse(Referral.objects.exclude(student_key="أحمد-علي").exists())
+
+        call_command("rebuild_student_keys", "--since-id", str(refs[0].pk), stdout=StringIO())
+        keys = dict(Referral.objects.values_list("pk", "student_key"))
+        self.assertEqual([keys[r.pk] for r in refs], ["أحمد-علي", "احمد-علي", "احمد-علي"])
+
+    def test_alias_cache_expires_for_merges_from_other_workers(self):
+        self.assertEqual(canonical_student_key("سعد-ناصرر"), "سعد-ناصرر")
+        # دمج من عملية أخرى: لا إبطال هنا
+        StudentAlias.objects.create(alias="سعد-ناصرر", student_key="سعد-ناصر")
+        self.assertEqual(canonical_student_key("سعد-ناصرر"), "سعد-ناصرر")
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=time.time() + ALIASES_TIMEOUT + 1):
+            self.assertEqual(canonical_student_key("سعد-ناصرر"), "سعد-ناصر")
+
+
+class AuditQueryPlansTests(TestCase):
+    """audit_query_plans يلتقط المسح الكامل بصيغتي SQLite القديمة والحديثة فقط."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+
+    def _audit(self, plan):
+        out = StringIO()
+        with mock.patch("django.db.models.query.QuerySet.explain", return_value=plan):
+            call_command("audit_query_plans", "--fail-on-seq-scan", stdout=out)
+        return out.getvalue()
+
+    def test_seq_scan_plans_fail(self):
+        for plan in ("SCAN TABLE referrals_referral", "SCAN referrals_referral", "Seq Scan on referrals_referral"):
+            with self.subTest(plan=plan), mock.patch("referrals.management.commands.audit_query_plans.connection") as conn:
+                conn.vendor = "postgresql" if plan.startswith("Seq") else "sqlite"
+                with self.assertRaises(CommandError):
+                    self._audit(plan)
+
+    def test_hot_queries_use_indexes(self):
+        ref = make_referral(self.teacher)
+        Action.objects.create(referral=ref, author=self.teacher, kind="NOTE", content="ملاحظة")
+        out = StringIO()
+        call_command("audit_query_plans", "--fail-on-seq-scan", stdout=out)
+        self.assertIn("منها 0 بمسح كامل", out.getvalue())
+
+    def test_index_plans_pass(self):
+        plan = "SEARCH referrals_referral USING INDEX ref_created_by_idx (created_by_id=?)\n" \
+               "SCAN TABLE referrals_action USING COVERING INDEX action_ref_idx\nSCAN CONSTANT ROW"
+        self.assertIn("منها 0 بمسح كامل", self._audit(plan))
+
+
+class ReferralIndexTests(TestCase):
+    """قائمة الإحالات مجمّعة حسب الطالب ومرقّمة في قاعدة البيانات."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+        cls.other = make_user("other")
+        now = timezone.now()
+        rows = []
+        for i in range(GROUPS_PER_PAGE + 5):
+            for j in range(2):
+                rows.append(Referral(
+                    student_name=f"طالب {i}", student_key=f"s{i:02d}", grade="1", referral_type="behavior",
+                    details="تفاصيل", created_by=cls.teacher, reference=f"R-T-{i}-{j}",
+                ))
+        rows.append(Referral(
+            student_name="طالب 0", student_key="s00", grade="1", referral_type="behavior",
+            details="تفاصيل", created_by=cls.other, reference="R-T-other",
+        ))
+        Referral.objects.bulk_create(rows)
+        # الأحدث أولًا: s00 الأقدم، s24 الأحدث
+        for i in range(GROUPS_PER_PAGE + 5):
+            Referral.objects.filter(student_key=f"s{i:02d}").update(created_at=now - timedelta(hours=100 - i))
+
+    def _page(self, page):
+        self.client.force_login(self.teacher)
+        resp = self.client.get(reverse("referrals:index"), {"page": page})
+        self.assertEqual(resp.status_code, 200)
+        return resp.context
+
+    def test_groups_paginated_by_latest_referral(self):
+        first, second = self._page(1), self._page(2)
+        self.assertEqual(first["page_obj"].paginator.num_pages, 2)
+        self.assertEqual([g["key"] for g in first["groups"]][:3], ["s24", "s23", "s22"])
+        self.assertEqual(len(first["groups"]), GROUPS_PER_PAGE)
+        self.assertEqual([g["key"] for g in second["groups"]], ["s04", "s03", "s02", "s01", "s00"])
+        # مجموعة الطالب فيها إحالات المستخدم فقط، كاملة
+        s00 = second["groups"][-1]
+        self.assertEqual(s00["student_name"], "طالب 0")
+        self.assertEqual({r.created_by_id for r in s00["referrals"]}, {self.teacher.id})
+        self.assertEqual(len(s00["referrals"]), 2)
+
+
+class StudentFileTests(TestCase):
+    """ملف الطالب استعلام مفهرس على student_key مقيّد بصلاحية المستخدم."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+        cls.other = make_user("other")
+        cls.manager = make_user("boss", "مدير المدرسة")
+
+    def _items(self, user, key):
+        self.client.force_login(user)
+        resp = self.client.get(reverse("referrals:student_file", args=[key]))
+        self.assertEqual(resp.status_code, 200)
+        return resp.context["items"]
+
+    def test_scoped_to_key_and_visibility(self):
+        mine = [make_referral(self.teacher, "سالم خالد") for _ in range(3)]
+        theirs = make_referral(self.other, "سالم خالد")
+        make_referral(self.teacher, "ماجد خالد")
+        key = mine[0].student_key
+        self.assertEqual([r.pk for r in self._items(self.teacher, key)], [r.pk for r in reversed(mine)])
+        self.assertEqual(len(self._items(self.manager, key)), 4)
+        self.assertEqual([r.pk for r in self._items(self.other, key)], [theirs.pk])
+
+    def test_queries_do_not_grow_with_referrals(self):
+        key = make_referral(self.teacher, "سالم خالد").student_key
+        self._items(self.teacher, key)
+        with CaptureQueriesContext(connection) as small:
+            self._items(self.teacher, key)
+        for _ in range(5):
+            make_referral(self.teacher, "سالم خالد")
+        self._items(self.teacher, key)
+        with CaptureQueriesContext(connection) as large:
+            self._items(self.teacher, key)
+        self.assertEqual(len(large), len(small))
+
+
+class StudentKeyWriteTests(TestCase):
+    """student_key يُولَّد عند الكتابة دائمًا، فصفحات القراءة لا تكتب شيئًا."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+
+    def test_key_generated_on_save_and_never_empty(self):
+        self.assertEqual(make_referral(self.teacher, "سالم  خالد").student_key, "سالم-خالد")
+        symbols = make_referral(self.teacher, "!!!")
+        self.assertEqual(symbols.student_key, symbols.reference)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Referral.objects.filter(pk=symbols.pk).update(student_key="")
+
+    def test_read_views_do_not_write(self):
+        ref = make_referral(self.teacher, "سالم خالد")
+        self.client.force_login(self.teacher)
+        urls = [
+            reverse("referrals:index"),
+            reverse("referrals:detail", args=[ref.pk]),
+            reverse("referrals:student_file", args=[ref.student_key]),
+        ]
+        for url in urls:
+            self.client.get(url)  # تهيئة عدّادات/حالات أول زيارة
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            writes = [q["sql"] for q in ctx if q["sql"].startswith(("UPDATE", "INSERT"))]
+            self.assertEqual(writes, [], url)
+
+
+class SameStudentTests(TestCase):
+    """شريط "إحالات نفس الطالب" في التفاصيل: نفس المفتاح، بصلاحية المستخدم، 10 على الأكثر."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+        cls.other = make_user("other")
+
+    def test_same_student_sidebar(self):
+        current = make_referral(self.teacher, "سالم خالد")
+        earlier = [make_referral(self.teacher, "سالم خالد") for _ in range(12)]
+        make_referral(self.other, "سالم خالد")
+        make_referral(self.teacher, "ماجد خالد")
+        self.client.force_login(self.teacher)
+        resp = self.client.get(reverse("referrals:detail", args=[current.pk]))
+        same = resp.context["same_student"]
+        self.assertEqual([r.pk for r in same], [r.pk for r in reversed(earlier)][:10])
+
+
+class CreateReferralTests(TempMediaMixin, TestCase):
+    """إنشاء الإحالة مع التوزيع والمرفقات والإجراء والانتقال في معاملة واحدة."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user("teacher")
+        cls.counselor = make_user("counselor", "موجه طلابي")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+
+    def _create(self):
+        return self.client.post(reverse("referrals:new"), {
+            "student_name": "سعد علي", "grade": "1", "referral_type": "behavior",
+            "details": "تفاصيل كافية للإحالة",
+            "attachments": [
+                SimpleUploadedFile("a.pdf", b"%PDF-1.4 first"),
+                SimpleUploadedFile("b.pdf", b"%PDF-1.4 second"),
+            ],
+        })
+
+    def test_create_writes_everything(self):
+        resp = self._create()
+        ref = Referral.objects.get()
+        self.assertRedirects(resp, reverse("referrals:detail", args=[ref.pk]), fetch_redirect_response=False)
+        self.assertEqual(ref.student_key, make_student_key("سعد علي"))
+        self.assertEqual((ref.assignee, ref.status), (self.counselor, "UNDER_REVIEW"))
+        self.assertEqual(ref.attachments.count(), 2)
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(list(ref.actions.values_list("kind", flat=True)), ["NOTE"])
+        self.assertEqual(
+            list(ref.transitions.values_list("action", "from_state", "to_state")),
+            [("create", "NEW", "UNDER_REVIEW")],
+        )
 
-# Create your tests here.
+    def test_failure_rolls_back_whole_create(self):
+        with mock.patch.object(Attachment.objects, "bulk_create", side_effect=IntegrityError("boom")):
+            with self.assertRaises(IntegrityError):
+                self._create()
+        self.assertFalse(Referral.objects.exists())
+        self.assertFalse(Action.objects.exists())
+        # الملفات تُخزَّن قبل المعاملة، وإعادة المحاولة تعيد استخدامها
+        self.assertEqual(Blob.objects.count(), 2)
+        self._create()
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(Referral.objects.get().attachments.count(), 2)
@@ -1,18 +1,39 @@
 # referrals/utils.py
 from __future__ import annotations
-import re, unicodedata
+import re
+import unicodedata
 from typing import Optional
 
+from kingabdulaziz205.arabic import normalize_arabic
+
 def make_student_key(name: str, civil_id: Optional[str] = None) -> str:
     """
     يبني مفتاحًا ثابتًا للطالب:
     - إن وُجد السجل المدني نستخدمه مباشرة (حتى 64 حرفًا).
-    - وإلا نولّد من الاسم: Normalize + حذف محارف غير عربية/لاتينية/أرقام + استبدال المسافات بشرطة.
+    - وإلا نولّد من الاسم: توحيد عربي (normalize_arabic: أشكال الألف، التاء المربوطة،
+      الألف المقصورة، التطويل، التشكيل) + حذف محارف غير عربية/لاتينية/أرقام + استبدال المسافات بشرطة.
+    المفاتيح المدموجة يدويًا (StudentAlias) تُحل بـ students.canonical_student_key.
     """
     key = (civil_id or "").strip()
     if key:
         return key[:64]
+    s = normalize_arabic(name)
+    s = re.sub(r"\s+", "-", s)
+    s = re.sub(r"[^0-9A-Za-z\u0600-\u06FF\-]", "", s)
+    return s[:60]
+
+
+def legacy_student_key(name: str) -> str:
+    """make_student_key قبل التوحيد العربي (المفاتيح التي أعاد توليدها ترحيل 0018)."""
     s = unicodedata.normalize("NFKC", (name or "").strip())
     s = re.sub(r"\s+", "-", s)
     s = re.sub(r"[^0-9A-Za-z\u0600-\u06FF\-]", "", s)
     return s[:60]
+
+
+def is_name_derived_key(key: str, name: str, reference: str) -> bool:
+    """
+    هل المفتاح مولّد من الاسم (بالقاعدة الحالية أو القديمة، أو احتياط المرجع للاسم
+    الفارغ)؟ غير ذلك = سجل مدني أو مفتاح وُضع يدويًا، فلا يُعاد توليده من الاسم.
+    """
+    return not key or key in (make_student_key(name), legacy_student_key(name), reference)
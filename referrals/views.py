@@ -5,12 +5,22 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_http_methods
 from django.utils.translation import gettext as _
 from django.http import HttpResponseForbidden, HttpRequest, HttpResponse
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q, Max, Prefetch
 from django.template import loader, TemplateDoesNotExist, engines
 import unicodedata, re
 
-from accounts.models import Profile
+from accounts.directory import get_user_entry, user_picker
+from attachments.blobs import attach, store_blob
+from attachments.uploads import MAX_FILES, checksum_uploads, validate_uploads
+from kingabdulaziz205.caching import get_or_compute
+from search.index import index_objects
+from workflow import transitions
+from workflow.assignment import choose_assignee
 from .models import Referral, Attachment, Action, ActionAttachment
+from .signals import COUNTS_NAMESPACE
+from .students import canonical_student_key
 from .utils import make_student_key
 
 # ===== تفعيل نموذج الموجّه: من models.py أو counselor_models.py =====
@@ -29,50 +39,10 @@ except Exception:
     except Exception:
         HAS_COUNSELOR = False
 
-ALLOWED_EXTS = {".pdf", ".png", ".jpg", ".jpeg", ".doc", ".docx"}
-MAX_FILE_SIZE = 10 * 1024 * 1024
-MAX_FILES = 5
-
 # ——— helpers ———
 def _ctx(form=None, errors=None):
     return {"form": form or {}, "errors": errors or {}, "grades": Referral.GRADE_CHOICES, "types": Referral.TYPE_CHOICES}
 
-def _is_manager(user):
-    try:
-        return bool(user.is_staff or (getattr(user, "profile", None) and user.profile.role == "مدير المدرسة"))
-    except Profile.DoesNotExist:
-        return bool(user.is_staff)
-
-def _can_view(user, ref: Referral):
-    return _is_manager(user) or user == ref.created_by or (ref.assignee and user == ref.assignee)
-
-def _is_counselor(user):
-    try:
-        return user.profile.role == "موجه طلابي"
-    except Profile.DoesNotExist:
-        return False
-
-def _can_assign(user, ref: Referral):
-    return (_is_manager(user) or user.is_staff or user == ref.created_by or _is_counselor(user) or (ref.assignee_id == user.id))
-
-def _ensure_student_key(ref: Referral):
-    try:
-        has_key_field = hasattr(ref, "student_key")
-    except Exception:
-        has_key_field = False
-    if not has_key_field:
-        return
-    try:
-        if getattr(ref, "student_key", ""):
-            return
-        civil = (getattr(ref, "student_civil_id", None) or "")[:64]
-        new_key = make_student_key(getattr(ref, "student_name", ""), civil)
-        if new_key:
-            ref.student_key = new_key
-            ref.save(update_fields=["student_key"])
-    except Exception:
-        pass
-
 def _display(v):
     if v is True: return "نعم"
     if v is False or v == "False": return "لا"
@@ -164,11 +134,42 @@ def _counselor_summary_struct(intake):
     return [g for g in groups if g]
 
 # ——— القائمة ———
+GROUPS_PER_PAGE = 20
+
+def _paginate_groups(items_qs, page_number):
+    """
+    يجمّع الإحالات حسب الطالب داخل قاعدة البيانات (GROUP BY + MAX) ثم يجلب
+    إحالات مجموعات الصفحة الحالية فقط، فتبقى كلفة الصفحة ثابتة مهما كبر الجدول.
+    """
+    groups_qs = (
+        items_qs.order_by()
+        .values("student_key")
+        .annotate(latest=Max("created_at"))
+        .order_by("-latest", "student_key")
+    )
+    page_obj = Paginator(groups_qs, GROUPS_PER_PAGE).get_page(page_number)
+
+    groups_map = {
+        row["student_key"]: {"key": row["student_key"], "student_name": "", "latest": row["latest"], "referrals": []}
+        for row in page_obj.object_list
+    }
+    page_items = list(
+        items_qs.filter(student_key__in=list(groups_map))
+        .select_related("created_by", "assignee")
+        .order_by("-created_at")
+    )
+    for r in page_items:
+        g = groups_map[r.student_key]
+        if not g["referrals"]:
+            g["student_name"] = r.student_name
+        g["referrals"].append(r)
+    return page_obj, page_items, list(groups_map.values())
+
 @login_required
 def list_referrals(request: HttpRequest):
     scope = request.GET.get("scope", "all")
 
-    if _is_manager(request.user):
+    if request.capabilities.is_manager:
         sent_qs = Referral.objects.all()
         inbox_qs = Referral.objects.all()
         base_qs = Referral.objects.all()
@@ -184,36 +185,21 @@ def list_referrals(request: HttpRequest):
     else:
         items_qs = base_qs
 
-    items_qs = items_qs.select_related("created_by", "assignee").order_by("-created_at")
-    items = list(items_qs)
-    for r in items: _ensure_student_key(r)
-
-    groups_map = {}
-    for r in items:
-        key = getattr(r, "student_key", "") or f"ref-{r.pk}"
-        g = groups_map.get(key)
-        if not g:
-            g = {"key": getattr(r, "student_key", "") or "", "student_name": r.student_name, "latest": r.created_at, "referrals": []}
-            groups_map[key] = g
-        g["referrals"].append(r)
-        if r.created_at > g["latest"]: g["latest"] = r.created_at
-        if r.created_at >= g["latest"]: g["student_name"] = r.student_name
-    groups = sorted(groups_map.values(), key=lambda x: x["latest"], reverse=True)
-
-    counts = {
-        "all": base_qs.count(),
-        "sent": sent_qs.count(),
-        "inbox": inbox_qs.count()
-    }
-    return render(request, "referrals/index.html", {"items": items, "groups": groups, "counts": counts, "scope": scope})
+    page_obj, items, groups = _paginate_groups(items_qs, request.GET.get("page"))
+
+    counts = get_or_compute(
+        COUNTS_NAMESPACE, (request.user.id, request.capabilities.is_manager),
+        lambda: {"all": base_qs.count(), "sent": sent_qs.count(), "inbox": inbox_qs.count()},
+    )
+    return render(request, "referrals/index.html", {
+        "items": items, "groups": groups, "counts": counts, "scope": scope, "page_obj": page_obj,
+    })
 
 # ——— إنشاء إحالة ———
 @login_required
 @require_http_methods(["GET", "POST"])
+@checksum_uploads
 def create_referral(request):
-    # قائمة المستخدمين لاختيار "إرسال الإحالة إلى"
-    users_qs = User.objects.filter(is_active=True).order_by("username")
-
     if request.method == "POST":
         student_name = (request.POST.get("student_name") or "").strip()
         grade = (request.POST.get("grade") or "").strip()
@@ -238,74 +224,81 @@ def create_referral(request):
         # التحقق من المرسل إليه إذا تم اختياره
         assignee_user = None
         if assignee_raw:
-            try:
-                assignee_user = User.objects.get(pk=int(assignee_raw), is_active=True)
-            except Exception:
+            assignee_user = get_user_entry(assignee_raw)
+            if assignee_user is None:
                 errors["assignee"] = "المستخدم المحدد غير متاح."
 
-        checked_files = []
-        for f in files:
-            ext = "." + f.name.split(".")[-1].lower()
-            if ext not in ALLOWED_EXTS:
-                errors["attachments"] = "نوع ملف غير مسموح."
-                break
-            if f.size > MAX_FILE_SIZE:
-                errors["attachments"] = "حجم الملف يتجاوز 10MB."
-                break
-            checked_files.append(f)
+        checked_files, file_err = validate_uploads(files)
+        if file_err:
+            errors["attachments"] = file_err
 
         if errors:
-            ctx = {**_ctx(request.POST, errors), "users": users_qs, "selected_assignee": assignee_raw}
+            ctx = {**_ctx(request.POST, errors), "picker": user_picker(selected=assignee_raw)}
             return render(request, "referrals/new.html", ctx)
 
-        ref = Referral.objects.create(
-            student_name=student_name, grade=grade, referral_type=referral_type,
-            details=details, created_by=request.user, status="UNDER_REVIEW",
-        )
-
-        updated_fields = []
-        if hasattr(ref, "student_civil_id"):
-            ref.student_civil_id = student_civil_id or None
-            updated_fields.append("student_civil_id")
-        if hasattr(ref, "student_key"):
-            ref.student_key = make_student_key(student_name, student_civil_id)
-            updated_fields.append("student_key")
-        if updated_fields:
-            try: ref.save(update_fields=updated_fields)
-            except Exception: pass
-
-        for f in checked_files:
-            Attachment.objects.create(referral=ref, file=f, uploaded_by=request.user)
-
-        # إن اختار المستخدم مرسلاً إليه نعيّنه مباشرة، وإلا نستخدم السلوك السابق (الموجّه إن وُجد)
-        if assignee_user:
-            ref.assignee = assignee_user
-            ref.status = "UNDER_REVIEW"
-            ref.save(update_fields=["assignee", "status"])
-            Action.objects.create(referral=ref, author=request.user, kind="NOTE",
-                                  content=f"تحويل تلقائي إلى {assignee_user.username}")
-        else:
-            counselor = User.objects.filter(is_active=True, profile__role="موجه طلابي").first()
-            if counselor:
-                ref.assignee = counselor
-                ref.status = "UNDER_REVIEW"
-                ref.save(update_fields=["assignee", "status"])
-                Action.objects.create(referral=ref, author=request.user, kind="NOTE",
-                                      content=f"تحويل تلقائي إلى الموجّه الطلابي: {counselor.username}")
+        # المفتاح يُحسب قبل أول إدراج
+        student_key = canonical_student_key(make_student_key(student_name, student_civil_id))
+        # Blob لكل ملف (أو الموجود بنفس البصمة) قبل المعاملة: كتابة الملفات لا تتم والقفل
+        # على حالة التوزيع مأخوذ. إن فشل الإنشاء يبقى الـ Blob ويُعاد استخدامه عند إعادة المحاولة
+        blobs = [store_blob(f) for f in checked_files]
+
+        with transaction.atomic():
+            if assignee_user:
+                assignee_id, note = assignee_user.id, f"تحويل تلقائي إلى {assignee_user.username}"
+            else:
+                # محرّك التوزيع (round-robin / الأقل حملًا / حسب الصف) — آخر خطوة قبل الإدراج
+                # لأنه يقفل صف حالته حتى نهاية المعاملة
+                counselor = get_user_entry(choose_assignee(grade))
+                assignee_id = counselor.id if counselor else None
+                note = f"تحويل تلقائي إلى الموجّه الطلابي: {counselor.username}" if counselor else ""
+
+            ref = Referral(
+                student_name=student_name, grade=grade, referral_type=referral_type,
+                details=details, created_by=request.user,
+                student_key=student_key, assignee_id=assignee_id,
+            )
+            # الحالة الابتدائية من قاعدة "إنشاء" (NEW → UNDER_REVIEW افتراضيًا) مع تسجيل الانتقال
+            transitions.apply(ref, transitions.decide("create", ref, request.capabilities), request.user)
+            Attachment.objects.bulk_create([
+                Attachment(referral=ref, blob=b, file=b.file.name, uploaded_by=request.user) for b in blobs
+            ])
+            if note:
+                index_objects("action", Action.objects.bulk_create([
+                    Action(referral=ref, author=request.user, kind="NOTE", content=note),
+                ]))
 
         messages.success(request, _("تم إنشاء الإحالة بنجاح."))
         return redirect("referrals:detail", pk=ref.pk)
 
     # GET
-    return render(request, "referrals/new.html", {**_ctx(), "users": users_qs, "selected_assignee": ""})
+    # منتقي "إرسال الإحالة إلى" من دليل المستخدمين المخزّن
+    return render(request, "referrals/new.html", {**_ctx(), "picker": user_picker()})
 
 # ——— تفاصيل ———
+def _detail_queryset():
+    """
+    الإحالة مع كل ما تعرضه صفحة التفاصيل بعدد ثابت من الاستعلامات مهما كثرت
+    الإجراءات والمرفقات: ref.file_list و ref.action_list و action.file_list.
+    """
+    qs = Referral.objects.select_related("created_by", "assignee").prefetch_related(
+        Prefetch("attachments", queryset=Attachment.objects.select_related("blob").order_by("id"), to_attr="file_list"),
+        Prefetch(
+            "actions",
+            queryset=Action.objects.select_related("author").prefetch_related(
+                Prefetch("files", queryset=ActionAttachment.objects.select_related("blob").order_by("id"), to_attr="file_list"),
+            ).order_by("created_at", "id"),
+            to_attr="action_list",
+        ),
+    )
+    if HAS_COUNSELOR:
+        qs = qs.select_related("counselor_intake")
+    return qs
+
 @login_required
 def detail_referral(request, pk: int):
-    ref = get_object_or_404(Referral, pk=pk)
-    if not _can_view(request.user, ref):
+    ref = get_object_or_404(_detail_queryset(), pk=pk)
+    if not request.capabilities.can_view_referral(ref):
         return HttpResponseForbidden("لا تملك صلاحية عرض هذه الإحالة.")
-    _ensure_student_key(ref)
 
     # عند فتح الإحالة من المكلّف تُعتبر مفتوحة (لأجل الوسم الأخضر بعد الرد)
     if ref.assignee_id == request.user.id and not getattr(ref, "is_opened_by_assignee", False):
@@ -315,24 +308,15 @@ def detail_referral(request, pk: int):
         except Exception:
             pass
 
-    assignable = User.objects.filter(is_active=True).exclude(id=request.user.id).order_by("username")
-    actions = (Action.objects.filter(referral=ref).select_related("author").prefetch_related("files").order_by("created_at"))
-    is_counselor = _is_counselor(request.user)
-
-    base_same_qs = Referral.objects.exclude(pk=ref.pk).order_by("-created_at")
-    if _is_manager(request.user):
-        same_student_qs = base_same_qs
-    else:
-        same_student_qs = base_same_qs.filter(Q(created_by=request.user) | Q(assignee=request.user))
+    actions = ref.action_list
+    is_counselor = request.capabilities.is_counselor
 
-    same_student = []
-    for r in same_student_qs:
-        _ensure_student_key(r)
-        if getattr(ref, "student_key", "") and getattr(r, "student_key", "") and r.student_key == ref.student_key:
-            same_student.append(r)
-        if len(same_student) >= 10: break
+    same_student_qs = Referral.objects.filter(student_key=ref.student_key).exclude(pk=ref.pk)
+    if not request.capabilities.is_manager:
+        same_student_qs = same_student_qs.filter(Q(created_by=request.user) | Q(assignee=request.user))
+    same_student = list(same_student_qs.order_by("-created_at")[:10])
 
-    files = getattr(ref, "attachments", Attachment.objects.none()).all()
+    files = ref.file_list
 
     counselor_summary = []
     can_view_counselor_summary = False
@@ -341,12 +325,12 @@ def detail_referral(request, pk: int):
             intake = getattr(ref, "counselor_intake", None)
         except Exception:
             intake = None
-        can_view_counselor_summary = _can_view(request.user, ref)
+        can_view_counselor_summary = request.capabilities.can_view_referral(ref)
         if intake and can_view_counselor_summary:
             counselor_summary = _counselor_summary_struct(intake)
 
     return render(request, "referrals/detail.html", {
-        "r": ref, "assignable": assignable, "actions": actions,
+        "r": ref, "actions": actions,
         "is_counselor": is_counselor, "same_student": same_student,
         "files": files, "HAS_COUNSELOR": HAS_COUNSELOR,
         "counselor_summary": counselor_summary,
@@ -358,7 +342,7 @@ def detail_referral(request, pk: int):
 @require_http_methods(["POST"])
 def assign_referral(request, pk: int):
     ref = get_object_or_404(Referral, pk=pk)
-    if not _can_assign(request.user, ref):
+    if not request.capabilities.can_assign_referral(ref):
         return HttpResponseForbidden("لا تملك صلاحية تحويل هذه الإحالة.")
 
     user_id = request.POST.get("assignee")
@@ -369,9 +353,8 @@ def assign_referral(request, pk: int):
         return redirect("referrals:detail", pk=ref.pk)
 
     ref.assignee = new_assignee
-    if ref.status in ["NEW", "UNDER_REVIEW"]:
-        ref.status = "UNDER_REVIEW"
-    ref.save()
+    decision = transitions.decide("assign", ref, request.capabilities)
+    transitions.apply(ref, decision, request.user, update_fields=["assignee"])
 
     Action.objects.create(referral=ref, author=request.user, kind="NOTE",
                           content=f"تحويل إلى {new_assignee.username}")
@@ -386,9 +369,10 @@ def assign_referral(request, pk: int):
 # ——— رد ———
 @login_required
 @require_http_methods(["POST"])
+@checksum_uploads
 def reply_referral(request, pk: int):
     ref = get_object_or_404(Referral, pk=pk)
-    if not _can_view(request.user, ref):
+    if not request.capabilities.can_view_referral(ref):
         return HttpResponseForbidden("لا تملك صلاحية الرد على هذه الإحالة.")
     content = (request.POST.get("content") or "").strip()
     files = request.FILES.getlist("reply_files")
@@ -400,33 +384,19 @@ def reply_referral(request, pk: int):
         messages.error(request, f"يمكن رفع {MAX_FILES} ملفات كحد أقصى.")
         return redirect("referrals:detail", pk=ref.pk)
 
-    checked = []
-    for f in files:
-        ext = "." + f.name.split(".")[-1].lower()
-        if ext not in ALLOWED_EXTS:
-            messages.error(request, "نوع ملف غير مسموح.")
-            return redirect("referrals:detail", pk=ref.pk)
-        if f.size > MAX_FILE_SIZE:
-            messages.error(request, "حجم الملف يتجاوز 10MB.")
-            return redirect("referrals:detail", pk=ref.pk)
-        checked.append(f)
+    checked, file_err = validate_uploads(files)
+    if file_err:
+        messages.error(request, file_err)
+        return redirect("referrals:detail", pk=ref.pk)
 
     act = Action.objects.create(referral=ref, author=request.user, kind="REPLY", content=content)
     for f in checked:
-        ActionAttachment.objects.create(action=act, file=f, uploaded_by=request.user)
+        attach(ActionAttachment, f, action=act, uploaded_by=request.user)
 
-    # وسم الرد ليتحول لون البطاقة للأخضر بعد الفتح
-    if not getattr(ref, "has_reply", False):
-        try:
-            ref.has_reply = True
-        except Exception:
-            pass
-    if ref.status == "NEW":
-        ref.status = "UNDER_REVIEW"
-    try:
-        ref.save(update_fields=["has_reply", "status"])
-    except Exception:
-        ref.save()
+    # وسم الرد ليتحول لون البطاقة للأخضر بعد الفتح (وهو أيضًا شرط الإغلاق)
+    ref.has_reply = True
+    decision = transitions.decide("reply", ref, request.capabilities)
+    transitions.apply(ref, decision, request.user, update_fields=["has_reply"])
 
     messages.success(request, "تم إرسال الرد.")
     return redirect("referrals:detail", pk=ref.pk)
@@ -436,25 +406,16 @@ def reply_referral(request, pk: int):
 @require_http_methods(["POST"])
 def close_referral(request, pk: int):
     ref = get_object_or_404(Referral, pk=pk)
-    if not _can_view(request.user, ref):
+    if not request.capabilities.can_view_referral(ref):
         return HttpResponseForbidden("لا تملك صلاحية إغلاق هذه الإحالة.")
 
-    # يمنع الإغلاق قبل وجود "رد" أو توصية في نموذج الموجه (إن وُجد)
-    has_valid = Action.objects.filter(referral=ref, kind="REPLY").exists()
-    if not has_valid and HAS_COUNSELOR:
-        try:
-            intake = getattr(ref, "counselor_intake", None)
-            if intake and getattr(intake, "recommendations", "").strip():
-                has_valid = True
-        except Exception:
-            pass
-
-    if not has_valid:
-        messages.error(request, "لا يمكن إغلاق الإحالة قبل وضع رد أو توصية.")
+    # قواعد الإغلاق تشترط افتراضيًا ردًا أو توصية (has_reply / has_recommendation)
+    decision = transitions.decide("close", ref, request.capabilities)
+    if not decision.allowed:
+        messages.error(request, decision.reason)
         return redirect("referrals:detail", pk=ref.pk)
 
-    ref.status = "CLOSED"
-    ref.save()
+    transitions.apply(ref, decision, request.user)
     Action.objects.create(referral=ref, author=request.user, kind="DECISION", content="تم إغلاق الإحالة.")
     messages.success(request, "تم إغلاق الإحالة.")
     return redirect("referrals:detail", pk=ref.pk)
@@ -466,7 +427,7 @@ def counselor_intake_view(request, pk: int):
     if not HAS_COUNSELOR:
         return HttpResponseForbidden("هذه الصفحة غير مفعّلة (نموذج الموجّه غير مُثبت).")
     ref = get_object_or_404(Referral, pk=pk)
-    if not (_is_counselor(request.user) or _is_manager(request.user) or request.user.is_staff or ref.assignee_id == request.user.id):
+    if not request.capabilities.can_counsel_referral(ref):
         return HttpResponseForbidden("هذه الصفحة للموجّه/المشرف/المكلّف فقط.")
 
     intake, _ = CounselorIntake.objects.get_or_create(referral=ref, defaults={
@@ -504,33 +465,29 @@ def counselor_intake_view(request, pk: int):
 # ——— ملف الطالب ———
 @login_required
 def student_file(request, key: str):
-    if _is_manager(request.user):
-        visible_qs = Referral.objects.all().order_by("-created_at")
+    # روابط المفاتيح المدموجة تُحوَّل إلى الملف الموحّد
+    canonical = canonical_student_key(key)
+    if canonical != key:
+        return redirect("referrals:student_file", key=canonical)
+
+    if request.capabilities.is_manager:
+        visible_qs = Referral.objects.all()
     else:
-        visible_qs = Referral.objects.filter(Q(created_by=request.user) | Q(assignee=request.user)).order_by("-created_at")
+        visible_qs = Referral.objects.filter(Q(created_by=request.user) | Q(assignee=request.user))
 
-    visible = list(visible_qs)
-    for r in visible: _ensure_student_key(r)
-    items = [r for r in visible if getattr(r, "student_key", "") == key]
+    items_qs = visible_qs.filter(student_key=key).order_by("-created_at")
+    if HAS_COUNSELOR:
+        items_qs = items_qs.select_related("counselor_intake")
+    items = list(items_qs)
     student_name = items[0].student_name if items else ""
 
     intake_map = {}
     if HAS_COUNSELOR:
         for r in items:
-            try:
-                intake = getattr(r, "counselor_intake", None)
-                if intake:
-                    intake_map[r.pk] = _counselor_summary_struct(intake)
-            except Exception:
-                pass
-
-    if HAS_COUNSELOR:
-        for r in items:
-            try:
-                intake = getattr(r, "counselor_intake", None)
-                r.counselor_summary = _counselor_summary_struct(intake) if intake else []
-            except Exception:
-                r.counselor_summary = []
+            intake = getattr(r, "counselor_intake", None)
+            r.counselor_summary = _counselor_summary_struct(intake) if intake else []
+            if intake:
+                intake_map[r.pk] = r.counselor_summary
 
     return render(request, "referrals/student_file.html", {
         "student_name": student_name, "items": items, "key": key,
@@ -0,0 +1,19 @@
+# search/admin.py
+from .models import SearchEntry
+from .query import matching_ids, match_expression
+
+
+class IndexedSearchMixin:
+    """
+    يضيف لبحث لوحة الإدارة مطابقة نص search_kind من فهرس البحث بدل icontains
+    على الحقول النصية الطويلة (تبقى search_fields للحقول القصيرة كالمرجع والاسم).
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        qs, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        expression = match_expression(search_term)
+        if expression:
+            ids = SearchEntry.objects.filter(kind=self.search_kind, id__in=matching_ids(expression)).values("object_id")
+            qs = qs | queryset.filter(pk__in=ids)
+        return qs, may_have_duplicates
@@ -0,0 +1,107 @@
+# search/index.py
+"""
+صيانة فهرس البحث (SearchEntry) تزايديًا من الإشارات (signals.py) أو دفعةً واحدة
+(rebuild: أمر rebuild_search_index وترحيل 0002).
+
+المصادر معرّفة كبيانات في SOURCES، فيعمل الكود نفسه على النماذج الفعلية أو
+التاريخية داخل الترحيلات (apps.get_model).
+"""
+import re
+
+from django.apps import apps as global_apps
+from django.db import connection
+from django.utils import timezone
+
+from kingabdulaziz205.arabic import normalize_arabic
+
+BATCH_SIZE = 500
+FTS_TABLE = "search_searchentry_fts"
+
+# النوع: (النموذج، الحقول النصية، حقل الإحالة، حقل المراسلة)
+SOURCES = {
+    "referral": ("referrals.Referral", ("student_name", "details"), "id", None),
+    "action": ("referrals.Action", ("content",), "referral_id", None),
+    "intake": ("referrals.CounselorIntake", ("student_behavior", "recommendations"), "referral_id", None),
+    "message": ("messaging.Message", ("content",), None, "thread_id"),
+}
+
+# أداة التعريف وما يسبقها من حروف العطف والجر: "والطالب" و"بالمدرسة" تُفهرس "طالب" و"مدرسه"
+_ARTICLE_RE = re.compile(r"^(?:وال|بال|كال|فال|لل|ال)(?=\w{2,})")
+_WORD_RE = re.compile(r"\w+")
+
+
+def search_terms(text):
+    """كلمات النص بعد التوحيد وحذف أداة التعريف (للفهرسة وللاستعلام على السواء)."""
+    return [_ARTICLE_RE.sub("", w) for w in _WORD_RE.findall(normalize_arabic(text))]
+
+
+def entry_for(kind, obj, entry_model=None):
+    """مدخل غير محفوظ لسجل المصدر، أو None إن لم يكن فيه نص."""
+    entry_model = entry_model or global_apps.get_model("search", "SearchEntry")
+    _, fields, referral_attr, thread_attr = SOURCES[kind]
+    body = " ".join(search_terms(" ".join(getattr(obj, f) or "" for f in fields)))
+    if not body:
+        return None
+    return entry_model(
+        kind=kind, object_id=obj.pk, body=body,
+        referral_id=getattr(obj, referral_attr) if referral_attr else None,
+        thread_id=getattr(obj, thread_attr) if thread_attr else None,
+        created_at=getattr(obj, "created_at", None) or timezone.now(),
+    )
+
+
+def index_objects(kind, objs, entry_model=None):
+    """يُدرج/يحدّث مدخلات مجموعة سجلات باستعلام واحد (upsert على kind+object_id)."""
+    entry_model = entry_model or global_apps.get_model("search", "SearchEntry")
+    entries, empty = [], []
+    for obj in objs:
+        entry = entry_for(kind, obj, entry_model)
+        if entry:
+            entries.append(entry)
+        else:
+            empty.append(obj.pk)
+    if entries:
+        entry_model.objects.bulk_create(
+            entries, batch_size=BATCH_SIZE, update_conflicts=True,
+            unique_fields=["kind", "object_id"], update_fields=["body", "referral", "thread"],
+        )
+    if empty:
+        entry_model.objects.filter(kind=kind, object_id__in=empty).delete()
+
+
+def index_object(kind, obj):
+    index_objects(kind, [obj])
+
+
+def unindex(kind, pk):
+    from .models import SearchEntry
+    SearchEntry.objects.filter(kind=kind, object_id=pk).delete()
+
+
+def rebuild(apps=global_apps, kinds=None, stdout=None):
+    """يعيد بناء الفهرس من المصادر على دفعات بترتيب المعرّف. يرجّع {النوع: العدد}."""
+    entry_model = apps.get_model("search", "SearchEntry")
+    counts = {}
+    for kind in kinds or SOURCES:
+        model = apps.get_model(SOURCES[kind][0])
+        entry_model.objects.filter(kind=kind).delete()
+        qs = model.objects.order_by("id")
+        last_id, total = 0, 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                break
+            index_objects(kind, batch, entry_model)
+            last_id, total = batch[-1].id, total + len(batch)
+        counts[kind] = total
+        if stdout:
+            stdout.write(f"{kind}: {total}")
+    optimize()
+    return counts
+
+
+def optimize():
+    """دمج أجزاء فهرس FTS5 بعد التحديثات الكبيرة (لا شيء على Postgres: GIN يُدار تلقائيًا)."""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('optimize')")
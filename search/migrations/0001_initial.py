@@ -0,0 +1,81 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# الفهرس النصي خاص بكل قاعدة بيانات فلا يُعبَّر عنه بحقول Django
+SQLITE_FTS = [
+    # جدول FTS5 بمحتوى خارجي (لا يكرر النص) متزامن مع search_searchentry عبر triggers
+    """CREATE VIRTUAL TABLE search_searchentry_fts USING fts5(
+        body, content='search_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER search_searchentry_ai AFTER INSERT ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    """CREATE TRIGGER search_searchentry_ad AFTER DELETE ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts(search_searchentry_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    """CREATE TRIGGER search_searchentry_au AFTER UPDATE OF body ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts(search_searchentry_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO search_searchentry_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS search_searchentry_au",
+    "DROP TRIGGER IF EXISTS search_searchentry_ad",
+    "DROP TRIGGER IF EXISTS search_searchentry_ai",
+    "DROP TABLE IF EXISTS search_searchentry_fts",
+]
+# النص موحّد مسبقًا (search.index.search_terms) فيكفي إعداد 'simple' بلا تجذيع
+POSTGRES_FTS = [
+    """ALTER TABLE search_searchentry ADD COLUMN body_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED""",
+    "CREATE INDEX search_entry_tsv_gin ON search_searchentry USING gin (body_tsv)",
+]
+POSTGRES_FTS_DROP = [
+    "DROP INDEX IF EXISTS search_entry_tsv_gin",
+    "ALTER TABLE search_searchentry DROP COLUMN IF EXISTS body_tsv",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, ()):
+            schema_editor.execute(sql)
+    return run
+
+
+create_fts = _run({"sqlite": SQLITE_FTS, "postgresql": POSTGRES_FTS})
+drop_fts = _run({"sqlite": SQLITE_FTS_DROP, "postgresql": POSTGRES_FTS_DROP})
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('messaging', '0006_rename_file_names_broadcastjob_blob_ids_and_more'),
+        ('referrals', '0016_referral_has_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('referral', 'إحالة'), ('action', 'إجراء'), ('intake', 'نموذج الموجّه'), ('message', 'رسالة')], max_length=10, verbose_name='النوع')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='معرّف السجل')),
+                ('body', models.TextField(verbose_name='النص الموحّد')),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='تاريخ السجل')),
+                ('referral', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='referrals.referral', verbose_name='الإحالة')),
+                ('thread', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='messaging.thread', verbose_name='المراسلة')),
+            ],
+            options={
+                'verbose_name': 'مدخل بحث',
+                'verbose_name_plural': 'فهرس البحث',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_unique')],
+            },
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
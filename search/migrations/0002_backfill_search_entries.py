@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from search.index import rebuild
+
+
+def backfill(apps, schema_editor):
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('referrals', '0016_referral_has_recommendation'),
+        ('messaging', '0006_rename_file_names_broadcastjob_blob_ids_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
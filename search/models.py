@@ -0,0 +1,36 @@
+# search/models.py
+from django.db import models
+
+
+class SearchEntry(models.Model):
+    """
+    نسخة موحّدة (kingabdulaziz205.arabic) من نص سجل قابل للبحث، مع الإحالة أو
+    المراسلة التي يتبع لها لتصفية النتائج بالصلاحيات.
+
+    الفهرس النصي نفسه خاص بقاعدة البيانات (migrations/0001):
+      SQLite   — جدول FTS5 (search_searchentry_fts) تُزامنه triggers مع هذا الجدول
+      Postgres — عمود tsvector مولَّد (body_tsv) عليه فهرس GIN
+    """
+    KIND_CHOICES = [
+        ("referral", "إحالة"),
+        ("action", "إجراء"),
+        ("intake", "نموذج الموجّه"),
+        ("message", "رسالة"),
+    ]
+
+    kind = models.CharField("النوع", max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField("معرّف السجل")
+    referral = models.ForeignKey("referrals.Referral", verbose_name="الإحالة", on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    thread = models.ForeignKey("messaging.Thread", verbose_name="المراسلة", on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    body = models.TextField("النص الموحّد")
+    created_at = models.DateTimeField("تاريخ السجل", db_index=True)
+
+    class Meta:
+        verbose_name = "مدخل بحث"
+        verbose_name_plural = "فهرس البحث"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="search_entry_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}#{self.object_id}"
@@ -0,0 +1,52 @@
+# search/query.py
+"""
+تنفيذ البحث: الاستعلام يُوحَّد بنفس search_terms المستخدمة في الفهرسة، ثم يُطابق
+بفهرس قاعدة البيانات النصي (FTS5 أو tsvector) كاستعلام فرعي، وتُطبَّق صلاحيات
+المستخدم على الإحالة/المراسلة التابع لها كل مدخل في الاستعلام نفسه.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .index import FTS_TABLE, search_terms
+from .models import SearchEntry
+
+MAX_TERMS = 8
+
+
+def match_expression(q):
+    """تعبير المطابقة لقاعدة البيانات الحالية (كل الكلمات، كبادئات)، أو "" لاستعلام فارغ."""
+    terms = search_terms(q)[:MAX_TERMS]
+    if connection.vendor == "postgresql":
+        return " & ".join(f"{t}:*" for t in terms)
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def matching_ids(expression):
+    if connection.vendor == "postgresql":
+        sql = "SELECT id FROM search_searchentry WHERE body_tsv @@ to_tsquery('simple', %s)"
+    else:
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    return RawSQL(sql, (expression,))
+
+
+def visible_to(qs, caps):
+    """نفس قواعد can_view_referral / can_view_thread لكن كشرط في الاستعلام."""
+    if caps.is_manager:
+        return qs
+    uid = caps.user.id
+    return qs.filter(
+        Q(referral__created_by_id=uid) | Q(referral__assignee_id=uid)
+        | Q(thread__sender_id=uid) | Q(thread__recipient_id=uid)
+    )
+
+
+def search(q, caps, kinds=None, limit=50):
+    """المدخلات المطابقة التي يحق للمستخدم رؤيتها، الأحدث أولًا."""
+    expression = match_expression(q)
+    if not expression:
+        return []
+    qs = SearchEntry.objects.filter(id__in=matching_ids(expression))
+    if kinds:
+        qs = qs.filter(kind__in=kinds)
+    return list(visible_to(qs, caps).order_by("-created_at", "-id")[:limit])
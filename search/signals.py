@@ -0,0 +1,35 @@
+# search/signals.py
+"""
+تحديث فهرس البحث مع كل حفظ/حذف لسجل مصدر. الحفظ الجزئي (update_fields) الذي لا
+يمس الحقول النصية — تغيير الحالة، الأعلام، المكلّف — لا يعيد الفهرسة.
+ما يُنشأ بـ bulk_create (رسائل التعميم، ملاحظات الإنشاء) يُفهرس صراحةً بـ index_objects.
+"""
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from .index import SOURCES, index_object, unindex
+
+
+def _connect(kind):
+    label, fields, _, _ = SOURCES[kind]
+    try:
+        model = apps.get_model(label)
+    except LookupError:
+        # نموذج الموجّه اختياري (HAS_COUNSELOR)
+        return
+    watched = set(fields)
+
+    def saved(sender, instance, update_fields=None, **kwargs):
+        if update_fields is not None and not watched.intersection(update_fields):
+            return
+        index_object(kind, instance)
+
+    def deleted(sender, instance, **kwargs):
+        unindex(kind, instance.pk)
+
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=f"search_index_{kind}")
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=f"search_unindex_{kind}")
+
+
+for _kind in SOURCES:
+    _connect(_kind)
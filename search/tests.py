@@ -0,0 +1,40 @@
+from django.test import TestCase
+
+from accounts.permissions import Capabilities
+from kingabdulaziz205.testing import make_referral, make_user
+from referrals.models import Action
+from .models import SearchEntry
+from .query import search
+
+
+class SearchTests(TestCase):
+    """فهرسة تزايدية بالإشارات، وتوحيد عربي، وتصفية بالصلاحيات."""
+
+    def setUp(self):
+        self.teacher = make_user("teacher", role=None)
+        self.other = make_user("other", role=None)
+        self.ref = make_referral(self.teacher, "أسماء", details="الطالبةُ تأخّرت عن الحصة الأولى")
+
+    def _kinds(self, q, user=None):
+        return [e.kind for e in search(q, Capabilities(user or self.teacher))]
+
+    def test_arabic_variants_match(self):
+        self.assertEqual(self._kinds("اسماء"), ["referral"])
+        self.assertEqual(self._kinds("طالبه تاخرت"), ["referral"])
+        self.assertEqual(self._kinds("حصه غياب"), [])
+
+    def test_actions_indexed_and_filtered_by_permission(self):
+        act = Action.objects.create(referral=self.ref, author=self.teacher, content="التواصل مع وليّ الأمر")
+        self.assertEqual(self._kinds("ولي الامر"), ["action"])
+        self.assertEqual(self._kinds("ولي الامر", self.other), [])
+        act.delete()
+        self.assertEqual(self._kinds("ولي الامر"), [])
+
+    def test_status_only_save_keeps_entry(self):
+        entry = SearchEntry.objects.get(kind="referral", object_id=self.ref.pk)
+        self.ref.status = "CLOSED"
+        self.ref.save(update_fields=["status"])
+        self.assertEqual(SearchEntry.objects.get(kind="referral", object_id=self.ref.pk).body, entry.body)
+        self.ref.details = "تفاصيل مختلفة تمامًا"
+        self.ref.save()
+        self.assertEqual(self._kinds("تاخرت"), [])
@@ -0,0 +1,75 @@
+# search/views.py
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.text import Truncator
+
+from .models import SearchEntry
+from .query import search
+
+RESULTS_LIMIT = 50
+EXCERPT_CHARS = 220
+
+# النوع: (النموذج، العلاقة المحمّلة معه)
+_SOURCES = {
+    "referral": ("referrals.Referral", None),
+    "action": ("referrals.Action", "referral"),
+    "intake": ("referrals.CounselorIntake", "referral"),
+    "message": ("messaging.Message", "thread"),
+}
+
+
+def _row(kind, obj):
+    if kind == "message":
+        thread = obj.thread
+        return {"title": thread.subject, "ref": thread.reference, "text": obj.content,
+                "url": reverse("messaging:detail", args=[thread.pk])}
+    ref = obj if kind == "referral" else obj.referral
+    if kind == "referral":
+        text = obj.details
+    elif kind == "intake":
+        text = "\n".join(t for t in (obj.student_behavior, obj.recommendations) if t)
+    else:
+        text = obj.content
+    return {"title": ref.student_name, "ref": ref.reference, "text": text,
+            "url": reverse("referrals:detail", args=[ref.pk])}
+
+
+def _load_rows(entries):
+    """سجلات المصدر للمدخلات (استعلام واحد لكل نوع) بترتيب النتائج."""
+    ids = defaultdict(list)
+    for e in entries:
+        ids[e.kind].append(e.object_id)
+    objects = {}
+    for kind, pks in ids.items():
+        label, related = _SOURCES[kind]
+        qs = apps.get_model(label).objects.all()
+        if related:
+            qs = qs.select_related(related)
+        objects[kind] = qs.in_bulk(pks)
+    labels = dict(SearchEntry.KIND_CHOICES)
+    rows = []
+    for e in entries:
+        obj = objects[e.kind].get(e.object_id)
+        if obj is None:
+            continue
+        row = _row(e.kind, obj)
+        row.update(kind=labels[e.kind], created_at=e.created_at,
+                   excerpt=Truncator(row.pop("text") or "").chars(EXCERPT_CHARS))
+        rows.append(row)
+    return rows
+
+
+@login_required
+def search_view(request):
+    q = (request.GET.get("q") or "").strip()
+    kind = request.GET.get("kind") or ""
+    kinds = [kind] if kind in dict(SearchEntry.KIND_CHOICES) else None
+    rows = _load_rows(search(q, request.capabilities, kinds, RESULTS_LIMIT)) if q else []
+    return render(request, "search/results.html", {
+        "q": q, "kind": kind, "rows": rows,
+        "kind_choices": SearchEntry.KIND_CHOICES, "limit": RESULTS_LIMIT,
+    })
@@ -1,18 +1,62 @@
 from django.contrib import admin
 
-# أمثلة للتسجيل لاحقًا عند إنشاء النماذج:
-# from .models import TransitionRule, Notification, ReportSnapshot
-#
-# @admin.register(TransitionRule)
-# class TransitionRuleAdmin(admin.ModelAdmin):
-#     list_display = ("from_state", "to_state", "allowed_role", "active")
-#     list_filter = ("allowed_role", "active")
+from .models import (
+    AssignmentCursor, CounselorLoad, GradeRoute, ReportDirtyDay, ReportSnapshot, StatusTransition,
+    TransitionRule,
+)
+
+# مثال للتسجيل لاحقًا عند إنشاء النموذج:
+# from .models import Notification
 #
 # @admin.register(Notification)
 # class NotificationAdmin(admin.ModelAdmin):
 #     list_display = ("target", "channel", "status", "created_at")
 #     list_filter = ("channel", "status")
-#
-# @admin.register(ReportSnapshot)
-# class ReportSnapshotAdmin(admin.ModelAdmin):
-#     list_display = ("period_start", "period_end", "created_at")
+
+
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("period_start", "period_end", "user", "relation", "status", "referral_type", "count", "created_at")
+    list_filter = ("relation", "status", "referral_type")
+    date_hierarchy = "period_start"
+
+
+@admin.register(ReportDirtyDay)
+class ReportDirtyDayAdmin(admin.ModelAdmin):
+    list_display = ("day", "marked_at")
+    readonly_fields = ("day", "marked_at")
+
+
+@admin.register(GradeRoute)
+class GradeRouteAdmin(admin.ModelAdmin):
+    list_display = ("grade", "counselor", "is_active")
+    list_filter = ("grade", "is_active")
+    autocomplete_fields = ("counselor",)
+
+
+@admin.register(CounselorLoad)
+class CounselorLoadAdmin(admin.ModelAdmin):
+    list_display = ("user", "open_count", "updated_at")
+    ordering = ("-open_count",)
+    readonly_fields = ("user", "open_count", "updated_at")
+
+
+@admin.register(AssignmentCursor)
+class AssignmentCursorAdmin(admin.ModelAdmin):
+    list_display = ("key", "last_user_id", "updated_at")
+    readonly_fields = ("key", "last_user_id", "updated_at")
+
+
+@admin.register(TransitionRule)
+class TransitionRuleAdmin(admin.ModelAdmin):
+    list_display = ("action", "from_state", "to_state", "allowed_role", "guard", "active")
+    list_filter = ("action", "allowed_role", "active")
+    list_editable = ("active",)
+
+
+@admin.register(StatusTransition)
+class StatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ("referral", "action", "from_state", "to_state", "actor", "created_at")
+    list_filter = ("action", "to_state")
+    list_select_related = ("referral", "actor")
+    readonly_fields = ("referral", "action", "from_state", "to_state", "rule", "actor", "created_at")
@@ -0,0 +1,177 @@
+# workflow/assignment.py
+"""
+التوزيع التلقائي للإحالات التي لم يُختر لها مكلّف.
+
+الاستراتيجيات (REFERRAL_ASSIGNMENT_STRATEGY):
+  round_robin — بالتناوب على الموجّهين (مؤشر واحد في AssignmentCursor)
+  least_load  — الموجّه الأقل إحالات مفتوحة (CounselorLoad المُحدَّث تزايديًا)
+  grade       — موجّهو الصف من GradeRoute بالتناوب، وإلا least_load
+
+كل قرار يقرأ/يكتب صفًا واحدًا من جداول الحالة الصغيرة (O(1)) بدل الاستعلام عن
+الإحالات. الحالة مجرّدة في "مخزن" (DbState للتشغيل، MemoryState للمحاكاة)
+فيمكن إعادة تشغيل الإحالات التاريخية على أي استراتيجية (simulate_assignment).
+"""
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from accounts.directory import active_users
+from accounts.permissions import ROLE_COUNSELOR
+from kingabdulaziz205.caching import get_or_compute, invalidate
+from .models import AssignmentCursor, CounselorLoad, GradeRoute
+
+DEFAULT_STRATEGY = "least_load"
+ROUTES_NAMESPACE = "workflow:grade_routes"
+
+
+# ——— مخازن الحالة ———
+class DbState:
+    """الحالة في قاعدة البيانات؛ يُستدعى داخل المعاملة التي تنشئ الإحالة."""
+
+    def cursor(self, key):
+        row, _ = AssignmentCursor.objects.select_for_update().get_or_create(key=key)
+        return row.last_user_id
+
+    def set_cursor(self, key, user_id):
+        AssignmentCursor.objects.filter(key=key).update(last_user_id=user_id)
+
+    def least_loaded(self, user_ids):
+        """
+        الأقل حملًا بعد قفل صفوف المجموعة حتى نهاية المعاملة: القفل يعيد القيم الملتزمة
+        الأحدث، وحفظ الإحالة في المعاملة نفسها يزيد عدّاد المختار قبل أن يقرأه إنشاء
+        متزامن. الترتيب الثابت للقفل (user_id) يمنع الجمود المتبادل.
+        """
+        ensure_loads(user_ids)
+        loads = dict(
+            CounselorLoad.objects.select_for_update().filter(user_id__in=user_ids)
+            .order_by("user_id").values_list("user_id", "open_count")
+        )
+        return min(loads, key=lambda uid: (loads[uid], uid))
+
+    def grade_pool(self, grade):
+        return grade_routes().get(grade, [])
+
+    def assigned(self, user_id):
+        # CounselorLoad يُحدَّث عند حفظ الإحالة (signals.py)
+        pass
+
+
+class MemoryState:
+    """حالة في الذاكرة لمحاكاة الاستراتيجيات على إحالات تاريخية."""
+
+    def __init__(self, routes=None):
+        self.cursors = {}
+        self.loads = {}
+        self.routes = routes or {}
+
+    def cursor(self, key):
+        return self.cursors.get(key)
+
+    def set_cursor(self, key, user_id):
+        self.cursors[key] = user_id
+
+    def least_loaded(self, user_ids):
+        return min(user_ids, key=lambda uid: (self.loads.get(uid, 0), uid))
+
+    def grade_pool(self, grade):
+        return self.routes.get(grade, [])
+
+    def assigned(self, user_id):
+        self.loads[user_id] = self.loads.get(user_id, 0) + 1
+
+    def closed(self, user_id):
+        self.loads[user_id] = max(self.loads.get(user_id, 0) - 1, 0)
+
+
+# ——— الاستراتيجيات ———
+def _next_after(pool, last_id):
+    """التالي بعد last_id في قائمة معرّفات مرتبة (دائريًا)."""
+    for uid in pool:
+        if last_id is None or uid > last_id:
+            return uid
+    return pool[0]
+
+
+def round_robin(state, pool, grade, key="all"):
+    choice = _next_after(pool, state.cursor(key))
+    state.set_cursor(key, choice)
+    return choice
+
+
+def least_load(state, pool, grade):
+    return state.least_loaded(pool)
+
+
+def by_grade(state, pool, grade):
+    active = set(pool)
+    routed = [uid for uid in state.grade_pool(grade) if uid in active]
+    if routed:
+        return round_robin(state, routed, grade, key=f"grade:{grade}")
+    return least_load(state, pool, grade)
+
+
+STRATEGIES = {
+    "round_robin": round_robin,
+    "least_load": least_load,
+    "grade": by_grade,
+}
+
+
+def counselor_pool():
+    """معرّفات الموجّهين النشطين مرتبة (من دليل المستخدمين المخزّن)."""
+    return sorted(e.id for e in active_users() if e.role == ROLE_COUNSELOR)
+
+
+def pick(state, strategy, pool, grade):
+    if not pool:
+        return None
+    choice = STRATEGIES[strategy](state, pool, grade)
+    state.assigned(choice)
+    return choice
+
+
+def choose_assignee(grade, strategy=None):
+    """
+    يختار مكلّفًا لإحالة جديدة من الصف grade ويرجّع معرّفه (أو None إن لا موجّه).
+    يُستدعى داخل transaction.atomic() قبل إنشاء الإحالة.
+    """
+    strategy = strategy or getattr(settings, "REFERRAL_ASSIGNMENT_STRATEGY", DEFAULT_STRATEGY)
+    return pick(DbState(), strategy, counselor_pool(), grade)
+
+
+# ——— عدّاد الحمل ———
+def recount_load(user_id):
+    from referrals.models import Referral
+    n = Referral.objects.filter(assignee_id=user_id).exclude(status="CLOSED").count()
+    CounselorLoad.objects.update_or_create(user_id=user_id, defaults={"open_count": n})
+
+
+def ensure_loads(user_ids):
+    """ينشئ (بالعدّ من الصفر) صفوف الحمل المفقودة لمستخدمين لم يُكلَّفوا بعد."""
+    have = set(CounselorLoad.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+    for uid in set(user_ids) - have:
+        recount_load(uid)
+
+
+def bump_load(user_id, delta):
+    updated = CounselorLoad.objects.filter(user_id=user_id).update(
+        open_count=Greatest(F("open_count") + delta, 0)
+    )
+    if not updated:
+        # لا صف بعد: العدّ من الصفر يشمل التغيير الحالي
+        recount_load(user_id)
+
+
+# ——— توجيه الصفوف (مخزّن) ———
+def grade_routes():
+    """{الصف: [معرّفات الموجّهين مرتبة]} للتوجيهات المفعّلة."""
+    def build():
+        routes = {}
+        for grade, uid in GradeRoute.objects.filter(is_active=True).values_list("grade", "counselor_id"):
+            routes.setdefault(grade, []).append(uid)
+        return {g: sorted(ids) for g, ids in routes.items()}
+    return get_or_compute(ROUTES_NAMESPACE, ("active",), build, 60 * 60)
+
+
+def invalidate_routes():
+    invalidate(ROUTES_NAMESPACE)
@@ -0,0 +1,19 @@
+# workflow/management/commands/rollup_report_snapshots.py
+from django.core.management.base import BaseCommand
+
+from workflow.reports import days_to_rollup, rollup_days
+
+class Command(BaseCommand):
+    help = "تجميع أعداد الإحالات اليومية في ReportSnapshot (تزايديًا: الأيام الجديدة والمتغيّرة فقط)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="إعادة بناء كل الأيام من البداية")
+        parser.add_argument("--chunk-days", type=int, default=31, help="عدد الأيام في كل دفعة")
+
+    def handle(self, *args, **options):
+        days = days_to_rollup(full=options["full"])
+        chunk = max(1, options["chunk_days"])
+        inserted = 0
+        for i in range(0, len(days), chunk):
+            inserted += rollup_days(days[i:i + chunk])
+        self.stdout.write(self.style.SUCCESS(f"تم تجميع {len(days)} يوم ({inserted} صف)."))
@@ -0,0 +1,89 @@
+# workflow/management/commands/simulate_assignment.py
+import heapq
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from referrals.models import Referral
+from workflow.assignment import STRATEGIES, MemoryState, counselor_pool, grade_routes
+
+
+def _legacy_first(state, pool, grade):
+    # السلوك السابق: أول موجّه دائمًا
+    return pool[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "يعيد تشغيل الإحالات التاريخية (بترتيب إنشائها، مع إغلاقها في وقت آخر تحديث) "
+        "على استراتيجيات التوزيع في الذاكرة ويقارن توازن الحمل وزمن القرار. لا يكتب شيئًا."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strategies", nargs="+", default=["legacy_first", *STRATEGIES],
+                            help="الاستراتيجيات المطلوب مقارنتها.")
+        parser.add_argument("--counselors", nargs="+", type=int,
+                            help="معرّفات الموجّهين (افتراضيًا: الموجّهون النشطون، وإلا المكلّفون تاريخيًا).")
+        parser.add_argument("--limit", type=int, default=0, help="آخر N إحالة فقط (0 = الكل).")
+
+    def handle(self, *args, **opts):
+        strategies = dict(STRATEGIES, legacy_first=_legacy_first)
+        unknown = set(opts["strategies"]) - set(strategies)
+        if unknown:
+            raise CommandError(f"استراتيجيات غير معروفة: {', '.join(sorted(unknown))}")
+
+        qs = Referral.objects.order_by("created_at", "id")
+        if opts["limit"]:
+            ids = list(Referral.objects.order_by("-created_at", "-id").values_list("id", flat=True)[: opts["limit"]])
+            qs = qs.filter(id__in=ids)
+        history = list(qs.values_list("id", "grade", "created_at", "status", "updated_at", "assignee_id"))
+        if not history:
+            self.stdout.write("لا توجد إحالات لإعادة تشغيلها.")
+            return
+
+        pool = sorted(opts["counselors"] or counselor_pool() or {h[5] for h in history if h[5]})
+        if not pool:
+            raise CommandError("لا يوجد موجّهون للمحاكاة (حدّد --counselors).")
+        routes = grade_routes()
+        self.stdout.write(f"إعادة تشغيل {len(history)} إحالة على {len(pool)} موجّه.\n")
+
+        header = f"{'الاستراتيجية':<14} {'أقصى/أدنى توزيع':>16} {'الانحراف':>9} {'ذروة مفتوحة':>11} {'متوسط حمل المختار':>18} {'µs/قرار':>8}"
+        self.stdout.write(header)
+        for name in opts["strategies"]:
+            self.stdout.write(self._row(name, self._replay(strategies[name], history, pool, routes)))
+
+    def _replay(self, strategy, history, pool, routes):
+        state = MemoryState(routes)
+        assigned = {uid: 0 for uid in pool}
+        closes = []  # (وقت الإغلاق، المكلّف)
+        peak = 0
+        chosen_loads = []
+        elapsed = 0.0
+        for rid, grade, created_at, status, updated_at, _ in history:
+            while closes and closes[0][0] <= created_at:
+                _, uid = heapq.heappop(closes)
+                state.closed(uid)
+            t0 = time.perf_counter()
+            uid = strategy(state, pool, grade)
+            elapsed += time.perf_counter() - t0
+            chosen_loads.append(state.loads.get(uid, 0))
+            state.assigned(uid)
+            assigned[uid] += 1
+            peak = max(peak, state.loads[uid])
+            if status == "CLOSED":
+                heapq.heappush(closes, (updated_at, uid))
+        counts = list(assigned.values())
+        return {
+            "max": max(counts), "min": min(counts),
+            "stdev": statistics.pstdev(counts),
+            "peak": peak,
+            "avg_load": statistics.mean(chosen_loads),
+            "us": elapsed / len(history) * 1e6,
+        }
+
+    def _row(self, name, m):
+        return (
+            f"{name:<14} {m['max']:>8}/{m['min']:<7} {m['stdev']:>9.2f} {m['peak']:>11} "
+            f"{m['avg_load']:>18.2f} {m['us']:>8.1f}"
+        )
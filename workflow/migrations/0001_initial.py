@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(db_index=True, verbose_name='بداية الفترة')),
+                ('period_end', models.DateField(verbose_name='نهاية الفترة')),
+                ('relation', models.CharField(choices=[('sent', 'أرسلها'), ('inbox', 'واردة إليه'), ('both', 'أرسلها لنفسه')], max_length=5, verbose_name='العلاقة')),
+                ('status', models.CharField(max_length=20, verbose_name='الحالة')),
+                ('referral_type', models.CharField(max_length=20, verbose_name='نوع الإحالة')),
+                ('grade', models.CharField(max_length=2, verbose_name='الصف')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='العدد')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='أُنشئت في')),
+                ('assignee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='المكلّف')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'لقطة تقرير',
+                'verbose_name_plural': 'لقطات التقارير',
+                'ordering': ['-period_start'],
+                'indexes': [models.Index(fields=['user', 'period_start'], name='snapshot_user_period_idx')],
+            },
+        ),
+    ]
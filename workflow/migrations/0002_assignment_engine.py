@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_loads(apps, schema_editor):
+    Referral = apps.get_model("referrals", "Referral")
+    CounselorLoad = apps.get_model("workflow", "CounselorLoad")
+    rows = (
+        Referral.objects.exclude(status="CLOSED").filter(assignee__isnull=False)
+        .values("assignee").annotate(n=models.Count("id")).order_by()
+    )
+    CounselorLoad.objects.bulk_create(
+        [CounselorLoad(user_id=r["assignee"], open_count=r["n"]) for r in rows], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0001_initial'),
+        ('referrals', '0015_actionattachment_blob_attachment_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True, verbose_name='المجموعة')),
+                ('last_user_id', models.BigIntegerField(blank=True, null=True, verbose_name='آخر مكلّف')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+            ],
+            options={
+                'verbose_name': 'مؤشر توزيع',
+                'verbose_name_plural': 'مؤشرات التوزيع',
+            },
+        ),
+        migrations.CreateModel(
+            name='CounselorLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_count', models.PositiveIntegerField(default=0, verbose_name='الإحالات المفتوحة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='referral_load', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'حمل مكلّف',
+                'verbose_name_plural': 'أحمال المكلّفين',
+                'indexes': [models.Index(fields=['open_count', 'user'], name='load_open_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GradeRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.CharField(db_index=True, max_length=2, verbose_name='الصف')),
+                ('is_active', models.BooleanField(default=True, verbose_name='مفعل')),
+                ('counselor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_routes', to=settings.AUTH_USER_MODEL, verbose_name='الموجّه')),
+            ],
+            options={
+                'verbose_name': 'توجيه صف',
+                'verbose_name_plural': 'توجيه الصفوف',
+                'ordering': ['grade', 'counselor_id'],
+                'constraints': [models.UniqueConstraint(fields=('grade', 'counselor'), name='grade_route_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_loads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# القواعد المطابقة للانتقالات التي كانت مكتوبة في views.py
+DEFAULT_RULES = [
+    ("create", "NEW", "UNDER_REVIEW", ""),
+    ("assign", "NEW", "UNDER_REVIEW", ""),
+    ("reply", "NEW", "UNDER_REVIEW", ""),
+    ("close", "NEW", "CLOSED", "has_outcome"),
+    ("close", "UNDER_REVIEW", "CLOSED", "has_outcome"),
+    ("close", "SENT_TO_DEPUTY", "CLOSED", "has_outcome"),
+]
+
+
+def seed_rules(apps, schema_editor):
+    TransitionRule = apps.get_model("workflow", "TransitionRule")
+    TransitionRule.objects.bulk_create([
+        TransitionRule(action=action, from_state=src, to_state=dst, guard=guard)
+        for action, src, dst, guard in DEFAULT_RULES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('referrals', '0016_referral_has_recommendation'),
+        ('workflow', '0002_assignment_engine'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransitionRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', 'إنشاء'), ('assign', 'تحويل'), ('reply', 'رد'), ('close', 'إغلاق')], max_length=10, verbose_name='الإجراء')),
+                ('from_state', models.CharField(max_length=20, verbose_name='الحالة من')),
+                ('to_state', models.CharField(max_length=20, verbose_name='الحالة إلى')),
+                ('allowed_role', models.CharField(blank=True, max_length=50, verbose_name='الدور المسموح')),
+                ('guard', models.CharField(blank=True, choices=[('', 'بدون شرط'), ('has_reply', 'وضع رد'), ('has_outcome', 'وضع رد أو توصية'), ('has_assignee', 'تحديد مكلّف')], max_length=20, verbose_name='الشرط')),
+                ('active', models.BooleanField(default=True, verbose_name='مفعلة')),
+            ],
+            options={
+                'verbose_name': 'قاعدة انتقال',
+                'verbose_name_plural': 'قواعد الانتقال',
+                'ordering': ['action', 'from_state', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('action', 'from_state', 'allowed_role'), name='transition_rule_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', 'إنشاء'), ('assign', 'تحويل'), ('reply', 'رد'), ('close', 'إغلاق')], max_length=10, verbose_name='الإجراء')),
+                ('from_state', models.CharField(max_length=20, verbose_name='الحالة من')),
+                ('to_state', models.CharField(max_length=20, verbose_name='الحالة إلى')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت الانتقال')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='المنفّذ')),
+                ('referral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='referrals.referral', verbose_name='الإحالة')),
+                ('rule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workflow.transitionrule', verbose_name='القاعدة')),
+            ],
+            options={
+                'verbose_name': 'انتقال حالة',
+                'verbose_name_plural': 'سجل انتقالات الحالة',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['referral', 'created_at'], name='transition_referral_idx')],
+            },
+        ),
+        migrations.RunPython(seed_rules, migrations.RunPython.noop),
+    ]
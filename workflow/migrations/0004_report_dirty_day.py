@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0003_transition_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='اليوم')),
+                ('marked_at', models.DateTimeField(verbose_name='وقت التسجيل')),
+            ],
+            options={
+                'verbose_name': 'يوم بحاجة لإعادة تجميع',
+                'verbose_name_plural': 'أيام بحاجة لإعادة تجميع',
+                'ordering': ['day'],
+            },
+        ),
+    ]
@@ -1,3 +1,168 @@
+from django.contrib.auth.models import User
 from django.db import models
 
-# Create your models here.
+
+class ReportSnapshot(models.Model):
+    """
+    تجميع يومي مُسبق لأعداد الإحالات لكل مستخدم، يملؤه الأمر rollup_report_snapshots.
+    كل صف = عدد إحالات يوم واحد لمستخدم واحد بحسب علاقته بها (مرسل/مكلّف)
+    والحالة والنوع والصف والمكلّف، فتُقرأ التقارير بكلفة O(الأيام) لا O(الإحالات).
+    """
+    RELATION_CHOICES = [
+        ("sent", "أرسلها"),
+        ("inbox", "واردة إليه"),
+        ("both", "أرسلها لنفسه"),
+    ]
+
+    period_start = models.DateField("بداية الفترة", db_index=True)
+    period_end = models.DateField("نهاية الفترة")
+    user = models.ForeignKey(User, verbose_name="المستخدم", on_delete=models.CASCADE, related_name="report_snapshots")
+    relation = models.CharField("العلاقة", max_length=5, choices=RELATION_CHOICES)
+    status = models.CharField("الحالة", max_length=20)
+    referral_type = models.CharField("نوع الإحالة", max_length=20)
+    grade = models.CharField("الصف", max_length=2)
+    assignee = models.ForeignKey(User, verbose_name="المكلّف", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    count = models.PositiveIntegerField("العدد", default=0)
+    created_at = models.DateTimeField("أُنشئت في", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "لقطة تقرير"
+        verbose_name_plural = "لقطات التقارير"
+        ordering = ["-period_start"]
+        indexes = [
+            models.Index(fields=["user", "period_start"], name="snapshot_user_period_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.period_start} - {self.user_id} - {self.status}"
+
+
+class ReportDirtyDay(models.Model):
+    """
+    يوم سابق تغيّر ما تعدّه لقطاته بعد تجميعها (إغلاق أو تحويل أو حذف إحالة منه):
+    build_report يقرؤه حيًّا بدل لقطاته، ويعيد rollup_report_snapshots تجميعه ثم يمسحه.
+    """
+    day = models.DateField("اليوم", unique=True)
+    marked_at = models.DateTimeField("وقت التسجيل")
+
+    class Meta:
+        verbose_name = "يوم بحاجة لإعادة تجميع"
+        verbose_name_plural = "أيام بحاجة لإعادة تجميع"
+        ordering = ["day"]
+
+    def __str__(self):
+        return str(self.day)
+
+
+# ——— التوزيع التلقائي للإحالات على الموجّهين (assignment.py) ———
+class AssignmentCursor(models.Model):
+    """آخر مستخدم اختير في دورة round-robin لمجموعة معيّنة (الكل أو صف دراسي)."""
+    key = models.CharField("المجموعة", max_length=40, unique=True)
+    last_user_id = models.BigIntegerField("آخر مكلّف", null=True, blank=True)
+    updated_at = models.DateTimeField("آخر تحديث", auto_now=True)
+
+    class Meta:
+        verbose_name = "مؤشر توزيع"
+        verbose_name_plural = "مؤشرات التوزيع"
+
+    def __str__(self):
+        return f"{self.key} → {self.last_user_id}"
+
+
+class CounselorLoad(models.Model):
+    """
+    عدد الإحالات المفتوحة (غير المغلقة) المكلّف بها كل مستخدم، يُحدَّث تزايديًا
+    مع كل تغيير في المكلّف أو الحالة (signals.py) فيُقرأ الأقل حملًا بفهرس واحد.
+    """
+    user = models.OneToOneField(User, verbose_name="المستخدم", on_delete=models.CASCADE, related_name="referral_load")
+    open_count = models.PositiveIntegerField("الإحالات المفتوحة", default=0)
+    updated_at = models.DateTimeField("آخر تحديث", auto_now=True)
+
+    class Meta:
+        verbose_name = "حمل مكلّف"
+        verbose_name_plural = "أحمال المكلّفين"
+        indexes = [
+            models.Index(fields=["open_count", "user"], name="load_open_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.open_count}"
+
+
+class GradeRoute(models.Model):
+    """توجيه إحالات صف دراسي إلى موجّه/موجّهين محددين (بالتناوب بينهم)."""
+    grade = models.CharField("الصف", max_length=2, db_index=True)
+    counselor = models.ForeignKey(User, verbose_name="الموجّه", on_delete=models.CASCADE, related_name="grade_routes")
+    is_active = models.BooleanField("مفعل", default=True)
+
+    class Meta:
+        verbose_name = "توجيه صف"
+        verbose_name_plural = "توجيه الصفوف"
+        ordering = ["grade", "counselor_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["grade", "counselor"], name="grade_route_unique"),
+        ]
+
+    def __str__(self):
+        return f"الصف {self.grade} → {self.counselor_id}"
+
+
+# ——— آلة حالات الإحالة (transitions.py) ———
+class TransitionRule(models.Model):
+    """
+    قاعدة انتقال: عند تنفيذ "الإجراء" على إحالة في "الحالة من" تنتقل إلى "الحالة إلى"،
+    إن كان دور المنفّذ مسموحًا (فارغ = كل من يملك صلاحية الإجراء) وتحقق الشرط.
+    الشروط تُقرأ من أعلام الإحالة (has_reply، has_recommendation، المكلّف) دون استعلامات.
+    """
+    ACTION_CHOICES = [
+        ("create", "إنشاء"),
+        ("assign", "تحويل"),
+        ("reply", "رد"),
+        ("close", "إغلاق"),
+    ]
+    GUARD_CHOICES = [
+        ("", "بدون شرط"),
+        ("has_reply", "وضع رد"),
+        ("has_outcome", "وضع رد أو توصية"),
+        ("has_assignee", "تحديد مكلّف"),
+    ]
+
+    action = models.CharField("الإجراء", max_length=10, choices=ACTION_CHOICES)
+    from_state = models.CharField("الحالة من", max_length=20)
+    to_state = models.CharField("الحالة إلى", max_length=20)
+    allowed_role = models.CharField("الدور المسموح", max_length=50, blank=True)
+    guard = models.CharField("الشرط", max_length=20, choices=GUARD_CHOICES, blank=True)
+    active = models.BooleanField("مفعلة", default=True)
+
+    class Meta:
+        verbose_name = "قاعدة انتقال"
+        verbose_name_plural = "قواعد الانتقال"
+        ordering = ["action", "from_state", "id"]
+        constraints = [
+            models.UniqueConstraint(fields=["action", "from_state", "allowed_role"], name="transition_rule_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()}: {self.from_state} → {self.to_state}"
+
+
+class StatusTransition(models.Model):
+    """سجل كل انتقال حالة نُفّذ على إحالة."""
+    referral = models.ForeignKey("referrals.Referral", verbose_name="الإحالة", on_delete=models.CASCADE, related_name="transitions")
+    action = models.CharField("الإجراء", max_length=10, choices=TransitionRule.ACTION_CHOICES)
+    from_state = models.CharField("الحالة من", max_length=20)
+    to_state = models.CharField("الحالة إلى", max_length=20)
+    rule = models.ForeignKey(TransitionRule, verbose_name="القاعدة", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    actor = models.ForeignKey(User, verbose_name="المنفّذ", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at = models.DateTimeField("وقت الانتقال", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "انتقال حالة"
+        verbose_name_plural = "سجل انتقالات الحالة"
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["referral", "created_at"], name="transition_referral_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.referral_id}: {self.from_state} → {self.to_state}"
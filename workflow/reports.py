@@ -0,0 +1,178 @@
+# workflow/reports.py
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from kingabdulaziz205.caching import get_or_compute, invalidate
+from referrals.models import Referral
+from .models import ReportDirtyDay, ReportSnapshot
+
+DIMENSIONS = ("status", "referral_type", "grade", "assignee")
+CACHE_NAMESPACE = "workflow:reports"
+CACHE_TIMEOUT = 10 * 60
+
+
+def invalidate_reports():
+    invalidate(CACHE_NAMESPACE)
+
+
+def day_start(day):
+    """بداية اليوم المحلي (Asia/Riyadh) كتوقيت واعٍ."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def rolled_until():
+    """آخر يوم مُجمَّع في اللقطات (أو None إن لم تُبنَ بعد)."""
+    return ReportSnapshot.objects.aggregate(d=Max("period_end"))["d"]
+
+
+# ——— بناء اللقطات ———
+def rollup_days(days):
+    """
+    يعيد بناء لقطات الأيام المعطاة (حذف ثم إدراج مجمّع) ويمسح ما سُجّل منها في
+    ReportDirtyDay قبل البدء. يرجّع عدد الصفوف المُدرجة.
+    """
+    days = sorted(set(days))
+    if not days:
+        return 0
+    started = timezone.now()
+    rows = (
+        Referral.objects.filter(created_at__gte=day_start(days[0]), created_at__lt=day_start(days[-1] + timedelta(days=1)))
+        .annotate(day=TruncDate("created_at"))
+        .filter(day__in=days)
+        .values("day", "created_by", "assignee", "status", "referral_type", "grade")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+    counts = Counter()
+    for r in rows:
+        dims = (r["status"], r["referral_type"], r["grade"], r["assignee"])
+        if r["created_by"] == r["assignee"]:
+            counts[(r["day"], r["created_by"], "both", *dims)] += r["n"]
+            continue
+        counts[(r["day"], r["created_by"], "sent", *dims)] += r["n"]
+        if r["assignee"]:
+            counts[(r["day"], r["assignee"], "inbox", *dims)] += r["n"]
+
+    objs = [
+        ReportSnapshot(
+            period_start=day, period_end=day, user_id=user_id, relation=relation,
+            status=status, referral_type=rtype, grade=grade, assignee_id=assignee_id, count=n,
+        )
+        for (day, user_id, relation, status, rtype, grade, assignee_id), n in counts.items()
+    ]
+    with transaction.atomic():
+        ReportSnapshot.objects.filter(period_start__in=days).delete()
+        ReportSnapshot.objects.bulk_create(objs, batch_size=1000)
+        # ما سُجّل أثناء التجميع قد لا يظهر فيه: يبقى للتشغيل التالي
+        ReportDirtyDay.objects.filter(day__in=days, marked_at__lte=started).delete()
+    invalidate_reports()
+    return len(objs)
+
+
+def mark_dirty_days(*moments):
+    """
+    يسجّل أيام اللحظات المعطاة (created_at) التي تغيّرت إحالاتها: تُقرأ حيّة في
+    build_report حتى يعيد التشغيل التالي لـ rollup_report_snapshots تجميعها (وهو
+    الذي يلتقط الإحالة المحذوفة، إذ لا تبقى لها updated_at). اليوم وما بعده يُقرأ
+    حيًّا أصلًا فلا يكلّف أي استعلام.
+    """
+    today = timezone.localdate()
+    days = {d for d in (timezone.localdate(m) for m in moments if m) if d < today}
+    if days:
+        now = timezone.now()
+        ReportDirtyDay.objects.bulk_create(
+            [ReportDirtyDay(day=d, marked_at=now) for d in days],
+            update_conflicts=True, unique_fields=["day"], update_fields=["marked_at"],
+        )
+    return len(days)
+
+
+def days_to_rollup(full=False, until=None):
+    """
+    الأيام التي تحتاج إعادة تجميع حتى اليوم `until` (افتراضيًا: أمس):
+    كل الأيام عند full أو أول تشغيل، وإلا الأيام الجديدة بعد آخر يوم مُجمَّع
+    مع أيام الإحالات التي تغيّرت (updated_at) منذ آخر تجميع، ومع الأيام المسجّلة
+    في ReportDirtyDay (حذف إحالة) في الحالتين.
+    """
+    until = until or (timezone.localdate() - timedelta(days=1))
+    days_qs = Referral.objects.annotate(day=TruncDate("created_at")).filter(day__lte=until)
+    last_roll = ReportSnapshot.objects.aggregate(t=Max("created_at"))["t"]
+    if not full and last_roll:
+        days_qs = days_qs.filter(Q(day__gt=rolled_until()) | Q(updated_at__gte=last_roll))
+    days = set(days_qs.values_list("day", flat=True).order_by().distinct())
+    days.update(ReportDirtyDay.objects.filter(day__lte=until).values_list("day", flat=True))
+    return sorted(days)
+
+
+# ——— قراءة التقرير ———
+def build_report(user, d_from=None, d_to=None):
+    """
+    يجمع إجماليات وتوزيعات تقرير المستخدم: الأيام المُجمَّعة تُقرأ من ReportSnapshot
+    والأيام التي بعدها (اليوم عادةً) من Referral مباشرةً، ثم يُدمج الجزآن. الأيام
+    المُجمَّعة المسجّلة في ReportDirtyDay (تغيّرت إحالاتها بعد تجميعها) تُقرأ حيّة
+    أيضًا حتى يعيد rollup_report_snapshots تجميعها.
+    """
+    # بداية "آخر 30 يومًا" لحظة واحدة (بداية يومها المحلي) للجزأين الحي والمُجمَّع
+    last_30_start = day_start(timezone.localdate() - timedelta(days=30))
+    cutoff = rolled_until()
+    dirty = list(ReportDirtyDay.objects.filter(day__lte=cutoff).values_list("day", flat=True)) if cutoff else []
+
+    live_qs = Referral.objects.filter(Q(created_by=user) | Q(assignee=user))
+    if d_from:
+        live_qs = live_qs.filter(created_at__gte=day_start(d_from))
+    if d_to:
+        live_qs = live_qs.filter(created_at__lt=day_start(d_to + timedelta(days=1)))
+    if cutoff:
+        live_days = Q(created_at__gte=day_start(cutoff + timedelta(days=1)))
+        for day in dirty:
+            live_days |= Q(created_at__gte=day_start(day), created_at__lt=day_start(day + timedelta(days=1)))
+        live_qs = live_qs.filter(live_days)
+
+    totals = live_qs.aggregate(
+        all=Count("id"),
+        open=Count("id", filter=~Q(status="CLOSED")),
+        closed=Count("id", filter=Q(status="CLOSED")),
+        sent=Count("id", filter=Q(created_by=user)),
+        inbox=Count("id", filter=Q(assignee=user)),
+        last_30=Count("id", filter=Q(created_at__gte=last_30_start)),
+    )
+    breakdowns = {
+        dim: Counter(dict(live_qs.values_list(dim).annotate(n=Count("id")).order_by()))
+        for dim in DIMENSIONS
+    }
+
+    if cutoff:
+        snap_qs = ReportSnapshot.objects.filter(user=user, period_start__lte=cutoff).exclude(period_start__in=dirty)
+        if d_from:
+            snap_qs = snap_qs.filter(period_start__gte=d_from)
+        if d_to:
+            snap_qs = snap_qs.filter(period_start__lte=d_to)
+        snap_totals = snap_qs.aggregate(
+            all=Sum("count"),
+            open=Sum("count", filter=~Q(status="CLOSED")),
+            closed=Sum("count", filter=Q(status="CLOSED")),
+            sent=Sum("count", filter=Q(relation__in=["sent", "both"])),
+            inbox=Sum("count", filter=Q(relation__in=["inbox", "both"])),
+            last_30=Sum("count", filter=Q(period_start__gte=timezone.localdate(last_30_start))),
+        )
+        for k, v in snap_totals.items():
+            totals[k] += v or 0
+        for dim in DIMENSIONS:
+            breakdowns[dim].update(dict(snap_qs.values_list(dim).annotate(n=Sum("count")).order_by()))
+
+    return totals, breakdowns
+
+
+def cached_report(user, d_from=None, d_to=None):
+    """build_report عبر الكاش؛ يُبطَل عند تغيّر أي إحالة أو إعادة تجميع اللقطات."""
+    # اليوم جزء من المفتاح: "آخر 30 يومًا" تتحرك معه
+    return get_or_compute(
+        CACHE_NAMESPACE, (user.pk, d_from, d_to, timezone.localdate()),
+        lambda: build_report(user, d_from, d_to), CACHE_TIMEOUT,
+    )
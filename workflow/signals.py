@@ -0,0 +1,82 @@
+# workflow/signals.py
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from referrals.models import Referral
+from .assignment import bump_load, invalidate_routes
+from .models import GradeRoute, TransitionRule
+from .reports import invalidate_reports, mark_dirty_days
+from .transitions import invalidate_rules
+
+
+def _open_slot(instance):
+    """(المكلّف، مفتوحة؟) من الحقول المحمّلة فقط — لا يستدعي تحميل حقول مؤجلة."""
+    d = instance.__dict__
+    return d.get("assignee_id"), d.get("status") not in (None, "CLOSED")
+
+
+# حقول الإحالة التي تدخل في لقطات التقارير (ReportSnapshot)
+REPORT_FIELDS = ("status", "referral_type", "grade", "assignee_id", "created_by_id")
+
+
+def _report_dims(instance):
+    d = instance.__dict__
+    return tuple(d.get(f) for f in REPORT_FIELDS)
+
+
+@receiver(post_init, sender=Referral)
+def _remember_open_slot(sender, instance, **kwargs):
+    instance._open_slot = _open_slot(instance) if instance.pk else (None, False)
+    instance._created_at = instance.__dict__.get("created_at")
+    instance._report_dims = _report_dims(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Referral)
+def _referral_saved(sender, instance, **kwargs):
+    invalidate_reports()
+    # تغيّر ما تعدّه اللقطات في إحالة يوم سابق (إغلاق، تحويل...) يُسجّل يومها فيقرؤه
+    # التقرير حيًّا حتى إعادة التجميع؛ وكذلك اليوم القديم إن نُقلت الإحالة عنه.
+    # الحفظ الذي لا يمسّها (is_opened_by_assignee مثلًا) لا يكتب شيئًا
+    created_at = instance.__dict__.get("created_at")
+    old_created_at = getattr(instance, "_created_at", None)
+    dims, old_dims = _report_dims(instance), getattr(instance, "_report_dims", None)
+    dirty = []
+    if old_created_at and created_at and old_created_at != created_at:
+        dirty.append(old_created_at)
+    if old_dims is not None and dims != old_dims:
+        dirty.append(created_at)
+    if dirty:
+        mark_dirty_days(*dirty)
+    instance._created_at = created_at
+    instance._report_dims = dims
+    # عدّاد الإحالات المفتوحة لكل مكلّف (CounselorLoad) يتغير فقط عند تغيّر المكلّف أو الإغلاق
+    old, new = getattr(instance, "_open_slot", (None, False)), _open_slot(instance)
+    if old != new:
+        old_uid, old_open = old
+        new_uid, new_open = new
+        if old_uid and old_open:
+            bump_load(old_uid, -1)
+        if new_uid and new_open:
+            bump_load(new_uid, +1)
+    instance._open_slot = new
+
+
+@receiver(post_delete, sender=Referral)
+def _referral_deleted(sender, instance, **kwargs):
+    invalidate_reports()
+    mark_dirty_days(instance.__dict__.get("created_at"))
+    uid, is_open = getattr(instance, "_open_slot", (None, False))
+    if uid and is_open:
+        bump_load(uid, -1)
+
+
+@receiver(post_save, sender=GradeRoute)
+@receiver(post_delete, sender=GradeRoute)
+def _grade_route_changed(sender, **kwargs):
+    invalidate_routes()
+
+
+@receiver(post_save, sender=TransitionRule)
+@receiver(post_delete, sender=TransitionRule)
+def _transition_rule_changed(sender, **kwargs):
+    invalidate_rules()
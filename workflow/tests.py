@@ -1,3 +1,182 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.permissions import get_capabilities
+from kingabdulaziz205.testing import make_referral, make_user
+from .assignment import MemoryState, by_grade, choose_assignee, round_robin
+from .models import CounselorLoad, ReportDirtyDay, TransitionRule
+from .reports import build_report, days_to_rollup, rolled_until, rollup_days
+from .transitions import RULES_TTL, apply, decide
+
+
+class AssignmentTests(TestCase):
+    """التوزيع التلقائي وعدّاد الإحالات المفتوحة لكل موجّه."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user("teacher")
+        self.counselors = [make_user(f"c{i}", "موجه طلابي") for i in range(2)]
+
+    def _load(self, user):
+        return CounselorLoad.objects.get(user=user).open_count
+
+    def test_least_load_balances_and_counter_follows_status(self):
+        a, b = self.counselors
+        ref = make_referral(self.teacher, assignee=a)
+        self.assertEqual(self._load(a), 1)
+        self.assertEqual(choose_assignee("1", "least_load"), b.id)
+
+        ref.status = "CLOSED"
+        ref.save()
+        self.assertEqual(self._load(a), 0)
+
+        ref.assignee = b
+        ref.status = "NEW"
+        ref.save()
+        self.assertEqual((self._load(a), self._load(b)), (0, 1))
+        ref.delete()
+        self.assertEqual(self._load(b), 0)
+
+    def test_round_robin_and_grade_routes(self):
+        state = MemoryState({"2": [7]})
+        pool = [3, 5, 7]
+        self.assertEqual([round_robin(state, pool, "1") for _ in range(4)], [3, 5, 7, 3])
+        self.assertEqual(by_grade(state, pool, "2"), 7)
+        self.assertEqual(by_grade(state, pool, "3"), 3)
+
+
+class TransitionTests(TestCase):
+    """قواعد الانتقال من الجدول المخزّن في الذاكرة مع شروط من أعلام الإحالة."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user("teacher", role=None)
+        self.caps = get_capabilities(self.user)
+        self.ref = make_referral(self.user, status="UNDER_REVIEW")
+
+    def test_close_guard_uses_flags_without_queries(self):
+        decide("close", self.ref, self.caps)  # تحميل الجدول
+        with self.assertNumQueries(0):
+            denied = decide("close", self.ref, self.caps)
+        self.assertFalse(denied.allowed)
+        self.assertIn("رد أو توصية", denied.reason)
+
+        self.ref.has_recommendation = True
+        apply(self.ref, decide("close", self.ref, self.caps), self.user)
+        self.ref.refresh_from_db()
+        self.assertEqual(self.ref.status, "CLOSED")
+        self.assertEqual(
+            list(self.ref.transitions.values_list("action", "from_state", "to_state")),
+            [("close", "UNDER_REVIEW", "CLOSED")],
+        )
+
+    def test_rule_changes_invalidate_table(self):
+        self.assertFalse(decide("reply", self.ref, self.caps).allowed)
+        TransitionRule.objects.create(action="reply", from_state="UNDER_REVIEW", to_state="SENT_TO_DEPUTY")
+        self.assertEqual(decide("reply", self.ref, self.caps).to_state, "SENT_TO_DEPUTY")
+
+    def test_table_expires_without_invalidation(self):
+        # تعديل من عملية أخرى لا يصل إبطاله لهذه العملية: يكفي انتهاء RULES_TTL
+        self.assertFalse(decide("reply", self.ref, self.caps).allowed)
+        TransitionRule.objects.bulk_create([
+            TransitionRule(action="reply", from_state="UNDER_REVIEW", to_state="SENT_TO_DEPUTY"),
+        ])
+        self.assertFalse(decide("reply", self.ref, self.caps).allowed)
+        with mock.patch("workflow.transitions.time.monotonic", return_value=time.monotonic() + RULES_TTL):
+            self.assertTrue(decide("reply", self.ref, self.caps).allowed)
+
+
+class ReportSnapshotTests(TestCase):
+    """التقرير = لقطات حتى آخر يوم مُجمَّع + الإحالات الحيّة بعده، ويتبع تعديل الأيام المُجمَّعة."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user("teacher")
+
+    def _totals(self):
+        totals, _ = build_report(self.teacher)
+        return {k: totals[k] for k in ("all", "open", "closed")}
+
+    def test_snapshot_and_live_merge_at_cutoff(self):
+        old = make_referral(self.teacher, days_ago=3)
+        rollup_days(days_to_rollup())
+        self.assertEqual(rolled_until(), timezone.localdate() - timedelta(days=3))
+        make_referral(self.teacher, days_ago=2)  # بعد آخر يوم مُجمَّع: يُقرأ حيًّا
+        make_referral(self.teacher)
+        self.assertEqual(self._totals(), {"all": 3, "open": 3, "closed": 0})
+        self.assertEqual(build_report(self.teacher, d_to=timezone.localdate(old.created_at))[0]["all"], 1)
+
+        old_day = timezone.localdate(old.created_at)
+        # حفظ لا يمسّ ما تعدّه اللقطات لا يكتب شيئًا في جداول التقارير
+        old.is_opened_by_assignee = True
+        with CaptureQueriesContext(connection) as ctx:
+            old.save(update_fields=["is_opened_by_assignee"])
+        self.assertFalse([q for q in ctx.captured_queries if "workflow_report" in q["sql"]])
+
+        # الإغلاق لا يعيد تجميع اليوم في الطلب: يسجّله فقط، ويُقرأ حيًّا حتى التشغيل التالي
+        old.status = "CLOSED"
+        with CaptureQueriesContext(connection) as ctx:
+            old.save()
+        self.assertFalse([q for q in ctx.captured_queries if "workflow_reportsnapshot" in q["sql"]])
+        self.assertEqual(list(ReportDirtyDay.objects.values_list("day", flat=True)), [old_day])
+        self.assertEqual(self._totals(), {"all": 3, "open": 2, "closed": 1})
+        rollup_days(days_to_rollup())
+        self.assertFalse(ReportDirtyDay.objects.exists())
+        self.assertEqual(self._totals(), {"all": 3, "open": 2, "closed": 1})
+
+        old.delete()
+        self.assertEqual(self._totals(), {"all": 2, "open": 2, "closed": 0})
+        self.assertEqual(days_to_rollup(), [old_day])
+        rollup_days(days_to_rollup())
+        self.assertEqual(self._totals(), {"all": 2, "open": 2, "closed": 0})
+        self.assertFalse(ReportDirtyDay.objects.exists())
+
+
+class ReportTotalsTests(TestCase):
+    """إجماليات التقرير وتوزيعاته باستعلام مجمّع واحد لكل جزء، مع نطاق التاريخ."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user("teacher")
+        self.counselor = make_user("counselor", "موجه طلابي")
+
+    def test_totals_breakdowns_and_range(self):
+        make_referral(self.teacher, assignee=self.counselor)
+        make_referral(self.teacher, status="CLOSED")
+        make_referral(self.teacher, grade="2", referral_type="health", days_ago=40)
+        totals, counts = build_report(self.teacher)
+        self.assertEqual(
+            {k: totals[k] for k in ("all", "open", "closed", "sent", "inbox", "last_30")},
+            {"all": 3, "open": 2, "closed": 1, "sent": 3, "inbox": 0, "last_30": 2},
+        )
+        self.assertEqual(counts["referral_type"], {"behavior": 2, "health": 1})
+        self.assertEqual(counts["assignee"][self.counselor.id], 1)
+        self.assertEqual(build_report(self.counselor)[0]["inbox"], 1)
+
+        week_ago = timezone.localdate() - timedelta(days=7)
+        self.assertEqual(build_report(self.teacher, d_from=week_ago)[0]["all"], 2)
+        self.assertEqual(build_report(self.teacher, d_to=week_ago)[0]["all"], 1)
+
+    def test_view_queries_do_not_grow_with_referrals(self):
+        self.client.force_login(self.teacher)
+
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(reverse("workflow:reports")).status_code, 200)
+            return len(ctx)
 
-# Create your tests here.
+        make_referral(self.teacher, assignee=self.counselor)
+        count()  # أول طلب يُنشئ عدّاد صندوق الرسائل للمستخدم
+        small = count()
+        for i in range(10):
+            make_referral(self.teacher, grade=str(i % 12 + 1), referral_type="academic", assignee=self.counselor)
+        self.assertEqual(count(), small)
@@ -0,0 +1,109 @@
+# workflow/transitions.py
+"""
+آلة حالات الإحالة مبنية على جدول TransitionRule بدل انتقالات مكتوبة في العروض.
+
+جدول القواعد صغير ونادر التغيّر، فيُحمَّل في ذاكرة العملية ويُعاد تحميله حين
+يتغيّر رقم نسخة النطاق RULES_NAMESPACE في الكاش المشترك (يرفعه حفظ/حذف أي قاعدة)
+أو بعد RULES_TTL ثانية على الأكثر، فلا تبقى عملية على قواعد قديمة وإن لم يصلها
+الإبطال (كاش غير مشترك أو مفقود). الشروط تُقيَّم من أعلام الإحالة المحمّلة أصلًا، فقرار الانتقال لا
+يكلّف أي استعلام؛ وكل انتقال منفَّذ يُسجَّل في StatusTransition.
+"""
+import time
+from collections import namedtuple
+
+from django.db import transaction
+
+from accounts.permissions import ROLE_MANAGER
+from kingabdulaziz205.caching import invalidate, namespace_version
+from .models import StatusTransition, TransitionRule
+
+RULES_NAMESPACE = "workflow:transition_rules"
+RULES_TTL = 60
+
+# allowed: هل يُسمح بالانتقال؛ rule: القاعدة المطابقة (أو التي فشل شرطها)؛ reason: رسالة الرفض
+Decision = namedtuple("Decision", "allowed to_state rule reason")
+
+GUARDS = {
+    "": lambda ref: True,
+    "has_reply": lambda ref: bool(ref.has_reply),
+    "has_outcome": lambda ref: bool(ref.has_reply or ref.has_recommendation),
+    "has_assignee": lambda ref: ref.assignee_id is not None,
+}
+
+_table = {"version": None, "loaded_at": 0.0, "rules": {}}
+
+
+# ——— جدول القواعد (في ذاكرة العملية) ———
+def _load_rules():
+    rules = {}
+    for rule in TransitionRule.objects.filter(active=True).order_by("id"):
+        rules.setdefault((rule.action, rule.from_state), []).append(rule)
+    # قواعد الدور المحدد تسبق القاعدة العامة لنفس الإجراء والحالة
+    for candidates in rules.values():
+        candidates.sort(key=lambda r: r.allowed_role == "")
+    return rules
+
+
+def rule_table():
+    """{(الإجراء، الحالة من): [القواعد]} — يُعاد تحميله بعد invalidate_rules() أو انتهاء RULES_TTL."""
+    version = namespace_version(RULES_NAMESPACE)
+    now = time.monotonic()
+    if _table["version"] != version or now - _table["loaded_at"] >= RULES_TTL:
+        _table["rules"] = _load_rules()
+        _table["version"], _table["loaded_at"] = version, now
+    return _table["rules"]
+
+
+def invalidate_rules():
+    invalidate(RULES_NAMESPACE)
+
+
+# ——— القرار والتنفيذ ———
+def _role_allows(rule, caps):
+    if not rule.allowed_role:
+        return True
+    if rule.allowed_role == ROLE_MANAGER:
+        return caps.is_manager
+    return caps.role == rule.allowed_role
+
+
+def decide(action, ref, caps):
+    """
+    قرار واحد للإجراء action على الإحالة ref من منفّذ صلاحياته caps.
+    لا قاعدة مطابقة = allowed False و rule None (الحالة لا تتغير).
+    """
+    candidates = [r for r in rule_table().get((action, ref.status), []) if _role_allows(r, caps)]
+    for rule in candidates:
+        if GUARDS.get(rule.guard, GUARDS[""])(ref):
+            return Decision(True, rule.to_state, rule, "")
+    if candidates:
+        rule = candidates[0]
+        return Decision(False, None, rule, f"لا يمكن {rule.get_action_display()} الإحالة قبل {rule.get_guard_display()}.")
+    label = dict(TransitionRule.ACTION_CHOICES).get(action, action)
+    return Decision(False, None, None, f"لا يمكن {label} الإحالة وهي {ref.get_status_display()}.")
+
+
+def apply(ref, decision, actor, update_fields=()):
+    """
+    يطبّق القرار على ref ويحفظ الحقول update_fields (مع الحالة إن تغيّرت)
+    ويسجّل الانتقال. القرار المرفوض يحفظ update_fields فقط؛ والإحالة التي
+    لم تُنشأ بعد تُدرج كاملة.
+    """
+    fields = list(update_fields)
+    transition = None
+    if decision.allowed:
+        transition = StatusTransition(
+            action=decision.rule.action, from_state=ref.status, to_state=decision.to_state,
+            rule=decision.rule, actor=actor,
+        )
+        ref.status = decision.to_state
+        fields.append("status")
+    with transaction.atomic(savepoint=False):
+        if ref.pk is None:
+            ref.save()
+        elif fields:
+            ref.save(update_fields=[*fields, "updated_at"])
+        if transition:
+            transition.referral = ref
+            transition.save()
+    return transition
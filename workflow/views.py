@@ -1,31 +1,49 @@
 # C:\Users\Test2\kingabdulaziz205\workflow\views.py
-from datetime import timedelta
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.shortcuts import render
-from django.utils import timezone
-from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from accounts.directory import active_users
 
 # لو عندك موديل الإحالات باسم Referral داخل تطبيق referrals
 from referrals.models import Referral
+from .reports import cached_report
+
+
+def _date_range(request):
+    """يقرأ ?from=YYYY-MM-DD&to=YYYY-MM-DD (اختياريان)."""
+    def parse(name):
+        try:
+            return parse_date((request.GET.get(name) or "").strip())
+        except ValueError:
+            return None
+    return parse("from"), parse("to")
+
+
+def _labeled(counts, labels):
+    rows = [{"label": labels.get(k, k) or "—", "n": n} for k, n in counts.items() if n]
+    return sorted(rows, key=lambda r: -r["n"])
 
 
 @login_required
 def reports_view(request):
     # إظهار التقارير لكل مستخدم بناءً على ما أرسله أو ما وُكّل إليه فقط
-    base_qs = (
-        Referral.objects.filter(Q(created_by=request.user) | Q(assignee=request.user))
-        .distinct()
-    )
-
-    now = timezone.now()
-    last_30_dt = now - timedelta(days=30)
-
-    totals = {
-        "all": base_qs.count(),                                  # إجمالي إحالاتي (مرسلة + واردة لي)
-        "open": base_qs.exclude(status="CLOSED").count(),        # المفتوحة/قيد المراجعة من إحالاتي
-        "closed": base_qs.filter(status="CLOSED").count(),       # المغلقة من إحالاتي
-        "sent": base_qs.filter(created_by=request.user).count(), # أرسلتها أنا
-        "inbox": base_qs.filter(assignee=request.user).count(),  # واردة إليّ
-        "last_30": base_qs.filter(created_at__gte=last_30_dt).count(),  # خلال 30 يومًا من إحالاتي
+    # الأيام السابقة من اللقطات اليومية (ReportSnapshot) واليوم الحالي مباشرةً من الإحالات
+    d_from, d_to = _date_range(request)
+    totals, counts = cached_report(request.user, d_from, d_to)
+
+    assignee_ids = [pk for pk in counts["assignee"] if pk]
+    usernames = {e.id: e.username for e in active_users() if e.id in assignee_ids}
+    missing = set(assignee_ids) - set(usernames)
+    if missing:  # مستخدمون غير نشطين
+        usernames.update(User.objects.filter(id__in=missing).values_list("id", "username"))
+    breakdowns = {
+        "status": _labeled(counts["status"], dict(Referral.STATUS_CHOICES)),
+        "type": _labeled(counts["referral_type"], dict(Referral.TYPE_CHOICES)),
+        "grade": _labeled(counts["grade"], dict(Referral.GRADE_CHOICES)),
+        "assignee": _labeled(counts["assignee"], usernames),
     }
-    return render(request, "workflow/reports.html", {"totals": totals})
+    return render(request, "workflow/reports.html", {
+        "totals": totals, "breakdowns": breakdowns, "date_from": d_from, "date_to": d_to,
+    })